@@ -0,0 +1,105 @@
+"""
+run every benchmark suite and optionally compare with a stored baseline
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json --threshold 1.2
+
+Each `bench_*` function of the `benchmarks.bench_*` modules returns
+{label: seconds per call}. The exit code is 1 when a result is slower than
+its baseline by more than the threshold.
+"""
+import argparse
+import datetime
+import importlib
+import inspect
+import json
+import pkgutil
+import platform
+import sys
+from typing import Dict, List
+
+import benchmarks
+from benchmarks._timing import report
+
+Results = Dict[str, Dict[str, float]]
+
+
+def discover(only: List[str] = None) -> Dict[str, object]:
+    """{suite name: bench function}, suite names being module.function"""
+    suites = {}
+    for info in pkgutil.iter_modules(benchmarks.__path__):
+        if not info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"benchmarks.{info.name}")
+        for name, function in inspect.getmembers(module, inspect.isfunction):
+            if name.startswith("bench_") and function.__module__ == module.__name__:
+                suite = f"{info.name[len('bench_'):]}.{name[len('bench_'):]}"
+                if not only or any(suite.startswith(prefix) for prefix in only):
+                    suites[suite] = function
+    return suites
+
+
+def run(suites: Dict[str, object], quick: bool = False) -> Results:
+    results = {}
+    for suite, function in suites.items():
+        kwargs = {}
+        if quick:
+            number = inspect.signature(function).parameters["number"].default
+            kwargs["number"] = max(1, number // 10)
+        results[suite] = function(**kwargs)
+        report(suite, results[suite])
+    return results
+
+
+def compare(results: Results, baseline: Results, threshold: float) -> List[str]:
+    """labels slower than baseline * threshold"""
+    regressions = []
+    print(f"\ncompared with baseline, threshold x{threshold}")
+    for suite, timings in results.items():
+        for label, seconds in timings.items():
+            previous = baseline.get(suite, {}).get(label)
+            if not previous:
+                continue
+            ratio = seconds / previous
+            flag = ""
+            if ratio > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{suite}.{label}")
+            print(f"  {suite}.{label:<40} x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("only", nargs="*", help="suite name prefixes to run")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    parser.add_argument("--quick", action="store_true", help="10x fewer calls")
+    args = parser.parse_args(argv)
+
+    results = run(discover(args.only), quick=args.quick)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(
+                {
+                    "meta": {
+                        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                    },
+                    "results": results,
+                },
+                fp,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
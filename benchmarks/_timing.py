@@ -0,0 +1,14 @@
+import timeit
+from typing import Callable
+
+
+def best_of(func: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """best time per call in seconds, over `repeat` rounds of `number` calls"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(name: str, results: dict):
+    baseline = next(iter(results.values()))
+    print(name)
+    for label, seconds in results.items():
+        print(f"  {label:<30} {seconds * 1e6:10.2f} us  x{baseline / seconds:.2f}")
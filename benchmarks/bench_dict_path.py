@@ -0,0 +1,189 @@
+"""
+dict_path benchmarks, run with `python -m benchmarks.bench_dict_path`
+"""
+import copy
+
+from benchmarks._timing import best_of, report
+from src.dict_path import (
+    WhereIndex,
+    apply_patch,
+    compile_many,
+    get_attribute_for_path,
+    get_many,
+    set_attribute_for_path,
+)
+
+PATIENT = {
+    "resourceType": "Patient",
+    "id": "1",
+    "identifier": [
+        {"system": f"urn:oid:1.2.250.1.{i}", "value": str(i), "use": "usual"}
+        for i in range(6)
+    ],
+    "name": [
+        {"use": "official", "family": "DUBOIS", "given": ["Marc", "Antoine"]},
+        {"use": "maiden", "family": "MARTIN", "given": ["Marc"]},
+    ],
+    "telecom": [
+        {"system": "email", "value": "marc@example.org"},
+        {"system": "phone", "use": "mobile", "value": "0600000000"},
+    ],
+    "extension": [
+        {"url": f"https://synapse-medicine.com/{i}", "valueString": str(i)}
+        for i in range(8)
+    ],
+    "address": [{"line": ["1 rue de la Paix"], "city": "Paris", "postalCode": "75002"}],
+    "birthDate": "1986-02-05",
+    "gender": "male",
+}
+
+PATHS = {
+    **{
+        f"identifier_{i}": ["identifier", {"system": f"urn:oid:1.2.250.1.{i}"}, "value"]
+        for i in range(6)
+    },
+    **{
+        f"extension_{i}": [
+            "extension",
+            {"url": f"https://synapse-medicine.com/{i}"},
+            "valueString",
+        ]
+        for i in range(8)
+    },
+    "family": "name.0.family",
+    "given": "name.0.given.0",
+    "second_given": "name.0.given.1",
+    "use": "name.0.use",
+    "email": ["telecom", {"system": "email"}, "value"],
+    "mobile": ["telecom", {"system": "phone", "use": "mobile"}, "value"],
+    "line": "address.0.line.0",
+    "city": "address.0.city",
+    "postal_code": "address.0.postalCode",
+    "birth_date": "birthDate",
+    "gender": "gender",
+    "deceased": "deceasedBoolean",
+}
+
+
+def bench_get_set(number: int = 20000) -> dict:
+    target = copy.deepcopy(PATIENT)
+    return {
+        "get": best_of(
+            lambda: get_attribute_for_path(PATIENT, "name.0.family"), number
+        ),
+        "get_where": best_of(
+            lambda: get_attribute_for_path(PATIENT, PATHS["mobile"]), number
+        ),
+        "set": best_of(
+            lambda: set_attribute_for_path(target, "name.0.family", "DURAND"), number
+        ),
+        "set_where": best_of(
+            lambda: set_attribute_for_path(target, PATHS["mobile"], "0611111111"),
+            number,
+        ),
+    }
+
+
+def _per_path_loop():
+    return {
+        alias: get_attribute_for_path(PATIENT, path, default=None)
+        for alias, path in PATHS.items()
+    }
+
+
+def _get_many():
+    return get_many(PATIENT, PATHS, default=None)
+
+
+def _get_many_compiled(trie=compile_many(PATHS)):
+    return get_many(PATIENT, trie, default=None)
+
+
+def bench_get_many(number: int = 2000) -> dict:
+    assert _per_path_loop() == _get_many() == _get_many_compiled()
+    return {
+        "per_path_loop": best_of(_per_path_loop, number),
+        "get_many": best_of(_get_many, number),
+        "get_many_compiled": best_of(_get_many_compiled, number),
+    }
+
+
+EXTENSIONS = {
+    "extension": [
+        {"url": f"https://synapse-medicine.com/{i}", "valueInteger": i}
+        for i in range(50)
+    ]
+}
+EXTENSION_PATH = [
+    "extension",
+    {"url": "https://synapse-medicine.com/40"},
+    "valueInteger",
+]
+
+
+def bench_where_index(number: int = 5000) -> dict:
+    index = WhereIndex()
+    return {
+        "scan": best_of(
+            lambda: get_attribute_for_path(EXTENSIONS, EXTENSION_PATH), number
+        ),
+        "indexed": best_of(
+            lambda: get_attribute_for_path(EXTENSIONS, EXTENSION_PATH, index=index),
+            number,
+        ),
+    }
+
+
+# an upstream message mapped onto a Bundle-like document, 120 values
+PATCH = [
+    *(
+        (f"contained.{i}.identifier.0.{key}", f"{key}-{i}")
+        for i in range(10)
+        for key in ("system", "value", "use")
+    ),
+    *(
+        (f"contained.{i}.name.0.{key}", f"{key}-{i}")
+        for i in range(10)
+        for key in ("family", "text", "use")
+    ),
+    *(
+        (["extension", {"url": f"https://synapse-medicine.com/{i}"}, "valueInteger"], i)
+        for i in range(50)
+    ),
+    *((f"meta.tag.{i}.code", str(i)) for i in range(10)),
+]
+PATCH_TARGET = {
+    "extension": [dict(e) for e in EXTENSIONS["extension"]],
+    "contained": [{"resourceType": "Patient", "id": str(i)} for i in range(500)],
+}
+
+
+def _sequential_set():
+    target = PATCH_TARGET
+    for path, value in PATCH:
+        target = set_attribute_for_path(target, path, value, persistent=True)
+    return target
+
+
+def _apply_patch():
+    return apply_patch(PATCH_TARGET, PATCH, persistent=True)
+
+
+def bench_apply_patch(number: int = 50) -> dict:
+    """
+    persistent updates, every set call copies the root and the lists along its
+    path, apply_patch copies them once. In place, apply_patch is the loop of
+    set calls.
+    """
+    assert _sequential_set() == _apply_patch()
+    return {
+        "sequential_set": best_of(_sequential_set, number),
+        "apply_patch": best_of(_apply_patch, number),
+    }
+
+
+if __name__ == "__main__":
+    report("single path get/set", bench_get_set())
+    report(f"get_many, {len(PATHS)} paths", bench_get_many())
+    report("where-filter on 50 extensions", bench_where_index())
+    report(f"persistent patch of {len(PATCH)} values", bench_apply_patch())
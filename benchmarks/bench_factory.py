@@ -0,0 +1,63 @@
+"""
+factory benchmarks, per call factories against the bulk builders, run with
+`python -m benchmarks.bench_factory`
+"""
+from benchmarks._timing import best_of, report
+from src.enum import TermURL
+from src.factory import (
+    IdGenerator,
+    codeable_concept,
+    codeable_concepts,
+    codings,
+    identifier,
+    identifiers,
+    ref,
+    references,
+)
+from fhir.resources.coding import Coding
+
+COUNT = 1000
+REFERENCES = [f"Practitioner/{i}" for i in range(COUNT)]
+CODES = [f"{i}-0" for i in range(COUNT)]
+
+
+def bench_identifiers(number: int = 5) -> dict:
+    ids = IdGenerator(seed=0)
+    return {
+        "identifier": best_of(lambda: [identifier() for _ in range(COUNT)], number),
+        "identifiers": best_of(lambda: identifiers(count=COUNT, ids=ids), number),
+        "identifiers_sample": best_of(
+            lambda: identifiers(count=COUNT, ids=ids, validate_sample=0.01), number
+        ),
+    }
+
+
+def bench_references(number: int = 5) -> dict:
+    return {
+        "ref": best_of(lambda: [ref(r) for r in REFERENCES], number),
+        "references": best_of(lambda: references(REFERENCES), number),
+        "references_validated": best_of(
+            lambda: references(REFERENCES, validate_sample=True), number
+        ),
+    }
+
+
+def bench_codeable_concepts(number: int = 5) -> dict:
+    def per_call():
+        return [
+            codeable_concept(Coding(system=TermURL.LOINC.value, code=code))
+            for code in CODES
+        ]
+
+    return {
+        "codeable_concept": best_of(per_call, number),
+        "codeable_concepts": best_of(
+            lambda: codeable_concepts(codings(CODES, system=TermURL.LOINC)), number
+        ),
+    }
+
+
+if __name__ == "__main__":
+    report(f"identifiers x{COUNT}", bench_identifiers())
+    report(f"references x{COUNT}", bench_references())
+    report(f"codeable concepts x{COUNT}", bench_codeable_concepts())
@@ -0,0 +1,41 @@
+"""
+import time benchmarks, run with `python -m benchmarks.bench_import`
+
+Each import runs in a fresh interpreter and is timed there, around
+`importlib.import_module`, so that the interpreter startup is left out.
+"""
+import os
+import subprocess
+import sys
+
+from benchmarks._timing import report
+
+MODULES = ("src.dict_path", "src.cls_helpers", "src.factory")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCRIPT = (
+    "import importlib, sys, time\n"
+    "start = time.perf_counter()\n"
+    "importlib.import_module(sys.argv[1])\n"
+    "print(time.perf_counter() - start)"
+)
+
+
+def _run(module: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", _SCRIPT, module],
+        cwd=_ROOT,
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return float(output)
+
+
+def bench_import(number: int = 5) -> dict:
+    return {module: min(_run(module) for _ in range(number)) for module in MODULES}
+
+
+if __name__ == "__main__":
+    report("import time", bench_import())
@@ -0,0 +1,50 @@
+"""
+interning benchmarks, run with `python -m benchmarks.bench_intern` for the
+memory report as well
+"""
+import io
+import json
+
+from benchmarks import synthetic
+from benchmarks._timing import best_of, report
+from src.intern import Interner, deep_sizeof
+from src.stream import iter_ndjson
+
+NDJSON = "\n".join(
+    json.dumps(r)
+    for r in synthetic.resources(0, patients=200, observations_per_patient=10)
+)
+
+
+def _load(**kwargs) -> list:
+    return list(iter_ndjson(io.StringIO(NDJSON), **kwargs))
+
+
+def bench_intern_load(number: int = 5) -> dict:
+    return {
+        "plain": best_of(_load, number),
+        "interned": best_of(lambda: _load(interner=Interner()), number),
+        "interned_objects": best_of(
+            lambda: _load(interner=Interner(share_objects=True)), number
+        ),
+    }
+
+
+def memory_report():
+    plain = deep_sizeof(_load())
+    print(f"memory of {NDJSON.count(chr(10)) + 1} resources")
+    print(f"  {'plain':<30} {plain / 1024:10.0f} KiB")
+    for label, interner in (
+        ("interned", Interner()),
+        ("interned_objects", Interner(share_objects=True)),
+    ):
+        size = deep_sizeof(_load(interner=interner))
+        print(
+            f"  {label:<30} {size / 1024:10.0f} KiB  -{1 - size / plain:.0%}"
+            f"  {interner.stats()}"
+        )
+
+
+if __name__ == "__main__":
+    report("load", bench_intern_load())
+    memory_report()
@@ -0,0 +1,153 @@
+"""
+cls_helpers benchmarks, run with `python -m benchmarks.bench_models`
+"""
+import functools
+import random
+
+from benchmarks import synthetic
+from benchmarks._timing import best_of, report
+from src.cls_helpers import Observation, Patient
+from src.merger import merge, merge_all
+from src.utils import ilist
+from src.views import PatientView
+
+_rng = random.Random(0)
+# deep resources: many identifiers, names and extensions
+PATIENT_A = synthetic.patient(_rng, resource_id="1", identifiers=10, extensions=30)
+PATIENT_B = synthetic.patient(_rng, resource_id="1", identifiers=10, extensions=30)
+OBSERVATION = synthetic.observation(_rng, "1", resource_id="1", components=20)
+
+
+def bench_merge(number: int = 200) -> dict:
+    a, b = Patient(**PATIENT_A), Patient(**PATIENT_B)
+    return {
+        "merge_dicts": best_of(lambda: merge(PATIENT_A, PATIENT_B), number),
+        "merge_with": best_of(lambda: a.merge_with(b), number),
+    }
+
+
+# history of a patient, folded into a golden record
+HISTORY = [
+    synthetic.patient(_rng, resource_id="1", identifiers=10, extensions=30)
+    for _ in range(20)
+]
+MERGED_FIELDS = {"identifier", "telecom", "extension"}
+
+
+def bench_merge_all(number: int = 20) -> dict:
+    models = [Patient(**version) for version in HISTORY]
+    return {
+        "pairwise_merge_with": best_of(
+            lambda: functools.reduce(
+                lambda a, b: a.merge_with(b, fields_to_be_merged=MERGED_FIELDS),
+                models,
+            ),
+            number,
+        ),
+        "merge_all": best_of(
+            lambda: merge_all(models, fields_to_be_merged=MERGED_FIELDS), number
+        ),
+        "merge_all_dicts": best_of(
+            lambda: merge_all(HISTORY, fields_to_be_merged=MERGED_FIELDS), number
+        ),
+    }
+
+
+def bench_getters(number: int = 5000) -> dict:
+    patient = Patient(**PATIENT_A)
+    observation = Observation(**OBSERVATION)
+    system = synthetic.IDENTIFIER_SYSTEM.format(5)
+    url = synthetic.EXTENSION_URL.format(20)
+    return {
+        "get_identifier": best_of(
+            lambda: patient.get_identifier(system=system), number
+        ),
+        "get_extension": best_of(lambda: patient.get_extension(url=url), number),
+        "get_mobile": best_of(patient.get_mobile, number),
+        "get_official_name": best_of(patient.get_official_name, number),
+        "get_formatted_address": best_of(patient.get_formatted_address, number),
+        "get_code": best_of(observation.get_code, number),
+    }
+
+
+def bench_lookup_tables(number: int = 5000) -> dict:
+    """repeated queries on the same instance, against a scan of the list"""
+    patient = Patient(**PATIENT_A)
+    system = synthetic.IDENTIFIER_SYSTEM.format(9)
+    url = synthetic.EXTENSION_URL.format(29)
+    return {
+        "scan_identifier": best_of(
+            lambda: ilist(patient.identifier)
+            .filter(lambda i: i.system == system)
+            .safe_first,
+            number,
+        ),
+        "get_identifier": best_of(
+            lambda: patient.get_identifier(system=system), number
+        ),
+        "scan_extension": best_of(
+            lambda: ilist(patient.extension).filter(lambda e: e.url == url).safe_first,
+            number,
+        ),
+        "get_extension": best_of(lambda: patient.get_extension(url=url), number),
+    }
+
+
+def _code(resource):
+    return resource.code
+
+
+def bench_concepts(number: int = 500) -> dict:
+    """
+    matching dozens of codes against contained resources, scan of the
+    contained resources against the opt-in per instance index
+    """
+    observation = Observation(
+        **OBSERVATION,
+        contained=[
+            synthetic.observation(_rng, "1", resource_id=str(i)) for i in range(50)
+        ],
+    )
+    # mostly codes that are not there, as when testing a list of candidates
+    queries = [{"http://loinc.org": code} for code, _, _ in synthetic.LOINC] + [
+        {"http://loinc.org": f"{i}-0"} for i in range(30)
+    ]
+
+    def scan():
+        for systems in queries:
+            observation.find_contained_resource_with_matching_concept(_code, systems)
+
+    def indexed():
+        index = observation.get_concept_index(_code)
+        for systems in queries:
+            index.find(systems)
+
+    return {"scan": best_of(scan, number), "indexed": best_of(indexed, number)}
+
+
+def bench_views(number: int = 200) -> dict:
+    system = synthetic.IDENTIFIER_SYSTEM.format(5)
+    return {
+        "model": best_of(
+            lambda: Patient(**PATIENT_A).get_identifier(system=system), number
+        ),
+        "view": best_of(
+            lambda: PatientView(PATIENT_A).get_identifier(system=system), number
+        ),
+    }
+
+
+def bench_validation(number: int = 200) -> dict:
+    return {
+        "patient": best_of(lambda: Patient(**PATIENT_A), number),
+        "observation": best_of(lambda: Observation(**OBSERVATION), number),
+    }
+
+
+if __name__ == "__main__":
+    report("merge of deep patients", bench_merge())
+    report(f"fold of {len(HISTORY)} versions", bench_merge_all())
+    report("getters", bench_getters())
+    report("lookup tables", bench_lookup_tables())
+    report("single getter from a payload", bench_views())
+    report("model validation", bench_validation())
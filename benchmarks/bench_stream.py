@@ -0,0 +1,38 @@
+"""
+streaming reader benchmarks, run with `python -m benchmarks.bench_stream`
+"""
+import io
+import json
+
+from benchmarks import synthetic
+from benchmarks._timing import best_of, report
+from src.stream import iter_bundle, iter_ndjson
+
+BUNDLE = json.dumps(synthetic.bundle(0, patients=200))
+NDJSON = "\n".join(json.dumps(r) for r in synthetic.resources(0, patients=200))
+
+
+def bench_bundle(number: int = 10) -> dict:
+    return {
+        "json_loads": best_of(lambda: json.loads(BUNDLE), number),
+        "iter_bundle": best_of(lambda: list(iter_bundle(io.StringIO(BUNDLE))), number),
+        "iter_bundle_patients": best_of(
+            lambda: list(iter_bundle(io.StringIO(BUNDLE), resource_type="Patient")),
+            number,
+        ),
+    }
+
+
+def bench_ndjson(number: int = 10) -> dict:
+    return {
+        "iter_ndjson": best_of(lambda: list(iter_ndjson(io.StringIO(NDJSON))), number),
+        "iter_ndjson_patients": best_of(
+            lambda: list(iter_ndjson(io.StringIO(NDJSON), resource_type="Patient")),
+            number,
+        ),
+    }
+
+
+if __name__ == "__main__":
+    report(f"bundle of {len(BUNDLE) // 1024} KiB", bench_bundle())
+    report(f"ndjson of {len(NDJSON) // 1024} KiB", bench_ndjson())
@@ -0,0 +1,151 @@
+"""
+seeded generator of realistic FHIR payloads, the same seed always gives the
+same resources so that benchmark results are comparable across releases
+"""
+import datetime
+import random
+from typing import Any, Dict, List
+
+FAMILIES = ("DUBOIS", "MARTIN", "BERNARD", "THOMAS", "PETIT", "ROBERT", "RICHARD")
+GIVENS = ("Marc", "Antoine", "Julie", "Camille", "Louis", "Emma", "Hugo", "Léa")
+CITIES = (("Paris", "75002"), ("Lyon", "69003"), ("Bordeaux", "33000"))
+LOINC = (
+    ("8867-4", "Heart rate", "/min"),
+    ("8310-5", "Body temperature", "Cel"),
+    ("29463-7", "Body weight", "kg"),
+    ("8302-2", "Body height", "cm"),
+)
+EXTENSION_URL = "https://synapse-medicine.com/fhir/StructureDefinition/{}"
+IDENTIFIER_SYSTEM = "urn:oid:1.2.250.1.213.1.4.{}"
+
+
+def _date(rng: random.Random, start_year: int = 1930, end_year: int = 2020) -> str:
+    start = datetime.date(start_year, 1, 1).toordinal()
+    end = datetime.date(end_year, 12, 31).toordinal()
+    return datetime.date.fromordinal(rng.randint(start, end)).isoformat()
+
+
+def patient(
+    rng: random.Random,
+    /,
+    resource_id: str = None,
+    identifiers: int = 3,
+    names: int = 2,
+    extensions: int = 5,
+) -> Dict[str, Any]:
+    """Patient with the given number of identifiers, names and extensions"""
+    city, postal_code = rng.choice(CITIES)
+    given = rng.choice(GIVENS)
+    return {
+        "resourceType": "Patient",
+        "id": resource_id or str(rng.randrange(10**9)),
+        "identifier": [
+            {
+                "use": "usual",
+                "system": IDENTIFIER_SYSTEM.format(i),
+                "value": str(rng.randrange(10**12)),
+            }
+            for i in range(identifiers)
+        ],
+        "name": [
+            {
+                "use": "official" if i == 0 else rng.choice(("usual", "maiden")),
+                "family": rng.choice(FAMILIES),
+                "given": [given, rng.choice(GIVENS)],
+            }
+            for i in range(names)
+        ],
+        "telecom": [
+            {"system": "email", "value": f"{given.lower()}@example.org"},
+            {
+                "system": "phone",
+                "use": "mobile",
+                "value": f"06{rng.randrange(10**8):08}",
+            },
+        ],
+        "gender": rng.choice(("male", "female")),
+        "birthDate": _date(rng),
+        "address": [
+            {
+                "line": [f"{rng.randint(1, 120)} rue de la Paix"],
+                "city": city,
+                "postalCode": postal_code,
+            }
+        ],
+        "extension": [
+            {"url": EXTENSION_URL.format(i), "valueString": str(rng.randrange(1000))}
+            for i in range(extensions)
+        ],
+    }
+
+
+def observation(
+    rng: random.Random,
+    /,
+    patient_id: str,
+    resource_id: str = None,
+    components: int = 0,
+) -> Dict[str, Any]:
+    """vital sign Observation of the patient, with optional components"""
+    code, display, unit = rng.choice(LOINC)
+    resource = {
+        "resourceType": "Observation",
+        "id": resource_id or str(rng.randrange(10**9)),
+        "status": "final",
+        "code": {
+            "coding": [{"system": "http://loinc.org", "code": code, "display": display}]
+        },
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "effectiveDateTime": f"{_date(rng, 2015, 2022)}T08:00:00+00:00",
+        "valueQuantity": {
+            "value": round(rng.uniform(30, 180), 1),
+            "unit": unit,
+            "system": "http://unitsofmeasure.org",
+            "code": unit,
+        },
+    }
+    if components:
+        resource["component"] = [
+            {
+                "code": {"coding": [{"system": "http://loinc.org", "code": c}]},
+                "valueQuantity": {"value": round(rng.uniform(30, 180), 1)},
+            }
+            for c, _, _ in rng.choices(LOINC, k=components)
+        ]
+    return resource
+
+
+def resources(
+    seed: int = 0, /, patients: int = 100, observations_per_patient: int = 5
+) -> List[Dict[str, Any]]:
+    """patients each followed by their observations"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(patients):
+        items.append(patient(rng, resource_id=f"p{i}"))
+        items.extend(
+            observation(rng, f"p{i}", resource_id=f"o{i}-{j}")
+            for j in range(observations_per_patient)
+        )
+    return items
+
+
+def bundle(
+    seed: int = 0, /, patients: int = 100, observations_per_patient: int = 5
+) -> Dict[str, Any]:
+    """searchset Bundle of `resources`"""
+    items = resources(
+        seed, patients=patients, observations_per_patient=observations_per_patient
+    )
+    return {
+        "resourceType": "Bundle",
+        "type": "searchset",
+        "total": len(items),
+        "entry": [
+            {
+                "fullUrl": f"urn:uuid:{item['resourceType']}-{item['id']}",
+                "resource": item,
+            }
+            for item in items
+        ],
+    }
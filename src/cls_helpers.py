@@ -1,44 +1,100 @@
+"""
+FHIR resource classes with helper getters. Classes are built on first access
+(`from src.cls_helpers import Patient`) for any resource type, so that only
+the fhir.resources modules actually used are imported.
+"""
 import functools
-import uuid
-from typing import Dict, Optional, TypeVar, Union, Any, Callable, cast
-
-from fhir.resources.address import Address
-from fhir.resources.careteam import CareTeam as FHIRCareTeam
-from fhir.resources.condition import Condition as FHIRCondition
-from fhir.resources.encounter import Encounter as FHIREncounter
-from fhir.resources.fhirtypes import AddressType
-from fhir.resources.flag import Flag as FHIRFlag
-from fhir.resources.humanname import HumanName
-from fhir.resources.list import List as FHIRList
-from fhir.resources.observation import Observation as FHIRObservation
-from fhir.resources.organization import Organization as FHIROrganization
-from fhir.resources.patient import Patient as FHIRPatient
-from fhir.resources.practitioner import Practitioner as FHIRPractitioner
-from fhir.resources.questionnaireresponse import (
-    QuestionnaireResponse as FHIRQuestionnaireResponse,
+import importlib
+import threading
+import weakref
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
 )
-from fhir.resources.researchstudy import ResearchStudy as FHIRResearchStudy
-from fhir.resources.researchsubject import ResearchSubject as FHIRResearchSubject
-from fhir.resources.resource import Resource
 
-# noinspection PyProtectedMember
-from fn import _
 from loguru import logger
 
-from src.merger import merge
-from src.utils import ilist, mixin
-
-E = TypeVar("E", bound=Resource)
+from src.concepts import ConceptIndex
+from src.merger import merge_models
+from src.mixins import REGISTRY
+from src.utils import ilist
+
+if TYPE_CHECKING:
+    from fhir.resources.fhirtypes import AddressType
+    from fhir.resources.humanname import HumanName
+    from fhir.resources.resource import Resource
+
+    from src.terminology import TerminologyStore
+
+E = TypeVar("E", bound="Resource")
+
+
+# per instance lookup tables, keyed by id() as models are not hashable, and
+# dropped with their instance
+_LOOKUPS: Dict[int, Dict[Tuple[str, Any], Tuple[Any, int, Dict[Any, Any]]]] = {}
+_EMPTY = ()
+
+
+def _lookup(
+    obj: Any, attr_name: str, key: Any, build: Callable[[Any], Dict[Any, Any]]
+) -> Dict[Any, Any]:
+    """
+    lookup table built from the `attr_name` list of obj, rebuilt when the
+    field is reassigned or its length changes
+    """
+    source = getattr(obj, attr_name, None) or _EMPTY
+    tables = _LOOKUPS.get(id(obj))
+    if tables is None:
+        try:
+            weakref.finalize(obj, _LOOKUPS.pop, id(obj), None)
+        except TypeError:
+            # no weak reference support, nothing is cached
+            return build(source)
+        tables = _LOOKUPS[id(obj)] = {}
+    entry = tables.get((attr_name, key))
+    if entry is not None and entry[0] is source and entry[1] == len(source):
+        return entry[2]
+    table = build(source)
+    tables[attr_name, key] = (source, len(source), table)
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _first_by(attr_name: str) -> Callable[[Any], Optional[Dict[Any, Any]]]:
+    def build(elements) -> Optional[Dict[Any, Any]]:
+        table = {}
+        for element in elements:
+            try:
+                table.setdefault(getattr(element, attr_name, None), element)
+            except TypeError:
+                # unhashable values (models), not indexed
+                return None
+        return table
+
+    return build
 
 
 def get_attr(obj: E, attr_name: str, sub_attr: str, sub_attr_value: Any, index: int):
     if sub_attr_value:
-        value = (
+        table = _lookup(obj, attr_name, sub_attr, _first_by(sub_attr))
+        if table is not None:
+            try:
+                return table.get(sub_attr_value)
+            except TypeError:
+                pass
+        # unhashable values are compared one by one
+        return (
             ilist(getattr(obj, attr_name) or [])
-            .filter(lambda x: getattr(x, sub_attr) == sub_attr_value)
+            .filter(lambda x: getattr(x, sub_attr, None) == sub_attr_value)
             .safe_first
         )
-        return value
     # fetch by index
     try:
         return getattr(obj, attr_name)[index]
@@ -52,15 +108,19 @@ def get_identifier(obj: E, /, index: int = 0, system: str = None) -> Optional[st
     return identifier_obj.value or "" if identifier_obj else None
 
 
-def get_identifier_by_type(obj: E, /, system: str, code: str) -> Optional[str]:
-    for ident in obj.identifier or []:
+def _identifiers_by_type(identifiers) -> Dict[Tuple[str, str], Any]:
+    table = {}
+    for ident in identifiers:
         type_ = ident.type
         if type_ is not None:
-            codings = type_.coding or []
-            for coding in codings:
-                if coding.system == system and coding.code == code:
-                    return ident.value or ""
-    return None
+            for coding in type_.coding or []:
+                table.setdefault((coding.system, coding.code), ident)
+    return table
+
+
+def get_identifier_by_type(obj: E, /, system: str, code: str) -> Optional[str]:
+    ident = _lookup(obj, "identifier", "type", _identifiers_by_type).get((system, code))
+    return ident.value or "" if ident is not None else None
 
 
 def get_code(obj: E, /, index: int = 0) -> Optional[str]:
@@ -76,21 +136,29 @@ def get_extension(obj: E, /, index: int = 0, url: str = None):
     return ext
 
 
+def get_contained(obj: E, /, id_: str) -> Optional["Resource"]:
+    """contained resource of this id, looked up in a per instance table"""
+    return _lookup(obj, "contained", "id", _first_by("id")).get(id_)
+
+
+def _telecoms_by_system(contact_points) -> Dict[Tuple[str, Optional[str]], Any]:
+    """first contact point by (system, use) and by (system, None) for any use"""
+    table = {}
+    for contact_point in contact_points:
+        table.setdefault((contact_point.system, contact_point.use), contact_point)
+        table.setdefault((contact_point.system, None), contact_point)
+    return table
+
+
 def get_telecom(
     obj: Union["Patient", "Practitioner"], system: str, use: Optional[str] = None
 ) -> str:
     if not system:
         raise ValueError(f"kind must be present, received {system=}")
 
-    contacts = ilist(obj.telecom or [])
-    # both use and system are defined
-    predicate = (
-        lambda c: c.system == system and c.use == use
-        if use
-        else lambda d: d.system == system
+    contact_point = _lookup(obj, "telecom", "system_use", _telecoms_by_system).get(
+        (system, use)
     )
-
-    contact_point = contacts.filter(predicate).safe_first
     return contact_point.value or "" if contact_point else ""
 
 
@@ -106,7 +174,7 @@ def get_mobile(obj: Union["Patient", "Practitioner"]) -> str:
     return get_telecom(obj, "phone", "mobile")
 
 
-def get_address(obj: Union["Patient", "Practitioner"]) -> Optional[AddressType]:
+def get_address(obj: Union["Patient", "Practitioner"]) -> Optional["AddressType"]:
     return ilist(obj.address).safe_first
 
 
@@ -114,8 +182,6 @@ def get_formatted_address(obj: Union["Patient", "Practitioner"]) -> str:
     address = get_address(obj)
     if not address:
         return ""
-    address = cast(Address, address)
-
     address_as_array = [
         " ".join(address.line or []) or "",
         address.postalCode or "",
@@ -130,12 +196,12 @@ def get_formatted_address(obj: Union["Patient", "Practitioner"]) -> str:
 
 
 # name stuffs
-def get_name(obj: Union["Patient", "Practitioner"], use=None) -> Optional[HumanName]:
+def get_name(obj: Union["Patient", "Practitioner"], use=None) -> Optional["HumanName"]:
     if not hasattr(obj, "name") or not obj.name:
         return None
     if not use:
-        return ilist(obj.name or []).safe_first
-    return ilist(obj.name or []).filter(_.use == use).safe_first
+        return obj.name[0]
+    return _lookup(obj, "name", "use", _first_by("use")).get(use)
 
 
 get_official_name = functools.partialmethod(get_name, use="official")
@@ -149,26 +215,75 @@ get_maiden_name.__name__ = "get_maiden_name"
 
 
 def merge_with(obj: E, another_model: E, **kwargs: Any) -> E:
+    """
+    merge another model of the same type into a new one, see
+    `src.merger.merge_models` for the parameters
+    """
     if type(obj) != type(another_model):
         raise TypeError("Can only merge model of the same type")
-    return obj.__class__(**merge(obj, another_model, **kwargs))
+    merged = merge_models(obj, another_model, **kwargs)
+    return obj.copy() if merged is obj else merged
+
+
+# concept indexes kept per instance, one per getter
+_MAX_CONCEPT_INDEXES = 8
+
+
+def get_concept_index(obj: E, getter: Callable[[Any], Any]) -> ConceptIndex:
+    """
+    index of the codings of the contained resources, see
+    `src.concepts.ConceptIndex`, rebuilt when `contained` is reassigned or
+    its length changes
+    """
+    indexes = _lookup(obj, "contained", "concepts", lambda contained: {})
+    index = indexes.get(getter)
+    if index is None:
+        if len(indexes) >= _MAX_CONCEPT_INDEXES:
+            # getters built on each call (lambdas) would pile up otherwise
+            indexes.clear()
+        index = indexes[getter] = ConceptIndex(
+            getattr(obj, "contained", None) or [], getter
+        )
+    return index
 
 
 def find_contained_resource_with_matching_concept(
     obj: E, getter, systems: Dict[str, str]
 ) -> Optional[E]:
-    for resource in getattr(obj, "contained", []):
+    """
+    first contained resource with a matching coding, stops at the first match.
+    `get_concept_index` is faster to match many codes against the same resource.
+    """
+    for resource in getattr(obj, "contained", None) or []:
         concepts = getter(resource)
         if not isinstance(concepts, list):
             concepts = [concepts]
         for concept in concepts:
-            codings = concept.coding
-            for coding in codings:
+            for coding in getattr(concept, "coding", None) or []:
                 value = systems.get(coding.system)
                 if value is None:
                     continue
                 if value == coding.code:
                     return resource
+    return None
+
+
+def find_contained_resource_in_valueset(
+    obj: E, getter, store: "TerminologyStore", valueset: str
+) -> Optional[E]:
+    """
+    first contained resource with a concept coding in the ValueSet, see
+    `src.terminology.TerminologyStore`
+    """
+    for resource in getattr(obj, "contained", None) or []:
+        concepts = getter(resource)
+        if not isinstance(concepts, list):
+            concepts = [concepts]
+        for concept in concepts:
+            for coding in getattr(concept, "coding", None) or []:
+                if store.in_valueset(valueset, coding.system, coding.code):
+                    return resource
+    return None
 
 
 class MergeMixin:
@@ -179,11 +294,14 @@ class CommonMixin(MergeMixin):
     get_identifier = get_identifier
     get_identifier_by_type = get_identifier_by_type
     get_extension = get_extension
+    get_contained = get_contained
     get_attr = get_attr
     get_code = get_code
     find_contained_resource_with_matching_concept = (
         find_contained_resource_with_matching_concept
     )
+    find_contained_resource_in_valueset = find_contained_resource_in_valueset
+    get_concept_index = get_concept_index
 
 
 class PersonMixin(CommonMixin):
@@ -199,66 +317,65 @@ class PersonMixin(CommonMixin):
     get_formatted_address = get_formatted_address
 
 
-@mixin
-class Patient(FHIRPatient, PersonMixin):
-    ...
-
-
-@mixin
-class Practitioner(FHIRPractitioner, PersonMixin):
-    ...
-
-
-@mixin
-class ResearchSubject(FHIRResearchSubject, CommonMixin):
-    ...
-
-
-@mixin
-class QuestionnaireResponse(FHIRQuestionnaireResponse, CommonMixin):
-    ...
+# helper mixin of each resource type, CommonMixin for the others
+MIXINS: Dict[str, type] = {
+    "Patient": PersonMixin,
+    "Practitioner": PersonMixin,
+}
 
 
-@mixin
-class Observation(FHIRObservation, CommonMixin):
-    ...
-
-
-@mixin
-class Encounter(FHIREncounter, CommonMixin):
-    ...
-
-
-@mixin
-class Condition(FHIRCondition, CommonMixin):
-    ...
-
+def _fhir_resource_class(resource_type: str) -> Optional[type]:
+    """fhir.resources model of a resource type, None for other names"""
+    try:
+        module = importlib.import_module(f"fhir.resources.{resource_type.lower()}")
+    except ImportError:
+        return None
+    cls = getattr(module, resource_type, None)
+    from fhir.resources.resource import Resource
 
-@mixin
-class ResearchStudy(FHIRResearchStudy, CommonMixin):
-    ...
+    if isinstance(cls, type) and issubclass(cls, Resource):
+        return cls
+    return None
 
 
-@mixin
-class Flag(FHIRFlag, CommonMixin):
-    ...
+_CLASSES: Dict[str, type] = {}
+_CLASSES_LOCK = threading.Lock()
 
 
-@mixin
-class Organization(FHIROrganization, CommonMixin):
-    ...
+def _build_class(resource_type: str) -> Optional[type]:
+    with _CLASSES_LOCK:
+        cls = _CLASSES.get(resource_type)
+        if cls is not None:
+            return cls
+        fhir_class = _fhir_resource_class(resource_type)
+        if fhir_class is None:
+            return None
+        cls = _CLASSES[resource_type] = type(
+            resource_type,
+            (fhir_class, MIXINS.get(resource_type, CommonMixin)),
+            {"__module__": __name__, "__qualname__": resource_type},
+        )
+        # later accesses do not go through __getattr__ anymore
+        globals()[resource_type] = cls
+        return cls
 
 
-@mixin
-class CareTeam(FHIRCareTeam, CommonMixin):
-    ...
+def __getattr__(name: str) -> Any:
+    if name[:1].isupper():
+        cls = _build_class(name)
+        if cls is not None:
+            return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-@mixin
-class List(FHIRList, CommonMixin):
-    ...
+def mixin_with(*fn: Callable[..., Any]) -> type:
+    """mixin class holding the functions as methods, see `src.mixins`"""
+    return REGISTRY.mixin(*fn)
 
 
-@functools.lru_cache
-def mixin_with(*fn: Callable[..., Any]):
-    return type(f"{uuid.uuid4().hex}Mixin", (), {f.__name__: f for f in fn})
+def get_resource_class(resource_type: str) -> Type["Resource"]:
+    """helper class of the resource type, built on first use"""
+    cls = _CLASSES.get(resource_type) or _build_class(resource_type)
+    if cls is None:
+        raise ValueError(f"Unknown {resource_type=}")
+    return cls
@@ -0,0 +1,245 @@
+"""
+columnar bulk extraction: many resources x many paths -> column arrays
+"""
+import array
+import datetime
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Tuple
+
+from src.dict_path import compile_many, get_many
+from src.utils import bounded_map, chunked
+
+OUTPUTS = ("list", "array", "numpy")
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def _to_date(value: Any) -> datetime.date:
+    """FHIR date or dateTime to date, partial dates (YYYY, YYYY-MM) are padded"""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value)[:10]
+    if len(value) == 4:
+        value += "-01-01"
+    elif len(value) == 7:
+        value += "-01"
+    return datetime.date.fromisoformat(value)
+
+
+_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "object": lambda value: value,
+    "str": str,
+    "float": float,
+    "int": int,
+    "bool": bool,
+    "date": _to_date,
+}
+
+_ARRAY_TYPECODES = {"float": "d", "int": "q", "bool": "b", "date": "d"}
+
+_NUMPY_DTYPES = {
+    "float": "float64",
+    "int": "int64",
+    "bool": "bool",
+    "date": "datetime64[D]",
+}
+
+
+def _typed_default(name: str, dtype: str, default: Any) -> Any:
+    """default converted to the dtype of the column, as the values are"""
+    if default is None or dtype == "object":
+        return default
+    try:
+        return _CONVERTERS[dtype](default)
+    except (TypeError, ValueError) as e:
+        raise ValueError(
+            f"Can not convert {default=} of column {name=} to {dtype}"
+        ) from e
+
+
+def _normalize_spec(
+    spec: Mapping[str, Any], default: Any = None
+) -> Tuple[Tuple[str, Any, str, Any], ...]:
+    """
+    spec values are either a path, a (path, dtype) or a (path, dtype, default)
+    tuple, default being the one of every column otherwise
+    """
+    normalized = []
+    for name, value in spec.items():
+        if not isinstance(value, tuple):
+            value = (value, "object")
+        path, dtype, column_default = (*value, default)[:3]
+        if dtype not in _CONVERTERS:
+            raise ValueError(f"Unknown dtype {dtype=} for column {name=}")
+        normalized.append(
+            (name, path, dtype, _typed_default(name, dtype, column_default))
+        )
+    return tuple(normalized)
+
+
+def _extract_chunk(
+    args: Tuple[List[Mapping], Tuple[Tuple[str, Any, str, Any], ...]]
+) -> Dict[str, List[Any]]:
+    """
+    python values of a chunk of resources, None stands for missing values
+    without a default (module level so that it can be sent to a process pool)
+    """
+    resources, spec = args
+    trie = compile_many({name: path for name, path, _, _ in spec})
+    columns = {name: [] for name, _, _, _ in spec}
+    for resource in resources:
+        values = get_many(resource, trie, default=None)
+        for name, _, dtype, default in spec:
+            value = values[name]
+            if value is None:
+                columns[name].append(default)
+                continue
+            if dtype != "object":
+                try:
+                    value = _CONVERTERS[dtype](value)
+                except (TypeError, ValueError) as e:
+                    raise ValueError(
+                        f"Can not convert {value=} of column {name=} to {dtype}"
+                    ) from e
+            columns[name].append(value)
+    return columns
+
+
+def _check_missing(name: str, values: List[Any], dtype: str) -> List[Any]:
+    if any(v is None for v in values):
+        raise ValueError(
+            f"Missing values in {dtype} column {name=}, provide a default value"
+        )
+    return values
+
+
+def _to_output(name: str, values: List[Any], dtype: str, output: str) -> Any:
+    if output == "list" or dtype in ("object", "str"):
+        return values
+
+    if output == "array":
+        if dtype == "date":
+            values = [math.nan if v is None else (v - _EPOCH).days for v in values]
+        elif dtype == "float":
+            values = [math.nan if v is None else v for v in values]
+        else:
+            values = _check_missing(name, values, dtype)
+        return array.array(_ARRAY_TYPECODES[dtype], values)
+
+    import numpy as np
+
+    if dtype == "float":
+        values = [math.nan if v is None else v for v in values]
+    elif dtype in ("int", "bool"):
+        values = _check_missing(name, values, dtype)
+    return np.array(values, dtype=_NUMPY_DTYPES[dtype])
+
+
+def _check_output(output: str):
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown {output=}, expected one of {OUTPUTS}")
+    if output == "numpy":
+        try:
+            import numpy  # noqa: F401
+        except ImportError as e:
+            raise ImportError("numpy is required for output='numpy'") from e
+
+
+def iter_column_chunks(
+    resources: Iterable[Mapping],
+    spec: Mapping[str, Any],
+    /,
+    output: str = "list",
+    chunk_size: int = 10_000,
+    processes: int = None,
+    **kwargs,
+) -> Iterator[Dict[str, Any]]:
+    """
+    extract columns chunk by chunk, memory is bounded by `chunk_size` resources
+    Params:
+      resources: iterable of resource dicts, consumed lazily
+      spec: mapping {column name: path}, {column name: (path, dtype)} or
+        {column name: (path, dtype, default)}, dtype being one of object, str,
+        float, int, bool or date
+      output: list, array (array.array for numeric and date columns) or numpy
+      chunk_size: number of resources processed at once
+      processes: fan chunks out to a process pool of this size
+      default: value of missing items of the columns without their own
+        default. Defaults are converted to the dtype of typed columns
+        (ValueError when they can not be). Without a default missing items are
+        None in lists, NaN / NaT in float and date arrays, and int and bool
+        arrays raise ValueError
+    """
+    _check_output(output)
+    normalized = _normalize_spec(spec, kwargs.get("default"))
+    dtypes = {name: dtype for name, _, dtype, _ in normalized}
+    tasks = ((chunk, normalized) for chunk in chunked(resources, chunk_size))
+
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=processes)
+        raw_chunks = bounded_map(executor, _extract_chunk, tasks, 2 * processes)
+    else:
+        executor = None
+        raw_chunks = map(_extract_chunk, tasks)
+
+    try:
+        for raw in raw_chunks:
+            yield {
+                name: _to_output(name, values, dtypes[name], output)
+                for name, values in raw.items()
+            }
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def extract_columns(
+    resources: Iterable[Mapping],
+    spec: Mapping[str, Any],
+    /,
+    output: str = "list",
+    chunk_size: int = 10_000,
+    processes: int = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    flatten resources into columns, see `iter_column_chunks` for the parameters
+    """
+    columns: Dict[str, Any] = {}
+    numpy_chunks: Dict[str, List[Any]] = {}
+    for chunk in iter_column_chunks(
+        resources,
+        spec,
+        output=output,
+        chunk_size=chunk_size,
+        processes=processes,
+        **kwargs,
+    ):
+        for name, values in chunk.items():
+            if output == "numpy" and not isinstance(values, list):
+                numpy_chunks.setdefault(name, []).append(values)
+            elif name in columns:
+                columns[name].extend(values)
+            else:
+                columns[name] = values
+
+    if numpy_chunks:
+        import numpy as np
+
+        columns.update(
+            {name: np.concatenate(chunks) for name, chunks in numpy_chunks.items()}
+        )
+
+    if not columns:
+        columns = _empty_columns(spec, output)
+    return {name: columns[name] for name in spec}
+
+
+def _empty_columns(spec: Mapping[str, Any], output: str) -> Dict[str, Any]:
+    return {
+        name: _to_output(name, [], dtype, output)
+        for name, _, dtype, _ in _normalize_spec(spec)
+    }
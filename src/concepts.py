@@ -0,0 +1,122 @@
+"""
+index of the codings carried by a set of resources (contained resources, Bundle
+entries), to match many (system, code) pairs without walking them each time
+"""
+from collections import abc
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+Pairs = Union[Mapping[str, str], Iterable[Tuple[str, str]]]
+
+
+def _get(element: Any, key: str) -> Any:
+    if isinstance(element, abc.Mapping):
+        return element.get(key)
+    return getattr(element, key, None)
+
+
+def _pairs(systems: Pairs) -> Iterable[Tuple[str, str]]:
+    if isinstance(systems, abc.Mapping):
+        return systems.items()
+    return systems
+
+
+class ConceptIndex:
+    """
+    (system, code) -> positions of the resources carrying that coding in one
+    of the concepts returned by `getter`, which may return a CodeableConcept,
+    a list of them or None. Models, views and raw dicts are all accepted.
+    Queries take {system: code} like `find_contained_resource_with_matching_concept`
+    or an iterable of (system, code) pairs to look for several codes of a
+    system, and return resources in their original order.
+    """
+
+    def __init__(self, resources: Iterable[Any], getter: Callable[[Any], Any]):
+        self.getter = getter
+        self.resources: List[Any] = list(resources)
+        self._positions: Dict[Tuple[str, str], List[int]] = {}
+        for position, resource in enumerate(self.resources):
+            concepts = getter(resource)
+            if concepts is None:
+                continue
+            if not isinstance(concepts, list):
+                concepts = [concepts]
+            for concept in concepts:
+                for coding in _get(concept, "coding") or []:
+                    positions = self._positions.setdefault(
+                        (_get(coding, "system"), _get(coding, "code")), []
+                    )
+                    if not positions or positions[-1] != position:
+                        positions.append(position)
+
+    @classmethod
+    def from_resource(
+        cls, resource: Any, getter: Callable[[Any], Any]
+    ) -> "ConceptIndex":
+        """index of the contained resources of a resource"""
+        return cls(_get(resource, "contained") or [], getter)
+
+    @classmethod
+    def from_bundle(cls, bundle: Any, getter: Callable[[Any], Any]) -> "ConceptIndex":
+        """index of the resources of the entries of a Bundle"""
+        return cls(
+            (
+                resource
+                for entry in _get(bundle, "entry") or []
+                if (resource := _get(entry, "resource")) is not None
+            ),
+            getter,
+        )
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, pair: Tuple[str, str]) -> bool:
+        return pair in self._positions
+
+    def get(self, system: str, code: str) -> List[Any]:
+        """resources carrying the coding"""
+        return [self.resources[p] for p in self._positions.get((system, code), ())]
+
+    def _matching(self, systems: Pairs) -> List[List[int]]:
+        return [
+            positions
+            for pair in _pairs(systems)
+            if (positions := self._positions.get(pair))
+        ]
+
+    def find(self, systems: Pairs) -> Optional[Any]:
+        """first resource carrying any of the codings"""
+        matching = self._matching(systems)
+        if not matching:
+            return None
+        return self.resources[min(positions[0] for positions in matching)]
+
+    def find_all(self, systems: Pairs) -> List[Any]:
+        """resources carrying any of the codings"""
+        matching = set()
+        for positions in self._matching(systems):
+            matching.update(positions)
+        return [self.resources[p] for p in sorted(matching)]
+
+    def find_where(self, predicate: Callable[[str, str], bool]) -> Optional[Any]:
+        """
+        first resource carrying a coding accepted by predicate(system, code),
+        which is called once per distinct coding
+        """
+        matching = [
+            positions[0]
+            for (system, code), positions in self._positions.items()
+            if predicate(system, code)
+        ]
+        return self.resources[min(matching)] if matching else None
+
+    def match_all(self, systems: Pairs) -> List[Any]:
+        """resources carrying every one of the codings"""
+        pairs = list(_pairs(systems))
+        if not pairs:
+            return []
+        matching = self._matching(pairs)
+        if len(matching) < len(pairs):
+            return []
+        common = set(matching[0]).intersection(*matching[1:])
+        return [self.resources[p] for p in sorted(common)]
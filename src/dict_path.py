@@ -1,10 +1,56 @@
-from typing import Any, List, Mapping, Union, Tuple, Dict
+import copy
+import functools
+import warnings
+from collections import OrderedDict, abc
+from typing import Any, Hashable, Iterator, List, Mapping, Set, Tuple, Union, Dict
+
+# maximum number of compiled paths kept by `compile_path`
+PATH_CACHE_SIZE = 1024
+
+_MISSING = object()
+_WHERE = object()
 
 
 class PathError(Exception):
     ...
 
 
+class Where(tuple):
+    """
+    where-filter segment, selects the first element of a list for which every
+    (sub path, value) condition holds
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, conditions: Tuple[Tuple["CompiledPath", Any], ...]):
+        return super().__new__(cls, conditions)
+
+    def matches(self, element: Any) -> bool:
+        for sub_path, value in self:
+            if _resolve(element, sub_path) != value:
+                return False
+        return True
+
+    def __repr__(self):
+        return "{" + ", ".join(f"{p}: {v!r}" for p, v in self) + "}"
+
+
+class CompiledPath(tuple):
+    """
+    immutable, pre-tokenized path: str items are dict keys, int items are list
+    indices and `Where` items are where-filters
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"CompiledPath({str(self)!r})"
+
+    def __str__(self):
+        return ".".join(str(segment) for segment in self)
+
+
 def _get_path_as_list(path: Union[str, List[str]]) -> List[str]:
     """
     Handle path, may be a string or a list of strings
@@ -48,116 +94,779 @@ def _get_attribute_for_path(
     return current, path
 
 
+def _path_key(path: Union[str, List[Any]]) -> Hashable:
+    """
+    hashable cache key of a path, raises TypeError on unhashable where values
+    """
+    if isinstance(path, str):
+        return path
+    key = []
+    for p in path:
+        if isinstance(p, str):
+            key.append(p)
+            continue
+        if isinstance(p, abc.Mapping):
+            p = (
+                _WHERE,
+                tuple((_path_key(sub_path), value) for sub_path, value in p.items()),
+            )
+        hash(p)
+        key.append(p)
+    return tuple(key)
+
+
+def _compile_segment(segment: str) -> Union[str, int]:
+    return int(segment) if segment.isdecimal() else segment
+
+
+def _compile(path: Union[str, Tuple[Any, ...], List[Any]]) -> CompiledPath:
+    if isinstance(path, str):
+        return CompiledPath(_compile_segment(p) for p in path.split("."))
+    segments = []
+    for p in path:
+        if isinstance(p, str):
+            segments += [_compile_segment(s) for s in p.split(".")]
+        elif isinstance(p, CompiledPath):
+            segments += p
+        elif isinstance(p, abc.Mapping):
+            segments.append(Where(tuple((compile_path(k), v) for k, v in p.items())))
+        elif isinstance(p, tuple) and p and p[0] is _WHERE:
+            segments.append(Where(tuple((_compile(k), v) for k, v in p[1])))
+        else:
+            segments.append(p)
+    return CompiledPath(segments)
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def _compile_cached(key: Hashable) -> CompiledPath:
+    return _compile(key)
+
+
+def compile_path(path: Union[str, List[Any], CompiledPath]) -> CompiledPath:
+    """
+    compile a dotted path into an immutable `CompiledPath`, numeric items are
+    turned into list indices and `{sub.path: value}` mappings into where-filters.
+    Compiled paths are kept in a bounded LRU cache, every string based function
+    of this module goes through it.
+    Params:
+      path: str, list of str / mappings, or an already compiled path
+    """
+    if isinstance(path, CompiledPath):
+        return path
+    try:
+        key = _path_key(path)
+    except TypeError:
+        # unhashable where value, can not be cached
+        return _compile(path)
+    return _compile_cached(key)
+
+
+compile_path.cache_info = _compile_cached.cache_info
+compile_path.cache_clear = _compile_cached.cache_clear
+
+
+class WhereIndex:
+    """
+    opt-in index of where-filters: the first lookup on a list builds a
+    {sub path values: first matching element} table, later lookups on the same
+    list are dict lookups. Tables are rebuilt when the list length changes,
+    other in place mutations require a call to `invalidate`, which `_Updater`
+    does on every `set` / `append`.
+    Tables keep their list alive, at most `maxsize` of them are kept, the least
+    recently used being dropped first.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._tables: "OrderedDict[Tuple[int, Tuple], Tuple[Any, ...]]" = OrderedDict()
+
+    def lookup(
+        self, current: Any, sub_paths: Tuple[CompiledPath, ...], values: Tuple
+    ) -> Any:
+        """
+        first element of the list whose sub paths equal the values, _MISSING otherwise
+        """
+        if not isinstance(current, list):
+            return _MISSING
+        key = (id(current), sub_paths)
+        entry = self._tables.get(key)
+        # the list is kept in the entry, so its id can not be reused meanwhile
+        if entry is None or entry[0] is not current or entry[1] != len(current):
+            table = {}
+            for element in current:
+                element_values = tuple(_resolve(element, p) for p in sub_paths)
+                try:
+                    table.setdefault(element_values, element)
+                except TypeError:
+                    continue
+            entry = self._tables[key] = (current, len(current), table)
+        self._tables.move_to_end(key)
+        if len(self._tables) > self.maxsize:
+            self._tables.popitem(last=False)
+        try:
+            return entry[2].get(values, _MISSING)
+        except TypeError:
+            return _select_where(
+                current, Where(tuple(zip(sub_paths, values))), index=None
+            )
+
+    def select(self, current: Any, where: Where) -> Any:
+        return self.lookup(
+            current, tuple(p for p, _ in where), tuple(v for _, v in where)
+        )
+
+    def invalidate(self, current: Any = None):
+        """
+        drop the tables of the given list, or every table
+        """
+        if current is None:
+            self._tables.clear()
+            return
+        for key in [key for key in self._tables if key[0] == id(current)]:
+            del self._tables[key]
+
+    def __len__(self):
+        return len(self._tables)
+
+
+def _select_where(current: Any, where: Where, index: WhereIndex = None) -> Any:
+    """
+    first element of the list matching the where-filter, _MISSING otherwise
+    """
+    if index is not None:
+        return index.select(current, where)
+    if not isinstance(current, list):
+        return _MISSING
+    for element in current:
+        if where.matches(element):
+            return element
+    return _MISSING
+
+
+def _step(
+    current: Any, segment: Union[str, int, Where], index: WhereIndex = None
+) -> Any:
+    """
+    resolve a single segment, returns _MISSING if it can not be resolved
+    """
+    if segment.__class__ is Where:
+        return _select_where(current, segment, index)
+    try:
+        return current[segment]
+    except (KeyError, IndexError, TypeError):
+        return _MISSING
+
+
+def _resolve(current: Any, segments: CompiledPath, index: WhereIndex = None) -> Any:
+    """
+    iterative walk of the compiled path, returns _MISSING if it can not be resolved
+    """
+    for segment in segments:
+        if segment.__class__ is Where:
+            current = _select_where(current, segment, index)
+            if current is _MISSING:
+                return _MISSING
+            continue
+        try:
+            current = current[segment]
+        except (KeyError, IndexError, TypeError):
+            return _MISSING
+    return current
+
+
+def _raise_for(source: Any, segments: CompiledPath, index: WhereIndex = None):
+    """
+    walk again the path to raise a meaningful PathError
+    """
+    current = source
+    for segment in segments:
+        value = _step(current, segment, index)
+        if value is _MISSING:
+            if segment.__class__ is Where:
+                raise PathError("No matching value found")
+            if segment.__class__ is int:
+                raise PathError(f"Error accessing list index '{segment}'")
+            raise PathError(f"Error accessing dict item '{segment}'")
+        current = value
+    raise PathError("Unexpected error")  # pragma: no cover
+
+
 def get_attribute_for_path(
     source_inst: Mapping, /, path: Union[str, List[Union[str, Mapping]]], **kwargs
 ):
     """
     fast implementation of JMESpath, go fetch an attribute described by the path
     Params:
-      path: str
+      path: str, list or compiled path
+      source_inst: dict
+      default: returned when the path can not be resolved, PathError raised otherwise
+      index: WhereIndex used to resolve where-filters
+    """
+    segments = compile_path(path)
+    index = kwargs.get("index")
+    value = _resolve(source_inst, segments, index)
+    if value is _MISSING:
+        if "default" in kwargs:
+            return kwargs["default"]
+        _raise_for(source_inst, segments, index)
+    return value
+
+
+class PathTrie:
+    """
+    several compiled paths merged into a prefix trie, aliases sharing a prefix
+    are resolved once by `get_many`. Sibling single condition where-filters on
+    the same sub path are answered by a single scan of the list.
+    """
+
+    __slots__ = ("children", "aliases", "_plan", "_all_aliases")
+
+    def __init__(self):
+        self.children: Dict[Any, Tuple[Any, "PathTrie"]] = {}
+        self.aliases: List[Hashable] = []
+        self._plan = None
+        self._all_aliases = None
+
+    def add(self, alias: Hashable, path: Union[str, List[Any], CompiledPath]):
+        node = self
+        for segment in compile_path(path):
+            node._plan = node._all_aliases = None
+            try:
+                key = (segment.__class__, segment)
+                hash(key)
+            except TypeError:
+                # unhashable where value, no prefix sharing for this one
+                key = id(segment)
+            if key not in node.children:
+                node.children[key] = (segment, PathTrie())
+            node = node.children[key][1]
+        node._all_aliases = None
+        node.aliases.append(alias)
+        return self
+
+    def all_aliases(self) -> List[Hashable]:
+        if self._all_aliases is None:
+            aliases = list(self.aliases)
+            for _, child in self.children.values():
+                aliases += child.all_aliases()
+            self._all_aliases = aliases
+        return self._all_aliases
+
+    def plan(self) -> List[Tuple[Any, ...]]:
+        """
+        children grouped as (segment, child) steps and (sub path, {value: child})
+        where-filter groups
+        """
+        if self._plan is None:
+            steps, groups = [], {}
+            for key, (segment, child) in self.children.items():
+                if (
+                    segment.__class__ is Where
+                    and len(segment) == 1
+                    and key != id(segment)
+                ):
+                    sub_path, value = segment[0]
+                    groups.setdefault(sub_path, {})[value] = child
+                else:
+                    steps.append((segment, child))
+            self._plan = [
+                *steps,
+                *(
+                    (_WHERE, sub_path, by_value)
+                    for sub_path, by_value in groups.items()
+                ),
+            ]
+        return self._plan
+
+
+def _scan_where_group(
+    current: Any, sub_path: CompiledPath, by_value: Mapping[Any, PathTrie]
+) -> Dict[Any, Any]:
+    """
+    single scan of a list, first element for each requested sub path value
+    """
+    found = {}
+    if not isinstance(current, list):
+        return found
+    remaining = len(by_value)
+    for element in current:
+        value = _resolve(element, sub_path)
+        try:
+            if value not in by_value or value in found:
+                continue
+        except TypeError:
+            continue
+        found[value] = element
+        remaining -= 1
+        if not remaining:
+            break
+    return found
+
+
+def _build_trie(paths: Mapping[Hashable, Any]) -> PathTrie:
+    trie = PathTrie()
+    for alias, path in paths.items():
+        trie.add(alias, path)
+    return trie
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def _compile_many_cached(key: Tuple[Tuple[Hashable, Hashable], ...]) -> PathTrie:
+    trie = PathTrie()
+    for alias, path_key in key:
+        trie.add(alias, _compile_cached(path_key))
+    return trie
+
+
+def compile_many(paths: Union[Mapping[Hashable, Any], PathTrie]) -> PathTrie:
+    """
+    compile a mapping {alias: path} into a `PathTrie`, cached like `compile_path`
+    """
+    if isinstance(paths, PathTrie):
+        return paths
+    try:
+        key = tuple((alias, _path_key(path)) for alias, path in paths.items())
+        hash(key)
+    except TypeError:
+        return _build_trie(paths)
+    return _compile_many_cached(key)
+
+
+def get_many(
+    source_inst: Mapping, /, paths: Union[Mapping[Hashable, Any], PathTrie], **kwargs
+) -> Dict[Hashable, Any]:
+    """
+    fetch several attributes in a single traversal, shared prefixes (and their
+    where-filters) are resolved only once
+    Params:
       source_inst: dict
+      paths: mapping {alias: path} or a trie built by `compile_many`, the latter
+        skips building the cache key and is preferred in hot loops
+      default: value of unresolved aliases, PathError raised otherwise
+      index: WhereIndex used to resolve where-filters
+      interner: `src.intern.Interner` deduplicating the str values, for
+        results kept in memory
     """
+    trie = compile_many(paths)
     default_defined = "default" in kwargs
-    default = default_defined and kwargs["default"] or None
+    default = kwargs.get("default")
+    index = kwargs.get("index")
 
-    path_as_list = _get_path_as_list(path)
-    if not path_as_list:
-        return source_inst
+    result = {}
+    missing = []
+    stack = [(trie, source_inst)]
+    while stack:
+        node, current = stack.pop()
+        for alias in node.aliases:
+            result[alias] = current
+        for step in node._plan or node.plan():
+            if step[0] is _WHERE:
+                if index is None:
+                    found = _scan_where_group(current, step[1], step[2])
+                for value, child in step[2].items():
+                    if index is not None:
+                        element = index.lookup(current, (step[1],), (value,))
+                    else:
+                        element = found.get(value, _MISSING)
+                    if element is _MISSING:
+                        missing += child.all_aliases()
+                    else:
+                        stack.append((child, element))
+                continue
+            segment, child = step
+            if segment.__class__ is Where:
+                value = _select_where(current, segment, index)
+            else:
+                try:
+                    value = current[segment]
+                except (KeyError, IndexError, TypeError):
+                    value = _MISSING
+            if value is _MISSING:
+                missing += child.all_aliases()
+            elif child.children:
+                stack.append((child, value))
+            else:
+                for alias in child.aliases:
+                    result[alias] = value
 
-    current_value, current_path = _get_attribute_for_path(
-        source_inst, path_as_list, default_defined=default_defined, default=default
-    )
+    if missing:
+        if not default_defined:
+            raise PathError(f"Could not resolve paths for aliases {missing}")
+        for alias in missing:
+            result[alias] = default
+    interner = kwargs.get("interner")
+    if interner is not None:
+        for alias, value in result.items():
+            if value.__class__ is str:
+                result[alias] = interner.string(value)
+    return result
+
+
+_COPYABLE = (dict, list, set)
+
+
+def _own(parent: Any, key: Any, value: Any, copied: Set[int] = None) -> Any:
+    """
+    copy-on-write: replace parent[key] by a shallow copy of value owned by the
+    current update, `copied` holding the ids of the owned containers
+    """
+    if copied is None or id(value) in copied or not isinstance(value, _COPYABLE):
+        return value
+    value = value.copy() if value.__class__ in _COPYABLE else copy.copy(value)
+    parent[key] = value
+    copied.add(id(value))
+    return value
+
+
+def _own_root(target: Any, copied: Set[int] = None) -> Any:
+    if copied is None:
+        return target
+    target = target.copy() if target.__class__ in _COPYABLE else copy.copy(target)
+    copied.add(id(target))
+    return target
+
+
+def _position(current: List[Any], element: Any) -> int:
+    return next(i for i, e in enumerate(current) if e is element)
+
+
+def _child_for_set(
+    current: Any,
+    segment: Union[str, int, Where],
+    next_segment: Union[str, int, Where],
+    where_index: WhereIndex = None,
+    copied: Set[int] = None,
+) -> Any:
+    """
+    value of current at segment, missing dicts and lists are created according
+    to the next segment. In copy-on-write mode the returned value is a copy
+    owned by the update.
+    """
+    if segment.__class__ is Where:
+        element = _select_where(current, segment, where_index)
+        if element is _MISSING:
+            raise PathError(f"No matching value found for {segment}")
+        if copied is None:
+            return element
+        return _own(current, _position(current, element), element, copied)
 
-    if (
-        current_value
-        and isinstance(current_value, List)
-        and current_path
-        and isinstance(current_path[0], Mapping)
-    ):
-        sub_path: Mapping = current_path.pop(0)
-        current_value = _get_attribute_for_path_eq(
-            current_value, *list(sub_path.items())[0], **kwargs
+    # special case current numeric value
+    if segment.__class__ is int:
+        if not isinstance(current, list):
+            raise PathError(f"Got a dict instead of a list for index {segment}")
+        while segment >= len(current):
+            current.append({})
+            if copied is not None:
+                copied.add(id(current[-1]))
+        return _own(current, segment, current[segment], copied)
+
+    if not isinstance(current, dict):
+        raise PathError(
+            f"Got list instead of a dict...Wrong specified path {segment=} ?"
         )
-        if current_value is None:
-            if default_defined:
-                return default
-            raise PathError("No matching value found")
+    # not in current
+    if segment not in current:
+        current[segment] = {} if next_segment.__class__ is str else []
+        if copied is not None:
+            copied.add(id(current[segment]))
 
-    if not current_path:
-        return current_value
+    # move forward
+    return _own(current, segment, current[segment], copied)
 
-    return get_attribute_for_path(current_value, current_path, **kwargs)
 
+def _descend_for_set(
+    current: Any,
+    segments: CompiledPath,
+    where_index: WhereIndex = None,
+    copied: Set[int] = None,
+) -> Any:
+    """
+    walk all the segments but the last one, creating missing dicts and lists
+    """
+    for index in range(len(segments) - 1):
+        current = _child_for_set(
+            current, segments[index], segments[index + 1], where_index, copied
+        )
+    return current
 
-def _get_attribute_for_path_eq(
-    source: List[Mapping], path: Union[str, List[str]], value: Any, **kwargs
-):
-    for s in source:
-        attr_value = get_attribute_for_path(s, path, **kwargs)
-        if attr_value == value:
-            return s
-    return None
+
+def _descend_owned(
+    current: Any,
+    segments: CompiledPath,
+    where_index: WhereIndex = None,
+    copied: Set[int] = None,
+) -> Any:
+    """
+    walk existing segments without creating anything, PathError otherwise
+    """
+    source = current
+    for segment in segments:
+        value = _step(current, segment, where_index)
+        if value is _MISSING:
+            _raise_for(source, segments, where_index)
+        if copied is not None:
+            key = _position(current, value) if segment.__class__ is Where else segment
+            value = _own(current, key, value, copied)
+        current = value
+    return current
+
+
+def _assign(current: Any, last: Union[str, int, Where], value: Any):
+    if last.__class__ is int:
+        if not isinstance(current, list):
+            raise PathError(f"Got a dict instead of a list for index {last}")
+        current.append(value)
+    elif last.__class__ is Where:
+        raise PathError("last item of the path can not be a where filter")
+    else:
+        if not isinstance(current, dict):
+            raise PathError(
+                f"Got list instead of a dict...Wrong specified path {last=} ?"
+            )
+        current[last] = value
 
 
-def set_attribute_for_path(target: Mapping, /, path: Union[str, List[str]], value: Any):
+def set_attribute_for_path(
+    target: Mapping,
+    /,
+    path: Union[str, List[str]],
+    value: Any,
+    index: WhereIndex = None,
+    persistent: bool = False,
+):
     """
     set a value in a dictionary given a path, meaning first path cannot be numeric
     Params:
       target: mapping in which the value will be set at the given path
-      path: str or list of string
+      path: str, list of string or compiled path
       value: the value to be set
+      index: WhereIndex used to resolve where-filters, invalidated by the update
+      persistent: leave target untouched and return an updated copy, only the
+        dicts and lists along the path are copied, other subtrees are shared
     """
     if not path:
         return target
 
-    path_as_list = _get_path_as_list(path)
+    segments = compile_path(path)
 
-    if path_as_list[0].isnumeric():
+    if segments[0].__class__ is int:
         raise PathError("first item of the path can not be an integer")
 
-    current = target
+    copied = set() if persistent else None
+    target = _own_root(target, copied)
 
-    skip = False
+    # inserting last value
+    _assign(_descend_for_set(target, segments, index, copied), segments[-1], value)
 
-    for index in range(len(path_as_list) - 1):
+    if index is not None:
+        index.invalidate()
+    return target
 
-        if skip is True:
-            skip = False
-            continue
 
-        current_value, next_value = path_as_list[index], path_as_list[index + 1]
-        # special case current numeric value
-        if current_value.isnumeric():
-            while int(current_value) >= len(current):
-                current.append({})
-            current = current[int(current_value)]
-            continue
+class PatchOp:
+    """
+    operation of `apply_patch`, plain values given to `apply_patch` are set with
+    the `set_attribute_for_path` semantics
+    """
 
-        # not in current
-        if current_value not in current:
-            if next_value.isnumeric():
-                current[current_value] = []
-            else:
-                if isinstance(current, List):
-                    raise PathError(
-                        f"Got list instead of a dict...Wrong specified path {current_value=} ?"
-                    )
-                assert isinstance(current, Dict), "Unexpected error"
-                current[current_value] = {}
+    __slots__ = ("value",)
+    kind = "set"
+    # missing dicts and lists along the path are created
+    creates = True
 
-        # move forward
-        current = current[current_value]
+    def __init__(self, value: Any = None):
+        self.value = value
 
-        if isinstance(current, list) and isinstance(next_value, Mapping):
-            current = _get_attribute_for_path_eq(current, *list(next_value.items())[0])
-            skip = True
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.value!r})"
 
-    # inserting last value
-    last = path_as_list[-1]
-    if last.isnumeric():
-        current.append(value)
-    else:
-        current[last] = value
+    def __eq__(self, other):
+        return self.__class__ is other.__class__ and self.value == other.value
+
+
+class Add(PatchOp):
+    """set the value at the path, whose parents must exist (JSON Patch add)"""
+
+    __slots__ = ()
+    creates = False
+
+
+class Append(PatchOp):
+    """append the value to the list at the path, created if missing"""
+
+    __slots__ = ()
+    kind = "append"
+
+
+class Remove(PatchOp):
+    """remove the dict item, list item or where-filter match at the path"""
+
+    __slots__ = ()
+    kind = "remove"
+    creates = False
+
+
+class Replace(PatchOp):
+    """replace the existing item at the path, PathError if it is missing"""
+
+    __slots__ = ()
+    kind = "replace"
+    creates = False
+
+
+class Insert(PatchOp):
+    """insert the value in the list at the index of the path, `-` appends"""
+
+    __slots__ = ()
+    kind = "insert"
+    creates = False
+
+
+class Expect(PatchOp):
+    """check the value at the path, PathError otherwise"""
+
+    __slots__ = ()
+    kind = "test"
+    creates = False
+
+
+def _unescape_pointer_token(token: str) -> Union[str, int]:
+    token = token.replace("~1", "/").replace("~0", "~")
+    return int(token) if token.isdecimal() else token
+
+
+def json_patch_operations(
+    patch: List[Mapping[str, Any]]
+) -> List[Tuple[CompiledPath, PatchOp]]:
+    """
+    convert RFC 6902 JSON Patch operations (add, replace, remove, test) into
+    `apply_patch` operations, none of them creates missing parents
+    """
+    operations = []
+    for operation in patch:
+        op, pointer = operation["op"], operation["path"]
+        if not pointer.startswith("/"):
+            raise PathError(f"Unsupported JSON Patch {pointer=}")
+        segments = CompiledPath(
+            _unescape_pointer_token(t) for t in pointer[1:].split("/")
+        )
+        value = operation.get("value")
+        if op == "add" and (segments[-1] == "-" or segments[-1].__class__ is int):
+            operations.append((segments, Insert(value)))
+        elif op == "add":
+            operations.append((segments, Add(value)))
+        elif op == "replace":
+            operations.append((segments, Replace(value)))
+        elif op == "remove":
+            operations.append((segments, Remove()))
+        elif op == "test":
+            operations.append((segments, Expect(value)))
+        else:
+            raise PathError(f"Unsupported JSON Patch operation {op=}")
+    return operations
+
+
+def _apply_op(
+    current: Any,
+    last: Union[str, int, Where],
+    op: PatchOp,
+    index: WhereIndex = None,
+    copied: Set[int] = None,
+):
+    kind = op.kind
+    if kind == "set":
+        _assign(current, last, op.value)
+        return
+    if kind == "append":
+        container = _child_for_set(current, last, 0, index, copied)
+        if isinstance(container, set):
+            container.add(op.value)
+        elif isinstance(container, list):
+            container.append(op.value)
+        else:
+            raise PathError(f"Can not add value to {last=}, this is not a list")
+        return
+    if kind == "test":
+        if _step(current, last, index) != op.value:
+            raise PathError(f"Test failed for {last=}, expected {op.value!r}")
+        return
+    if kind == "insert":
+        if not isinstance(current, list) or (last.__class__ is not int and last != "-"):
+            raise PathError(f"Can only insert in a list, got {last=}")
+        if last == "-":
+            current.append(op.value)
+            return
+        if last > len(current):
+            raise PathError(f"Error accessing list index '{last}'")
+        current.insert(last, op.value)
+        return
+
+    if last.__class__ is Where:
+        element = _select_where(current, last, index)
+        if element is _MISSING:
+            raise PathError(f"No matching value found for {last}")
+        last = _position(current, element)
+    if kind == "replace":
+        if last.__class__ is int:
+            if not isinstance(current, list) or last >= len(current):
+                raise PathError(f"Error accessing list index '{last}'")
+        elif not isinstance(current, dict) or last not in current:
+            raise PathError(f"Error accessing dict item '{last}'")
+        current[last] = op.value
+        return
+    # remove
+    try:
+        del current[last]
+    except IndexError as e:
+        raise PathError(f"Error accessing list index '{last}'") from e
+    except (KeyError, TypeError) as e:
+        raise PathError(f"Error accessing dict item '{last}'") from e
+
+
+def apply_patch(
+    target: Mapping,
+    /,
+    operations: List[Union[Tuple[Any, Any], Mapping[str, Any]]],
+    json_patch: bool = False,
+    index: WhereIndex = None,
+    persistent: bool = False,
+):
+    """
+    apply a list of (path, value | PatchOp) operations one by one, the result
+    is the one of sequential `set_attribute_for_path` calls. Plain values are
+    set like `set_attribute_for_path` does, `Append`, `Add`, `Remove`,
+    `Replace` and `Insert` ops are also available.
+    In persistent mode the dicts and lists along the paths are copied once for
+    the whole patch, rather than once per operation.
+    Params:
+      target: mapping updated in place
+      operations: list of (path, value) or JSON Patch operations
+      json_patch: operations follow RFC 6902
+      index: WhereIndex used to resolve where-filters, invalidated by the patch
+      persistent: leave target untouched and return a patched copy sharing
+        every untouched subtree with target
+    """
+    if json_patch:
+        operations = json_patch_operations(operations)
+
+    copied = set() if persistent else None
+    target = _own_root(target, copied)
+
+    for path, op in operations:
+        if not isinstance(op, PatchOp):
+            op = PatchOp(op)
+        segments = compile_path(path)
+        if not segments:
+            raise PathError("Can not patch the root of the document")
+        if segments[0].__class__ is int:
+            raise PathError("first item of the path can not be an integer")
+        if op.creates:
+            parent = _descend_for_set(target, segments, index, copied)
+        else:
+            parent = _descend_owned(target, segments[:-1], index, copied)
+        _apply_op(parent, segments[-1], op, index, copied)
+        if index is not None and op.kind != "test":
+            index.invalidate()
 
     return target
 
@@ -170,20 +879,45 @@ class _ObjectHandler:
 
 
 class _Updater(_ObjectHandler):
+    """
+    in persistent mode every update returns a new copy, which the updater then
+    works on, so that chained updates are kept
+    """
+
     def set(self, path: Union[str, List[str]], value: Any):
-        return set_attribute_for_path(
-            self.obj, self.path + _get_path_as_list(path), value
+        result = set_attribute_for_path(
+            self.obj,
+            self.path + _get_path_as_list(path),
+            value,
+            index=self.kwargs.get("index"),
+            persistent=self.kwargs.get("persistent", False),
         )
+        self.obj = result
+        return result
 
     def append(self, value: Any):
-        value_for_path = get_attribute_for_path(
-            self.obj, path=self.path, **self.kwargs
-        )
+        index = self.kwargs.get("index")
+        value_for_path = get_attribute_for_path(self.obj, path=self.path, index=index)
         if not isinstance(value_for_path, (list, set, tuple)):
             raise PathError(
                 f"Can not add value to path {self.path=}, this is not an iterable"
             )
 
+        if self.kwargs.get("persistent"):
+            if isinstance(value_for_path, tuple):
+                self.obj = set_attribute_for_path(
+                    self.obj,
+                    self.path,
+                    tuple([*list(value_for_path), value]),
+                    index=index,
+                    persistent=True,
+                )
+            else:
+                self.obj = apply_patch(
+                    self.obj, [(self.path, Append(value))], index=index, persistent=True
+                )
+            return self.obj
+
         if isinstance(value_for_path, list):
             value_for_path.append(value)
         elif isinstance(value_for_path, set):
@@ -194,6 +928,8 @@ class _Updater(_ObjectHandler):
                 self.path,
                 tuple([*list(value_for_path), value]),
             )
+        if index is not None:
+            index.invalidate(value_for_path)
         return self.obj
 
 
@@ -205,7 +941,11 @@ class _Getter(_ObjectHandler):
 
 
 class _Finder:
-    """ """
+    """
+    fluent api on top of the path functions, `finder(obj, index=WhereIndex())`
+    shares where-filter indexes between queries on the same document and
+    `finder(obj, persistent=True)` updates return a copy instead of mutating obj
+    """
 
     def __init__(self, obj: Dict[str, Any], **kwargs):
         self.obj = obj
@@ -227,14 +967,107 @@ class _Finder:
         self, path: Union[List[str], str], where: Dict[str, Any] = None
     ) -> _Updater:
         self._update(path, where)
-        return _Updater(self.obj, self.path)
+        return _Updater(
+            self.obj,
+            self.path,
+            index=self.kwargs.get("index"),
+            persistent=self.kwargs.get("persistent", False),
+        )
 
 
 # alias
 finder = _Finder
 
 
+# wildcard segment of `iter_attribute_for_path`, fans out over list items or dict values
+WILDCARD = "*"
+
+
+def _fan_out(
+    current: Any, segment: Union[str, int, Where]
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    (concrete segment, value) pairs reached from current through the segment
+    """
+    if segment.__class__ is Where:
+        if isinstance(current, list):
+            for position, element in enumerate(current):
+                if segment.matches(element):
+                    yield position, element
+    elif segment == WILDCARD:
+        if isinstance(current, list):
+            yield from enumerate(current)
+        elif isinstance(current, abc.Mapping):
+            yield from current.items()
+    else:
+        value = _step(current, segment)
+        if value is not _MISSING:
+            yield segment, value
+
+
+def iter_attribute_for_path(
+    source_inst: Mapping,
+    /,
+    path: Union[str, List[Union[str, Mapping]]],
+    limit: int = None,
+    first: bool = False,
+) -> Iterator[Tuple[CompiledPath, Any]]:
+    """
+    lazily yield every (concrete path, value) pair matching the path. `*` fans out
+    over every item of a list (or value of a dict) and where-filters over every
+    matching item, e.g. `entry.*.resource.identifier.*.value`. Unresolved branches
+    are skipped. Concrete paths can be given back to the other path functions.
+    Params:
+      source_inst: dict
+      path: str, list or compiled path
+      limit: stop after this number of matches
+      first: stop after the first match, same as limit=1
+    """
+    segments = compile_path(path)
+    if first:
+        limit = 1
+    if limit is not None and limit <= 0:
+        return
+    if not segments:
+        yield segments, source_inst
+        return
+
+    depth = len(segments)
+    count = 0
+    prefix = []
+    stack = [_fan_out(source_inst, segments[0])]
+    while stack:
+        try:
+            key, value = next(stack[-1])
+        except StopIteration:
+            stack.pop()
+            if prefix:
+                prefix.pop()
+            continue
+        level = len(stack)
+        if level < depth:
+            prefix.append(key)
+            stack.append(_fan_out(value, segments[level]))
+            continue
+        yield CompiledPath((*prefix, key)), value
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
+
 def get_attribute_for_path_gen(source_inst: Mapping, /, path: Union[str, List[str]]):
+    """
+    deprecated, use `iter_attribute_for_path` instead
+    """
+    warnings.warn(
+        "get_attribute_for_path_gen is deprecated, use iter_attribute_for_path",
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    yield from _get_attribute_for_path_gen(source_inst, path)
+
+
+def _get_attribute_for_path_gen(source_inst: Mapping, /, path: Union[str, List[str]]):
     current, path_as_list = _get_attribute_for_path(source_inst, path)
 
     if not path_as_list or current is None:
@@ -247,4 +1080,4 @@ def get_attribute_for_path_gen(source_inst: Mapping, /, path: Union[str, List[st
     else:
         yield current, path_as_list
 
-    yield from get_attribute_for_path_gen(current, path_as_list)
+    yield from _get_attribute_for_path_gen(current, path_as_list)
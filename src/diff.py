@@ -0,0 +1,183 @@
+"""
+structural diff of two resources as a RFC 6902 JSON Patch
+"""
+import json
+from collections import abc
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+from src.merger import DEFAULT_LIST_KEYS, element_key, fingerprint
+
+Operation = Dict[str, Any]
+
+# equal JSON containers are skipped at once, compared at C speed
+_PLAIN = (dict, list)
+_JSON = (str, int, float, bool, type(None))
+
+
+def _escape(token: Union[str, int]) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _fields(model: BaseModel, by_alias: bool) -> Dict[str, Any]:
+    """set values of a model by alias or name, as dumped by dict()"""
+    return {
+        field.alias if by_alias else name: value
+        for name, field in model.__fields__.items()
+        if (value := getattr(model, name)) is not None and value != []
+    }
+
+
+def _dump(value: Any, by_alias: bool) -> Any:
+    """JSON value of a model, a list or a primitive (dates, decimals...)"""
+    if value.__class__ in _JSON:
+        return value
+    if isinstance(value, BaseModel):
+        return json.loads(value.json(by_alias=by_alias))
+    if isinstance(value, list):
+        return [_dump(v, by_alias) for v in value]
+    if isinstance(value, abc.Mapping):
+        return {k: _dump(v, by_alias) for k, v in value.items()}
+    return pydantic_encoder(value)
+
+
+def _list_keys(
+    elements: List[Any], keys: Optional[Tuple[str, ...]]
+) -> Optional[List[Any]]:
+    """
+    identity of each element, by merge keys or by value, None when two
+    elements share the same identity
+    """
+    identities = []
+    for element in elements:
+        identity = element_key(element, keys) if keys else None
+        identities.append(("=", fingerprint(element)) if identity is None else identity)
+    return identities if len(set(identities)) == len(identities) else None
+
+
+def _diff_list(
+    a: List[Any],
+    b: List[Any],
+    pointer: str,
+    keys: Optional[Tuple[str, ...]],
+    operations: List[Operation],
+    options: "_Options",
+):
+    if len(a) == len(b) and not keys:
+        for position, (x, y) in enumerate(zip(a, b)):
+            _diff(x, y, f"{pointer}/{position}", operations, options)
+        return
+
+    a_keys, b_keys = _list_keys(a, keys), _list_keys(b, keys)
+    if a_keys is None or b_keys is None:
+        operations.append(options.replace(pointer, b))
+        return
+    b_positions = {key: position for position, key in enumerate(b_keys)}
+    kept = [key for key in a_keys if key in b_positions]
+    a_positions = set(kept)
+    # reordered elements, a single replace is shorter than moves
+    if kept != [key for key in b_keys if key in a_positions]:
+        operations.append(options.replace(pointer, b))
+        return
+
+    # removals from the end keep the pointers of the previous ones valid
+    for position in range(len(a) - 1, -1, -1):
+        if a_keys[position] not in b_positions:
+            operations.append({"op": "remove", "path": f"{pointer}/{position}"})
+    remaining = iter(element for key, element in zip(a_keys, a) if key in b_positions)
+    # once the removals are done, the kept elements are in the order of b and
+    # the inserted ones take their final position
+    for position, (key, element) in enumerate(zip(b_keys, b)):
+        if key in a_positions:
+            _diff(
+                next(remaining), element, f"{pointer}/{position}", operations, options
+            )
+        else:
+            operations.append(options.add(f"{pointer}/{position}", element))
+
+
+class _Options:
+    __slots__ = ("by_alias", "list_keys", "plain")
+
+    def __init__(
+        self, by_alias: bool, list_keys: Mapping[str, Tuple[str, ...]], plain: bool
+    ):
+        self.by_alias = by_alias
+        self.list_keys = list_keys
+        # JSON values only, comparing containers holding models would dump them
+        self.plain = plain
+
+    def json(self, value: Any) -> Any:
+        return value if self.plain else _dump(value, self.by_alias)
+
+    def add(self, pointer: str, value: Any) -> Operation:
+        return {"op": "add", "path": pointer, "value": self.json(value)}
+
+    def replace(self, pointer: str, value: Any) -> Operation:
+        return {"op": "replace", "path": pointer, "value": self.json(value)}
+
+
+def _diff(
+    a: Any,
+    b: Any,
+    pointer: str,
+    operations: List[Operation],
+    options: _Options,
+    field: str = None,
+):
+    if a is b:
+        return
+    # equal reprs rule out True == 1 == 1.0, reordered keys are walked
+    if options.plain and a.__class__ in _PLAIN and a == b and repr(a) == repr(b):
+        return
+    if isinstance(a, BaseModel) and isinstance(b, BaseModel):
+        # models are walked attribute by attribute, sub-models reused by
+        # merge_with are skipped by the identity check
+        a, b = _fields(a, options.by_alias), _fields(b, options.by_alias)
+    if isinstance(a, abc.Mapping) and isinstance(b, abc.Mapping):
+        for key in a:
+            if key not in b:
+                operations.append({"op": "remove", "path": f"{pointer}/{_escape(key)}"})
+        for key, value in b.items():
+            child = f"{pointer}/{_escape(key)}"
+            if key not in a:
+                operations.append(options.add(child, value))
+            else:
+                _diff(a[key], value, child, operations, options, key)
+    elif isinstance(a, list) and isinstance(b, list):
+        _diff_list(a, b, pointer, options.list_keys.get(field), operations, options)
+    else:
+        # primitives of models compared in JSON, e.g. datetimes equal in
+        # different time zones
+        a, b = options.json(a), options.json(b)
+        if a.__class__ is not b.__class__ or a != b:
+            operations.append({"op": "replace", "path": pointer, "value": b})
+
+
+def diff(
+    a: Union[BaseModel, Mapping], b: Union[BaseModel, Mapping], /, **kwargs
+) -> List[Operation]:
+    """
+    minimal RFC 6902 JSON Patch turning a into b, empty when they are equal.
+    Identical subtrees are skipped without being compared, which makes the
+    diff of a resource and its `merge_with` result cheap. The patch can be
+    applied with `dict_path.apply_patch(..., json_patch=True)`.
+    Params:
+      by_alias: dump models by alias
+      list_keys: {field: element keys} matching list elements, see
+        `src.merger.DEFAULT_LIST_KEYS`, other lists are compared by value
+    """
+    if not isinstance(a, (BaseModel, abc.Mapping)) or not isinstance(
+        b, (BaseModel, abc.Mapping)
+    ):
+        raise TypeError("Can only diff models or mappings")
+    options = _Options(
+        kwargs.get("by_alias", True),
+        kwargs.get("list_keys", DEFAULT_LIST_KEYS),
+        not isinstance(a, BaseModel) and not isinstance(b, BaseModel),
+    )
+    operations: List[Operation] = []
+    _diff(a, b, "", operations, options)
+    return operations
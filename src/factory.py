@@ -1,5 +1,10 @@
 # factory
-from typing import Union, List
+import functools
+import itertools
+import math
+import os
+import random
+from typing import Any, Callable, Iterable, Optional, Type, Union, List
 from uuid import uuid4
 
 from fhir.resources.codeableconcept import CodeableConcept
@@ -7,8 +12,29 @@ from fhir.resources.coding import Coding
 from fhir.resources.extension import Extension
 from fhir.resources.identifier import Identifier
 from fhir.resources.reference import Reference
+from pydantic import BaseModel
 
 from src.enum import TermURL
+from src.terminology import TerminologyStore
+
+
+def coding(
+    system: Union[TermURL, str],
+    code: str,
+    /,
+    display: str = None,
+    store: TerminologyStore = None,
+) -> Coding:
+    """
+    factory for coding, with a store the code is checked (ValueError when
+    unknown) and its display filled in
+    """
+    system = system.value if isinstance(system, TermURL) else system
+    if store is not None:
+        if not store.contains(system, code):
+            raise ValueError(f"Unknown {code=} in {system=}")
+        display = display or store.display(system, code)
+    return Coding(system=system, code=code, display=display)
 
 
 def codeable_concept(
@@ -48,3 +74,194 @@ def ref(
     if as_list:
         return [reference_obj]
     return reference_obj
+
+
+# bulk builders, for trusted input: models are built with `construct`, without
+# validation, which can be run afterwards on a sample or on all of them, the
+# sample being drawn from `sample_seed` (see `validate`)
+Validate = Union[bool, float]
+
+
+def _uuid4(value: int) -> str:
+    """random 128 bits as a version 4 uuid string"""
+    value = (value & ~(0xF000 << 64) | 0x4000 << 64) & ~(0xC000 << 48) | 0x8000 << 48
+    text = f"{value:032x}"
+    return f"{text[:8]}-{text[8:12]}-{text[12:16]}-{text[16:20]}-{text[20:]}"
+
+
+class IdGenerator:
+    """
+    uuid4 strings drawn in batches from one random source, seeded for
+    reproducible runs, from os.urandom otherwise
+    """
+
+    def __init__(self, seed: int = None, batch_size: int = 1024):
+        self._random = random.Random(seed) if seed is not None else None
+        self.batch_size = batch_size
+        self._pending: List[str] = []
+
+    def batch(self, count: int) -> List[str]:
+        size = 16 * count
+        data = (
+            os.urandom(size) if self._random is None else self._random.randbytes(size)
+        )
+        return [
+            _uuid4(int.from_bytes(data[i : i + 16], "big")) for i in range(0, size, 16)
+        ]
+
+    def __call__(self) -> str:
+        if not self._pending:
+            self._pending = self.batch(self.batch_size)
+            self._pending.reverse()
+        return self._pending.pop()
+
+    def urn(self) -> str:
+        return f"urn:uuid:{self()}"
+
+
+@functools.lru_cache(maxsize=None)
+def _constructor(model_class: Type[BaseModel]) -> Callable[..., BaseModel]:
+    """
+    `construct` with the field defaults computed once, the bulk of its cost
+    for FHIR elements and their many optional fields
+    """
+    defaults = model_class.construct().__dict__
+    if model_class.__private_attributes__ or any(
+        isinstance(value, (list, dict, set)) for value in defaults.values()
+    ):
+        return model_class.construct
+    new, setattr_ = model_class.__new__, object.__setattr__
+
+    def construct(**values: Any) -> BaseModel:
+        model = new(model_class)
+        setattr_(model, "__dict__", {**defaults, **values})
+        setattr_(model, "__fields_set__", set(values))
+        return model
+
+    return construct
+
+
+def validate(
+    models: List[Any],
+    sample: Validate = True,
+    seed: Union[int, random.Random] = None,
+) -> List[Any]:
+    """
+    validate models built by the bulk factories, all of them or a fraction,
+    raises the pydantic ValidationError of the first invalid one
+    Params:
+      seed: seed or random.Random drawing the sample, for reproducible runs
+    """
+    if sample is False or not models:
+        return models
+    checked = models
+    if sample is not True:
+        rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+        checked = rng.sample(models, max(1, math.ceil(len(models) * sample)))
+    for model in checked:
+        type(model).parse_obj(model.dict())
+    return models
+
+
+def _column(values: Any, count: int) -> Iterable[Any]:
+    """a column of values, or a single value repeated"""
+    if values is None or isinstance(values, (str, TermURL)):
+        return itertools.repeat(
+            values.value if isinstance(values, TermURL) else values, count
+        )
+    return values
+
+
+def identifiers(
+    values: Iterable[Optional[str]] = None,
+    /,
+    count: int = None,
+    system: Union[str, Iterable[str]] = None,
+    ids: IdGenerator = None,
+    validate_sample: Validate = False,
+    sample_seed: Union[int, random.Random] = None,
+) -> List[Identifier]:
+    """
+    Identifiers of the values, missing values (or `count` identifiers when
+    values is None) get a `urn:uuid` value like `identifier()`
+    """
+    if values is None and count is None:
+        raise ValueError("Provide the values or a count of identifiers")
+    ids = ids or IdGenerator()
+    values = [None] * count if values is None else list(values)
+    construct = _constructor(Identifier)
+    models = [
+        construct(system=system_, value=ids.urn() if value is None else value)
+        for value, system_ in zip(values, _column(system, len(values)))
+    ]
+    return validate(models, validate_sample, sample_seed)
+
+
+def references(
+    references_: Iterable[str],
+    /,
+    validate_sample: Validate = False,
+    sample_seed: Union[int, random.Random] = None,
+) -> List[Reference]:
+    """References, see `ref`"""
+    construct = _constructor(Reference)
+    return validate(
+        [construct(reference=r) for r in references_], validate_sample, sample_seed
+    )
+
+
+def codings(
+    codes: Iterable[str],
+    /,
+    system: Union[TermURL, str, Iterable[str]],
+    displays: Iterable[Optional[str]] = None,
+    validate_sample: Validate = False,
+    sample_seed: Union[int, random.Random] = None,
+) -> List[Coding]:
+    """Codings from columns, system may be a single value"""
+    codes = list(codes)
+    construct = _constructor(Coding)
+    models = [
+        construct(system=system_, code=code, display=display)
+        for code, system_, display in zip(
+            codes, _column(system, len(codes)), _column(displays, len(codes))
+        )
+    ]
+    return validate(models, validate_sample, sample_seed)
+
+
+def codeable_concepts(
+    codings_: Iterable[Union[List[Coding], Coding]],
+    /,
+    texts: Iterable[Optional[str]] = None,
+    validate_sample: Validate = False,
+    sample_seed: Union[int, random.Random] = None,
+) -> List[CodeableConcept]:
+    """CodeableConcepts of a coding or list of codings each, see `codeable_concept`"""
+    codings_ = list(codings_)
+    construct = _constructor(CodeableConcept)
+    models = [
+        construct(
+            coding=[coding_] if isinstance(coding_, Coding) else coding_, text=text
+        )
+        for coding_, text in zip(codings_, _column(texts, len(codings_)))
+    ]
+    return validate(models, validate_sample, sample_seed)
+
+
+def extensions(
+    values: Iterable[Any],
+    /,
+    url: Union[TermURL, str] = TermURL.SYNAPSE,
+    value_type: str = "valueString",
+    validate_sample: Validate = False,
+    sample_seed: Union[int, random.Random] = None,
+) -> List[Extension]:
+    """Extensions of the values, all of the same url and value[x] type"""
+    url = url.value if isinstance(url, TermURL) else url
+    construct = _constructor(Extension)
+    return validate(
+        [construct(url=url, **{value_type: value}) for value in values],
+        validate_sample,
+        sample_seed,
+    )
@@ -0,0 +1,136 @@
+"""
+asyncio pipeline fetching fhirpy searches page by page into `src.cls_helpers`
+instances or `src.views` views
+"""
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Iterable, List, Mapping
+
+from fhirpy.base.resource import BaseResource
+from fhirpy.base.searchset import AbstractSearchSet
+from fhirpy.base.utils import parse_pagination_url
+
+from src.dict_path import compile_path, get_attribute_for_path
+from src.views import view_for
+
+_NEXT = compile_path(["link", {"relation": "next"}, "url"])
+_DONE = object()
+
+
+def from_fhirpy(resource: BaseResource, view: bool = False) -> Any:
+    """`src.cls_helpers` instance, or view, of a fhirpy resource"""
+    data = resource.serialize()
+    if view:
+        return view_for(data)
+    from src.cls_helpers import get_resource_class
+
+    return get_resource_class(data["resourceType"])(**data)
+
+
+def _convert(resources: List[Mapping]) -> List[Any]:
+    """validation of a page into models, run in the executor"""
+    from src.cls_helpers import get_resource_class
+
+    return [get_resource_class(r["resourceType"])(**r) for r in resources]
+
+
+def _resources(bundle: Mapping, resource_type: str, includes: bool) -> List[Mapping]:
+    return [
+        entry["resource"]
+        for entry in bundle.get("entry") or []
+        if "resource" in entry
+        and (includes or entry["resource"].get("resourceType") == resource_type)
+    ]
+
+
+class _Pipeline:
+    def __init__(
+        self,
+        concurrency: int,
+        prefetch: int,
+        model: bool,
+        view: bool,
+        includes: bool,
+        executor: Executor,
+    ):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # converted pages waiting for the consumer, producers wait when full
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+        self.model = model
+        self.view = view
+        self.includes = includes
+        self.executor = executor
+
+    def _page(self, resources: List[Mapping]) -> "asyncio.Future":
+        loop = asyncio.get_running_loop()
+        if self.model:
+            return loop.run_in_executor(self.executor, _convert, resources)
+        future = loop.create_future()
+        future.set_result([view_for(r) for r in resources] if self.view else resources)
+        return future
+
+    async def produce(self, search: AbstractSearchSet):
+        client, path, params = search.client, search.resource_type, search.params
+        try:
+            while path:
+                async with self.semaphore:
+                    bundle = await client.execute(path, method="get", params=params)
+                resources = _resources(bundle, search.resource_type, self.includes)
+                await self.queue.put(self._page(resources))
+                next_url = get_attribute_for_path(bundle, _NEXT, default=None)
+                path, params = (
+                    parse_pagination_url(next_url) if next_url else (None, None)
+                )
+        except Exception as e:
+            await self.queue.put(e)
+        await self.queue.put(_DONE)
+
+
+async def fetch(
+    searches: Iterable[AbstractSearchSet],
+    /,
+    concurrency: int = 4,
+    prefetch: int = 4,
+    model: bool = False,
+    view: bool = False,
+    includes: bool = False,
+    executor: Executor = None,
+) -> AsyncIterator[Any]:
+    """
+    yield the resources of fhirpy async searches, following their `next`
+    links. The next page of a search is requested as soon as the previous
+    one is received, pages of several searches are fetched concurrently, and
+    resources come page by page, in order within each search.
+    Params:
+      concurrency: requests in flight at most
+      prefetch: pages received and not yet consumed at most, fetching is
+        paused beyond, bounding the memory used
+      model: yield `src.cls_helpers` instances, validated in the executor off
+        the event loop
+      view: yield `src.views` views instead of dicts, built without validation
+      includes: also yield the resources of other types (`_include`)
+      executor: executor validating the models, the loop default one (threads)
+        when None, a ProcessPoolExecutor spreads validation over cores
+    """
+    pipeline = _Pipeline(concurrency, prefetch, model, view, includes, executor)
+    producers = [asyncio.create_task(pipeline.produce(s)) for s in searches]
+    remaining = len(producers)
+    try:
+        while remaining:
+            page = await pipeline.queue.get()
+            if page is _DONE:
+                remaining -= 1
+                continue
+            if isinstance(page, Exception):
+                raise page
+            for resource in await page:
+                yield resource
+    finally:
+        for producer in producers:
+            producer.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
+
+
+async def fetch_all(searches: Iterable[AbstractSearchSet], /, **kwargs) -> List[Any]:
+    """list of the resources of the searches, see `fetch` for the parameters"""
+    return [resource async for resource in fetch(searches, **kwargs)]
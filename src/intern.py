@@ -0,0 +1,125 @@
+"""
+opt-in deduplication of the strings and small sub-objects repeated across
+many resources (coding systems, codes, use, reference prefixes, keys...)
+"""
+import sys
+from collections import abc
+from typing import Any, Dict, List, Tuple
+
+
+class Interner:
+    """
+    shared table of strings and, optionally, of identical small dicts such as
+    Coding elements. Unlike `sys.intern` the table is freed with the interner.
+    Params:
+      max_length: longer strings (narratives, free text) are left alone
+      share_objects: dicts of at most `max_object_size` scalar values are
+        hash-consed, equal ones become the same instance and must therefore
+        be treated as read-only
+      max_object_size: see share_objects
+    """
+
+    def __init__(
+        self,
+        max_length: int = 128,
+        share_objects: bool = False,
+        max_object_size: int = 5,
+    ):
+        self.max_length = max_length
+        self.share_objects = share_objects
+        self.max_object_size = max_object_size
+        self._strings: Dict[str, str] = {}
+        self._objects: Dict[Tuple[Tuple[str, type, Any], ...], dict] = {}
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._strings) + len(self._objects)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "strings": len(self._strings),
+            "objects": len(self._objects),
+            "hits": self.hits,
+        }
+
+    def string(self, value: str) -> str:
+        if len(value) > self.max_length:
+            return value
+        interned = self._strings.setdefault(value, value)
+        if interned is not value:
+            self.hits += 1
+        return interned
+
+    def _list(self, values: List[Any]) -> List[Any]:
+        for position, value in enumerate(values):
+            if value.__class__ is str:
+                values[position] = self.string(value)
+        return values
+
+    def object_pairs_hook(self, pairs: List[Tuple[str, Any]]) -> dict:
+        """
+        `json.loads` hook, objects are built bottom-up so their children are
+        already interned
+        """
+        strings = self._strings
+        shareable = self.share_objects and len(pairs) <= self.max_object_size
+        obj = {}
+        for key, value in pairs:
+            key = strings.setdefault(key, key)
+            if value.__class__ is str:
+                value = self.string(value)
+            elif value.__class__ is list:
+                value = self._list(value)
+                shareable = False
+            elif value.__class__ is dict:
+                shareable = False
+            obj[key] = value
+        if shareable:
+            try:
+                # value types are part of the key, 1 == 1.0 == True
+                shared = self._objects.setdefault(
+                    tuple((k, v.__class__, v) for k, v in obj.items()), obj
+                )
+            except TypeError:
+                return obj
+            if shared is not obj:
+                self.hits += 1
+            return shared
+        return obj
+
+    def intern(self, value: Any) -> Any:
+        """
+        interned copy of an already parsed value, dicts and lists are rebuilt
+        so that dict keys are interned as well
+        """
+        if value.__class__ is str:
+            return self.string(value)
+        if isinstance(value, abc.Mapping):
+            return self.object_pairs_hook(
+                [(key, self.intern(v)) for key, v in value.items()]
+            )
+        if isinstance(value, list):
+            return [self.intern(v) for v in value]
+        return value
+
+
+def deep_sizeof(value: Any) -> int:
+    """
+    bytes used by a JSON like value and everything it references, shared
+    objects being counted once
+    """
+    seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, abc.Mapping):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return size
@@ -1,13 +1,111 @@
-from typing import Mapping, Union
+import functools
+from collections import abc
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.utils import ROOT_KEY
+
+from src.utils import bounded_map, chunked
+
+M = TypeVar("M", bound=BaseModel)
+
+# elements of fields_to_be_merged lists with the same key are merged together
+DEFAULT_LIST_KEYS = {
+    "identifier": ("system", "value"),
+    "telecom": ("system", "value"),
+    "extension": ("url",),
+    "coding": ("system", "code"),
+}
+
+
+def element_key(element: Any, keys: Tuple[str, ...]) -> Optional[tuple]:
+    """merge key of a list element, None when none of the keys is set"""
+    if isinstance(element, abc.Mapping):
+        key = tuple(element.get(k) for k in keys)
+    else:
+        key = tuple(getattr(element, k, None) for k in keys)
+    return None if all(k is None for k in key) else key
+
+
+def fingerprint(element: Any) -> Hashable:
+    """hashable equivalent of a list element, dict and model elements included"""
+    if isinstance(element, BaseModel):
+        element = element.dict()
+    if isinstance(element, abc.Mapping):
+        return tuple(sorted((k, fingerprint(v)) for k, v in element.items()))
+    if isinstance(element, list):
+        return tuple(fingerprint(v) for v in element)
+    return element
+
+
+def _group_elements(lists: Iterable[Optional[List]], keys: Optional[Tuple[str, ...]]):
+    """
+    elements of the lists grouped by key in order of first appearance, equal
+    elements are kept once when there are no keys
+    """
+    groups, positions = [], {}
+    for elements in lists:
+        for element in elements or ():
+            key = fingerprint(element) if keys is None else element_key(element, keys)
+            if key is None:
+                groups.append([element])
+            elif key not in positions:
+                positions[key] = len(groups)
+                groups.append([element])
+            elif keys is not None:
+                groups[positions[key]].append(element)
+    return groups
+
+
+def merge_lists(
+    list1: Optional[List],
+    list2: Optional[List],
+    keys: Tuple[str, ...] = None,
+    merge_element: Callable[[Any, Any], Any] = None,
+) -> List:
+    """
+    ordered union of two lists in O(n+m): elements of list1 first, then the new
+    elements of list2. With keys, elements sharing the same key values are
+    merged with merge_element (the latest one wins by default), otherwise
+    equal elements are kept once.
+    """
+    merge_element = merge_element or (lambda _, element: element)
+    return [
+        functools.reduce(merge_element, group)
+        for group in _group_elements((list1, list2), keys)
+    ]
 
 
 def merge(
     resource1: Union[BaseModel, Mapping], resource2: Union[BaseModel, Mapping], **kwargs
 ):
+    """
+    values of resource2 override the ones of resource1, dicts being merged
+    recursively
+    Params:
+      by_alias: dump models by alias
+      fields_to_be_merged: top level list fields merged instead of replaced
+      list_keys: {field: element keys} of the fields_to_be_merged lists,
+        DEFAULT_LIST_KEYS by default, see `merge_lists`
+    """
     by_alias = kwargs.get("by_alias", True)
     fields_to_be_merged = kwargs.get("fields_to_be_merged", {})
+    list_keys = kwargs.get("list_keys", DEFAULT_LIST_KEYS)
 
     resource1_as_dict = (
         resource1.dict(by_alias=by_alias)
@@ -22,21 +120,250 @@ def merge(
 
     new_dict = {}
 
-    if not resource1_as_dict:
-        return {}
-
-    for key, value in resource1_as_dict.items():
+    for key, value in (resource1_as_dict or {}).items():
         resource2_value = resource2_as_dict.get(key)
 
         # handle special cases for this one
         if key in fields_to_be_merged:
-            new_dict[key] = list(set(value or []) | set(resource2_value or []))
+            new_dict[key] = merge_lists(
+                value,
+                resource2_value,
+                list_keys.get(key),
+                lambda a, b: merge(a, b, list_keys=list_keys),
+            )
             continue
 
         # handle normal case
         if not isinstance(value, Mapping):
             new_dict[key] = resource2_value or value
         else:
-            new_dict[key] = merge(value, resource2_value or {})
+            new_dict[key] = merge(value, resource2_value or {}, list_keys=list_keys)
+
+    # keys only set in resource2, dumped models exclude None values
+    for key, value in resource2_as_dict.items():
+        if key in new_dict:
+            continue
+        if key in fields_to_be_merged:
+            value = merge_lists(
+                None,
+                value,
+                list_keys.get(key),
+                lambda a, b: merge(a, b, list_keys=list_keys),
+            )
+        new_dict[key] = value
 
     return new_dict
+
+
+def _merge_model_elements(element1: Any, element2: Any, **kwargs) -> Any:
+    if isinstance(element1, BaseModel) and type(element1) is type(element2):
+        return merge_models(element1, element2, **kwargs)
+    return element2
+
+
+def _merged_value(value, other, merge_keys: Union[bool, Tuple[str, ...]], **kwargs):
+    """
+    (merged value, needs validation), values taken as is from either model are
+    already valid
+    Params:
+      merge_keys: False when the value is replaced, True for an union, the
+        keys of the elements for a keyed merge
+    """
+    if merge_keys is not False:
+        merged = merge_lists(
+            value,
+            other,
+            None if merge_keys is True else merge_keys,
+            lambda a, b: _merge_model_elements(a, b, **kwargs),
+        )
+        return merged, any(not isinstance(e, BaseModel) for e in merged)
+    if isinstance(value, BaseModel):
+        if other is None:
+            return value, False
+        if type(other) is type(value):
+            return merge_models(value, other, **kwargs), False
+        return other, False
+    # falsy values (False, 0) only set on the second model are kept
+    return (other if value is None else other or value), False
+
+
+def merge_models(model1: M, model2: M, /, **kwargs) -> M:
+    """
+    attribute level `merge` of two models, same semantics without the dict()
+    and full validation round trip: unchanged sub-models are reused by
+    reference and only merged fields are validated again
+    Params:
+      fields_to_be_merged: names or aliases of top level list fields merged
+        as a union instead of being replaced
+      list_keys: {name or alias: element keys} of the fields_to_be_merged
+        lists, elements with the same key values are merged recursively,
+        DEFAULT_LIST_KEYS by default
+      trusted: build the result without any validation
+    """
+    fields_to_be_merged = kwargs.get("fields_to_be_merged", {})
+    list_keys = kwargs.get("list_keys", DEFAULT_LIST_KEYS)
+    trusted = kwargs.get("trusted", False)
+    cls = model1.__class__
+
+    values, to_validate, changed = {}, [], False
+    for name, field in cls.__fields__.items():
+        value = getattr(model1, name, None)
+        merge_keys = False
+        if name in fields_to_be_merged or field.alias in fields_to_be_merged:
+            merge_keys = list_keys.get(field.alias) or list_keys.get(name) or True
+        merged, needs_validation = _merged_value(
+            value,
+            getattr(model2, name, None),
+            merge_keys,
+            list_keys=list_keys,
+            trusted=trusted,
+        )
+        values[name] = merged
+        changed = changed or merged is not value
+        if needs_validation:
+            to_validate.append(field)
+
+    if not changed:
+        return model1
+
+    if not trusted:
+        errors = []
+        for field in to_validate:
+            values[field.name], error = field.validate(
+                values[field.name], values, loc=field.alias, cls=cls
+            )
+            if error:
+                errors.append(error)
+        if errors:
+            raise ValidationError(errors, cls)
+        # cross field checks, e.g. a single value of choice types
+        if cls.__pre_root_validators__ or cls.__post_root_validators__:
+            by_alias = {cls.__fields__[name].alias: v for name, v in values.items()}
+            try:
+                for validator in cls.__pre_root_validators__:
+                    validator(cls, by_alias)
+                for _, validator in cls.__post_root_validators__:
+                    validator(cls, dict(values))
+            except (ValueError, TypeError, AssertionError) as e:
+                raise ValidationError([ErrorWrapper(e, loc=ROOT_KEY)], cls)
+
+    fields_set = model1.__fields_set__ | {
+        name for name, value in values.items() if value is not None
+    }
+    return cls.construct(_fields_set=fields_set, **values)
+
+
+def _merge_all_dicts(
+    dicts: List[Mapping], fields_to_be_merged, list_keys: Mapping
+) -> dict:
+    """N-way `merge` of dicts, each key is visited once for all the versions"""
+    merged = {}
+    for key in dict.fromkeys(key for d in dicts for key in d):
+        values = [d[key] for d in dicts if key in d]
+        if key in fields_to_be_merged:
+            merged[key] = [
+                _merge_all_dicts(group, {}, list_keys)
+                if len(group) > 1 and all(isinstance(e, Mapping) for e in group)
+                else group[-1]
+                for group in _group_elements(values, list_keys.get(key))
+            ]
+            continue
+
+        truthy = [value for value in values if value]
+        if not truthy:
+            merged[key] = values[0]
+        elif isinstance(truthy[0], Mapping):
+            mappings = [value for value in truthy if isinstance(value, Mapping)]
+            merged[key] = (
+                mappings[0]
+                if len(mappings) == 1
+                else _merge_all_dicts(mappings, {}, list_keys)
+            )
+        else:
+            merged[key] = truthy[-1]
+    return merged
+
+
+def merge_all(
+    versions: Iterable[Union[M, Mapping]],
+    /,
+    priority: Union[Sequence[Any], Callable[[Any], Any]] = None,
+    **kwargs,
+) -> Union[M, dict]:
+    """
+    fold an ordered sequence of versions of a resource in a single pass, as
+    pairwise `merge` calls would: later versions win (last writer wins).
+    Models are dumped once and the result is validated once.
+    Params:
+      priority: priority of each version, either a sequence or a function of
+        the version, versions with a higher priority win, ties keep the order
+      by_alias, fields_to_be_merged, list_keys: see `merge`
+    """
+    versions = list(versions)
+    if not versions:
+        raise ValueError("Nothing to merge")
+    if priority is not None:
+        ranks = (
+            [priority(version) for version in versions]
+            if callable(priority)
+            else list(priority)
+        )
+        if len(ranks) != len(versions):
+            raise ValueError(f"Expected {len(versions)} priorities, got {len(ranks)}")
+        versions = [
+            version for _, version in sorted(zip(ranks, versions), key=lambda rv: rv[0])
+        ]
+
+    cls = type(versions[0])
+    is_model = isinstance(versions[0], BaseModel)
+    if is_model and any(type(version) is not cls for version in versions):
+        raise TypeError("Can only merge model of the same type")
+    by_alias = kwargs.get("by_alias", True)
+    dicts = [
+        version.dict(by_alias=by_alias) if is_model else version for version in versions
+    ]
+    merged = _merge_all_dicts(
+        dicts,
+        kwargs.get("fields_to_be_merged", {}),
+        kwargs.get("list_keys", DEFAULT_LIST_KEYS),
+    )
+    return cls(**merged) if is_model else merged
+
+
+def _merge_chunk(args: Tuple[List[Sequence], Mapping]) -> List[Any]:
+    """module level so that it can be sent to a process pool"""
+    groups, kwargs = args
+    return [merge_all(group, **kwargs) for group in groups]
+
+
+def merge_batches(
+    groups: Iterable[Sequence[Union[M, Mapping]]],
+    /,
+    processes: int = None,
+    chunk_size: int = 1000,
+    **kwargs,
+) -> Iterator[Union[M, dict]]:
+    """
+    lazily `merge_all` each group of versions, in order, memory is bounded by
+    a few chunks of groups
+    Params:
+      groups: iterable of version sequences, consumed lazily
+      processes: fan chunks out to a process pool of this size, versions,
+        results and priority functions must be picklable
+      chunk_size: number of groups sent at once to a worker
+      priority, by_alias, fields_to_be_merged, list_keys: see `merge_all`
+    """
+    tasks = ((chunk, kwargs) for chunk in chunked(groups, chunk_size))
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=processes)
+        results = bounded_map(executor, _merge_chunk, tasks, 2 * processes)
+    else:
+        executor = None
+        results = map(_merge_chunk, tasks)
+
+    try:
+        for chunk in results:
+            yield from chunk
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,179 @@
+"""
+deterministic, picklable composition of helper functions into classes
+"""
+import copyreg
+import functools
+import hashlib
+import importlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+Ref = Tuple[str, str]
+
+
+def _ref(obj: Any) -> Optional[Ref]:
+    """(module, qualname) of an importable function or class, None otherwise"""
+    module, qualname = getattr(obj, "__module__", None), getattr(
+        obj, "__qualname__", None
+    )
+    if module is None or qualname is None or "<" in qualname:
+        return None
+    try:
+        return (module, qualname) if _import(module, qualname) is obj else None
+    except (ImportError, AttributeError):
+        return None
+
+
+def _import(module: str, qualname: str) -> Any:
+    obj = importlib.import_module(module)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _digest(refs: Tuple[Ref, ...]) -> str:
+    text = "|".join(f"{module}:{qualname}" for module, qualname in refs)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def _composed_meta(meta: type) -> type:
+    """metaclass of composed classes, pickled as the recipe to rebuild them"""
+    composed = type(f"Composed{meta.__name__}", (meta,), {"__module__": __name__})
+    copyreg.pickle(composed, _reduce_class)
+    return composed
+
+
+def _reduce_class(cls: type):
+    spec = cls.__dict__.get("__mixin_spec__")
+    if spec is None:
+        # subclass declared in a module, pickled by name as usual
+        return cls.__qualname__
+    base, functions = spec
+    return _compose, (base, functions)
+
+
+def _compose(base: Ref, functions: Tuple[Ref, ...]) -> type:
+    return REGISTRY.compose(_import(*base), *(_import(*ref) for ref in functions))
+
+
+def _mixin(functions: Tuple[Ref, ...]) -> type:
+    return REGISTRY.mixin(*(_import(*ref) for ref in functions))
+
+
+# mixin classes are bases of models with their own metaclass, a metaclass
+# registered with copyreg would conflict with it. Their name, which pickle
+# stores, carries the functions instead, escaped into an identifier.
+_RECIPE_PREFIX = "Mixin__"
+_ESCAPES = (("_", "_u"), (".", "_d"), (":", "_c"), ("|", "_s"))
+
+
+def _recipe_name(refs: Tuple[Ref, ...]) -> str:
+    text = "|".join(f"{module}:{qualname}" for module, qualname in refs)
+    for char, escape in _ESCAPES:
+        text = text.replace(char, escape)
+    return _RECIPE_PREFIX + text
+
+
+def _recipe_refs(name: str) -> Tuple[Ref, ...]:
+    unescape = {escape[1]: char for char, escape in _ESCAPES}
+    text = re.sub("_(.)", lambda m: unescape[m.group(1)], name[len(_RECIPE_PREFIX) :])
+    return tuple(tuple(ref.split(":", 1)) for ref in text.split("|"))
+
+
+class MixinRegistry:
+    """
+    classes composed of helper functions, named after the functions so that
+    the same functions give the same class in every process. Classes are
+    published as attributes of this module so that pickle finds them by name.
+    `mixin` class names spell out their functions and `compose` classes are
+    pickled as the base and functions to rebuild them from, both can thus be
+    unpickled (along with their instances) in a fresh worker process.
+    Only importable functions are cached, at most `maxsize` classes are kept.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._classes: "OrderedDict[str, type]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._classes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._classes
+
+    def get(self, name: str) -> Optional[type]:
+        return self._classes.get(name)
+
+    def cache_clear(self):
+        with self._lock:
+            self._classes.clear()
+
+    def _cached(self, name: str, build: Callable[[], type]) -> type:
+        with self._lock:
+            cls = self._classes.get(name)
+            if cls is None:
+                cls = self._classes[name] = build()
+                if len(self._classes) > self.maxsize:
+                    self._classes.popitem(last=False)
+            else:
+                self._classes.move_to_end(name)
+            return cls
+
+    def mixin(self, *functions: Callable[..., Any]) -> type:
+        """class holding the functions as methods, named after them"""
+        namespace = {f.__name__: f for f in functions}
+        refs = tuple(_ref(f) for f in functions)
+        if None in refs:
+            # closures and lambdas are not cached, they would be new each time
+            return type("Mixin", (), {"__module__": __name__, **namespace})
+        name = _recipe_name(refs)
+        return self._cached(
+            name,
+            lambda: type(
+                name,
+                (),
+                {"__module__": __name__, "__qualname__": name, **namespace},
+            ),
+        )
+
+    def compose(self, base: type, *functions: Callable[..., Any]) -> type:
+        """
+        subclass of base with the functions as methods, e.g. a fhir.resources
+        model with a few getters, whose instances can be sent to a process pool
+        """
+        base_ref = _ref(base)
+        refs = tuple(_ref(f) for f in functions)
+        if base_ref is None or None in refs:
+            raise TypeError("Can only compose importable classes and functions")
+        name = f"{base.__name__}_{_digest((base_ref, *refs))}"
+        return self._cached(
+            name,
+            lambda: _composed_meta(type(base))(
+                name,
+                (base, self.mixin(*functions)),
+                {
+                    "__module__": __name__,
+                    "__qualname__": name,
+                    "__mixin_spec__": (base_ref, refs),
+                },
+            ),
+        )
+
+
+REGISTRY = MixinRegistry()
+
+
+def __getattr__(name: str) -> Any:
+    cls = REGISTRY.get(name)
+    if cls is None and name.startswith(_RECIPE_PREFIX):
+        try:
+            cls = _mixin(_recipe_refs(name))
+        except (ImportError, AttributeError, KeyError, TypeError):
+            cls = None
+    if cls is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return cls
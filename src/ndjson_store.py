@@ -0,0 +1,182 @@
+"""
+random access by resourceType/id into a large NDJSON export
+"""
+import functools
+import json
+import mmap
+import os
+import re
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+from loguru import logger
+
+from src.intern import Interner
+from src.sorted_table import SortedTable
+
+_INDEX_VERSION = 1
+
+# bulk exports usually start each line with resourceType and id, other lines
+# are parsed to find them
+_HEAD = re.compile(
+    rb'\s*\{\s*"resourceType"\s*:\s*"([^"\\]+)"\s*,\s*"id"\s*:\s*"([^"\\]+)"'
+)
+
+
+def _key(resource_type: str, resource_id: str) -> bytes:
+    return f"{resource_type}/{resource_id}".encode()
+
+
+class NDJSONStore:
+    """
+    memory-mapped NDJSON file with a persisted (resourceType, id) -> (offset,
+    length) index, kept in sorted arrays. Only the requested lines are parsed.
+    Params:
+      path: NDJSON file, not compressed
+      index_path: where the index is persisted, next to the file by default,
+        rebuilt when the file size or modification time changed
+      interner: `src.intern.Interner` deduplicating strings across the
+        resources read
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        index_path: os.PathLike = None,
+        interner: Interner = None,
+    ):
+        self.path = os.fspath(path)
+        self._loads = (
+            json.loads
+            if interner is None
+            else functools.partial(
+                json.loads, object_pairs_hook=interner.object_pairs_hook
+            )
+        )
+        self.index_path = os.fspath(index_path or f"{self.path}.idx")
+        self._fp = open(self.path, "rb")
+        size = os.fstat(self._fp.fileno()).st_size
+        self._buffer = (
+            mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        )
+        self.index = self._load_index() or self.build_index()
+
+    def _signature(self) -> dict:
+        stat = os.stat(self.path)
+        return {
+            "version": _INDEX_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+    def _load_index(self) -> Optional[SortedTable]:
+        try:
+            index = SortedTable.load(self.index_path)
+        except (OSError, ValueError):
+            return None
+        if index.meta != self._signature():
+            index.close()
+            return None
+        return index
+
+    def _scan(self) -> Iterator[Tuple[bytes, Tuple[int, int]]]:
+        buffer, position, end = self._buffer, 0, len(self._buffer)
+        while position < end:
+            line_end = buffer.find(b"\n", position)
+            if line_end == -1:
+                line_end = end
+            line = buffer[position:line_end]
+            if line.strip():
+                match = _HEAD.match(line)
+                if match:
+                    resource_type, resource_id = match.group(1), match.group(2)
+                    key = resource_type + b"/" + resource_id
+                else:
+                    resource = json.loads(line)
+                    key = _key(resource["resourceType"], resource.get("id", ""))
+                yield key, (position, line_end - position)
+            position = line_end + 1
+
+    def build_index(self) -> SortedTable:
+        """scan the file once and persist the index, kept in memory if not writable"""
+        index = SortedTable.build(
+            self._scan(), ("offset", "length"), meta=self._signature()
+        )
+        try:
+            index.save(self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not persist index {self.index_path}: {e}")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, item: Tuple[str, str]) -> bool:
+        return self.index.find(_key(*item)) is not None
+
+    def keys(self, resource_type: str = None) -> Iterator[Tuple[str, str]]:
+        """(resourceType, id) pairs, of a single resource type if given"""
+        positions = (
+            self.index.prefixed(f"{resource_type}/".encode())
+            if resource_type
+            else range(len(self.index))
+        )
+        for position in positions:
+            resource_type_, _, resource_id = self.index.key(position).partition(b"/")
+            yield resource_type_.decode(), resource_id.decode()
+
+    def get_raw(self, resource_type: str, resource_id: str) -> Optional[bytes]:
+        """line of the resource, None when missing"""
+        position = self.index.find(_key(resource_type, resource_id))
+        if position is None:
+            return None
+        offset, length = self.index.row(position)
+        return self._buffer[offset : offset + length]
+
+    def get(self, resource_type: str, resource_id: str, default: Any = None) -> Any:
+        """parsed resource dict, default when missing"""
+        raw = self.get_raw(resource_type, resource_id)
+        return default if raw is None else self._loads(raw)
+
+    def load(self, resource_type: str, resource_id: str) -> Any:
+        """resource as a `src.cls_helpers` instance, KeyError when missing"""
+        from src.cls_helpers import get_resource_class
+
+        resource = self.get(resource_type, resource_id)
+        if resource is None:
+            raise KeyError(f"{resource_type}/{resource_id}")
+        return get_resource_class(resource_type)(**resource)
+
+    def get_many(
+        self, keys: Iterable[Tuple[str, str]], model: bool = False
+    ) -> Iterator[Tuple[Tuple[str, str], Any]]:
+        """
+        lazily yield ((resourceType, id), resource) for the found keys, in file
+        order so that pages are read sequentially
+        Params:
+          keys: (resourceType, id) pairs, duplicates are read once
+          model: yield `src.cls_helpers` instances instead of dicts
+        """
+        found = {}
+        for key in keys:
+            position = self.index.find(_key(*key))
+            if position is not None:
+                found[key] = self.index.row(position)
+        for key, (offset, length) in sorted(found.items(), key=lambda kv: kv[1]):
+            resource = self._loads(self._buffer[offset : offset + length])
+            if model:
+                from src.cls_helpers import get_resource_class
+
+                resource = get_resource_class(key[0])(**resource)
+            yield key, resource
+
+    def close(self):
+        self.index.close()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._fp.close()
+
+    def __enter__(self) -> "NDJSONStore":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
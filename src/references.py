@@ -0,0 +1,252 @@
+"""
+resolution of Reference.reference values (`Organization/1`, `#contained-id`,
+`urn:uuid:...`) against indexed Bundles, contained resources, and a fetcher
+behind a TTL cache
+"""
+import asyncio
+import inspect
+import time
+from collections import OrderedDict, abc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fhirpy.base.exceptions import ResourceNotFound
+
+from src.cls_helpers import get_contained
+from src.ndjson_store import NDJSONStore
+
+Key = Tuple[str, str]
+_MISSING = object()
+
+
+def _get(element: Any, key: str) -> Any:
+    if isinstance(element, abc.Mapping):
+        return element.get(key)
+    return getattr(element, key, None)
+
+
+def _by_id(resources) -> Dict[str, Any]:
+    table = {}
+    for resource in resources:
+        table.setdefault(_get(resource, "id"), resource)
+    return table
+
+
+def _key(reference: str) -> Optional[Key]:
+    """(resourceType, id) of a relative or absolute literal reference"""
+    parts = reference.split("/")
+    if len(parts) >= 4 and parts[-2] == "_history":
+        parts = parts[:-2]
+    if len(parts) < 2 or not parts[-2] or not parts[-1]:
+        return None
+    return parts[-2], parts[-1]
+
+
+class TTLCache:
+    """LRU cache of at most `maxsize` entries, each expiring after `ttl` seconds"""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= self.clock():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Any, value: Any):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class StoreFetcher:
+    """fetcher reading a local `src.ndjson_store.NDJSONStore`"""
+
+    def __init__(self, store: NDJSONStore, model: bool = False):
+        self.store = store
+        self.model = model
+
+    def fetch_many(self, keys: List[Key]) -> Dict[Key, Any]:
+        return dict(self.store.get_many(keys, model=self.model))
+
+
+class FhirpyFetcher:
+    """
+    fetcher reading resources from a fhirpy async client, by concurrent reads
+    (`GET Type/id`) rather than the `_id` searches of `to_resource`
+    """
+
+    def __init__(self, client: Any, concurrency: int = 8):
+        self.client = client
+        self.concurrency = concurrency
+
+    async def fetch_many(self, keys: List[Key]) -> Dict[Key, Any]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(key: Key) -> Any:
+            async with semaphore:
+                try:
+                    return await self.client.execute("/".join(key), method="get")
+                except ResourceNotFound:
+                    return None
+
+        resources = await asyncio.gather(*(fetch(key) for key in keys))
+        return {key: r for key, r in zip(keys, resources) if r is not None}
+
+
+class ReferenceResolver:
+    """
+    resolve references by:
+      - `#id`: the contained resources of the `context` resource, indexed by
+        id once per resource
+      - fullUrl (`urn:uuid:...`, absolute urls) or `Type/id`: the entries of
+        the Bundles given to `index_bundle`
+      - `Type/id`: the cache then the fetcher, `StoreFetcher`, `FhirpyFetcher`
+        or any object with a `fetch_many(keys) -> {key: resource}` method.
+        Missing resources are cached as well.
+    `resolve_many` looks each distinct reference up once, with a single
+    `fetch_many` call. Use the `aresolve` variants with async fetchers.
+    """
+
+    def __init__(
+        self,
+        fetcher: Any = None,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fetcher = fetcher
+        self.cache = TTLCache(maxsize, ttl, clock)
+        self._full_urls: Dict[str, Any] = {}
+        self._keys: Dict[Key, Any] = {}
+        self.fetched = 0
+
+    def index_bundle(self, bundle: Any):
+        """index the entries of a Bundle by fullUrl and by resourceType/id"""
+        for entry in _get(bundle, "entry") or []:
+            resource = _get(entry, "resource")
+            if resource is None:
+                continue
+            full_url = _get(entry, "fullUrl")
+            if full_url:
+                self._full_urls[full_url] = resource
+            resource_id = _get(resource, "id")
+            if resource_id:
+                resource_type = _get(resource, "resourceType") or _get(
+                    resource, "resource_type"
+                )
+                self._keys[resource_type, resource_id] = resource
+
+    def clear(self):
+        self._full_urls.clear()
+        self._keys.clear()
+        self.cache.clear()
+
+    def _local(self, reference: str, context: Any) -> Tuple[Any, Optional[Key]]:
+        """resource found without the fetcher, or the key to fetch"""
+        if reference.startswith("#"):
+            if context is None:
+                return None, None
+            if isinstance(context, abc.Mapping):
+                return _by_id(context.get("contained") or []).get(reference[1:]), None
+            return get_contained(context, reference[1:]), None
+        resource = self._full_urls.get(reference)
+        if resource is not None or reference.startswith("urn:"):
+            return resource, None
+        key = _key(reference)
+        if key is None:
+            return None, None
+        resource = self._keys.get(key)
+        if resource is not None:
+            return resource, None
+        resource = self.cache.get(key, _MISSING)
+        if resource is not _MISSING:
+            return resource, None
+        return None, key
+
+    def _prepare(
+        self, references: Iterable[Any], context: Any
+    ) -> Tuple[List[Any], Dict[Key, List[int]]]:
+        results, to_fetch = [], {}
+        for position, reference in enumerate(references):
+            if reference is not None and not isinstance(reference, str):
+                reference = _get(reference, "reference")
+            if not reference:
+                results.append(None)
+                continue
+            resource, key = self._local(reference, context)
+            results.append(resource)
+            if key is not None:
+                to_fetch.setdefault(key, []).append(position)
+        if to_fetch and self.fetcher is None:
+            to_fetch = {}
+        return results, to_fetch
+
+    def _complete(
+        self,
+        results: List[Any],
+        to_fetch: Dict[Key, List[int]],
+        fetched: Dict[Key, Any],
+    ) -> List[Any]:
+        self.fetched += len(to_fetch)
+        for key, positions in to_fetch.items():
+            resource = fetched.get(key)
+            self.cache.set(key, resource)
+            for position in positions:
+                results[position] = resource
+        return results
+
+    def resolve_many(self, references: Iterable[Any], context: Any = None) -> List[Any]:
+        """
+        resources of the references (strings, Reference models or dicts), None
+        for unresolved ones
+        Params:
+          context: resource holding the references, for `#id` ones
+        """
+        results, to_fetch = self._prepare(references, context)
+        if not to_fetch:
+            return results
+        fetched = self.fetcher.fetch_many(list(to_fetch))
+        if inspect.isawaitable(fetched):
+            if inspect.iscoroutine(fetched):
+                # never awaited, closed to avoid the RuntimeWarning
+                fetched.close()
+            raise TypeError("Async fetcher, use aresolve_many")
+        return self._complete(results, to_fetch, fetched)
+
+    def resolve(self, reference: Any, context: Any = None) -> Any:
+        return self.resolve_many([reference], context)[0]
+
+    async def aresolve_many(
+        self, references: Iterable[Any], context: Any = None
+    ) -> List[Any]:
+        """`resolve_many` for sync or async fetchers"""
+        results, to_fetch = self._prepare(references, context)
+        if not to_fetch:
+            return results
+        fetched = self.fetcher.fetch_many(list(to_fetch))
+        if inspect.isawaitable(fetched):
+            fetched = await fetched
+        return self._complete(results, to_fetch, fetched)
+
+    async def aresolve(self, reference: Any, context: Any = None) -> Any:
+        return (await self.aresolve_many([reference], context))[0]
@@ -0,0 +1,238 @@
+"""
+compact, immutable sorted table of bytes keys with int64 columns and an
+optional bytes blob, stored in a single file which is memory-mapped on load
+"""
+import array
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from src.utils import chunked
+
+_MAGIC = b"FHSTBL1\n"
+_ALIGNMENT = 8
+
+
+class SortedTable:
+    """
+    sorted keys concatenated in one blob with an offsets array, and one int64
+    array per column. Lookups are binary searches, no Python object is kept
+    per row. Variable length values can be kept in `blob`, with their offsets
+    in columns.
+    """
+
+    def __init__(
+        self,
+        keys: Union[bytes, memoryview],
+        key_offsets: Sequence[int],
+        columns: Dict[str, Sequence[int]],
+        meta: Dict[str, Any] = None,
+        buffer: Optional[mmap.mmap] = None,
+        blob: Union[bytes, memoryview] = b"",
+    ):
+        self._keys = keys
+        self._key_offsets = key_offsets
+        self.columns = columns
+        self.meta = meta or {}
+        self.blob = blob
+        self._buffer = buffer
+
+    @classmethod
+    def build(
+        cls,
+        rows: Iterable[Tuple[bytes, Sequence[int]]],
+        column_names: Sequence[str],
+        meta: Dict[str, Any] = None,
+        blob: bytes = b"",
+        run_size: int = 500_000,
+    ) -> "SortedTable":
+        """
+        table of (key, column values) rows, the last row wins for duplicated keys.
+        Rows are sorted by runs of `run_size`, spilled to temporary files when
+        there are several of them and merged, so that only one run is held as
+        Python objects next to the compact arrays of the table.
+        """
+        record = struct.Struct(f"<I{len(column_names)}q")
+        runs: List[IO[bytes]] = []
+        try:
+            last_run: List[Tuple[bytes, Sequence[int]]] = []
+            for chunk in chunked(rows, run_size):
+                if last_run:
+                    runs.append(_spill(last_run, record))
+                # the last row of a key wins within a run
+                last_run = sorted(dict(chunk).items())
+            if runs:
+                runs.append(_spill(last_run, record))
+                last_run = []
+                # equal keys come out in run order, the last one wins
+                merged = heapq.merge(
+                    *(
+                        ((key, index, values) for key, values in _read(run, record))
+                        for index, run in enumerate(runs)
+                    )
+                )
+            else:
+                merged = ((key, 0, values) for key, values in last_run)
+
+            keys = bytearray()
+            key_offsets = array.array("q", [0])
+            columns = {name: array.array("q") for name in column_names}
+            previous = None
+            for key, _, values in merged:
+                if key == previous:
+                    for name, value in zip(column_names, values):
+                        columns[name][-1] = value
+                    continue
+                previous = key
+                keys += key
+                key_offsets.append(len(keys))
+                for name, value in zip(column_names, values):
+                    columns[name].append(value)
+        finally:
+            for run in runs:
+                run.close()
+        return cls(bytes(keys), key_offsets, columns, meta, blob=blob)
+
+    def __len__(self) -> int:
+        return len(self._key_offsets) - 1
+
+    def key(self, position: int) -> bytes:
+        return bytes(
+            self._keys[self._key_offsets[position] : self._key_offsets[position + 1]]
+        )
+
+    def keys(self) -> Iterator[bytes]:
+        return (self.key(position) for position in range(len(self)))
+
+    def bisect(self, key: bytes) -> int:
+        """position of the first key greater or equal to key"""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, key: bytes) -> Optional[int]:
+        """position of the key, None when missing"""
+        position = self.bisect(key)
+        if position < len(self) and self.key(position) == key:
+            return position
+        return None
+
+    def prefixed(self, prefix: bytes) -> Iterator[int]:
+        """positions of the keys starting with prefix"""
+        position = self.bisect(prefix)
+        while position < len(self) and self.key(position).startswith(prefix):
+            yield position
+            position += 1
+
+    def row(self, position: int) -> Tuple[int, ...]:
+        return tuple(column[position] for column in self.columns.values())
+
+    def save(self, path: os.PathLike):
+        """write the table, written to a temporary file first then renamed"""
+        sections: List[Tuple[str, bytes]] = [
+            ("key_offsets", array.array("q", self._key_offsets).tobytes()),
+            *(
+                (f"column:{name}", array.array("q", column).tobytes())
+                for name, column in self.columns.items()
+            ),
+            ("keys", bytes(self._keys)),
+            ("blob", bytes(self.blob)),
+        ]
+        layout, position = {}, 0
+        for name, data in sections:
+            layout[name] = (position, len(data))
+            position += _padded(len(data))
+        header = json.dumps(
+            {"columns": list(self.columns), "layout": layout, "meta": self.meta}
+        ).encode()
+        header += b" " * (_padded(len(header)) - len(header))
+
+        tmp_path = f"{os.fspath(path)}.tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(_MAGIC)
+            fp.write(len(header).to_bytes(8, "little"))
+            fp.write(header)
+            for _, data in sections:
+                fp.write(data)
+                fp.write(b"\0" * (_padded(len(data)) - len(data)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> "SortedTable":
+        """memory-map a saved table, ValueError if the file is not a table"""
+        with open(path, "rb") as fp:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[: len(_MAGIC)] != _MAGIC:
+            buffer.close()
+            raise ValueError(f"{path} is not a sorted table")
+        header_size = int.from_bytes(buffer[len(_MAGIC) : len(_MAGIC) + 8], "little")
+        start = len(_MAGIC) + 8
+        header = json.loads(buffer[start : start + header_size])
+        start += header_size
+
+        view = memoryview(buffer)
+
+        def section(name: str) -> memoryview:
+            offset, size = header["layout"][name]
+            return view[start + offset : start + offset + size]
+
+        return cls(
+            section("keys"),
+            section("key_offsets").cast("q"),
+            {name: section(f"column:{name}").cast("q") for name in header["columns"]},
+            header["meta"],
+            buffer,
+            section("blob") if "blob" in header["layout"] else b"",
+        )
+
+    def close(self):
+        if self._buffer is not None:
+            # memoryviews must be released before the map is closed
+            for view in (self._keys, self._key_offsets, *self.columns.values()):
+                view.release()
+            if isinstance(self.blob, memoryview):
+                self.blob.release()
+            self._keys = self._key_offsets = self.blob = b""
+            self.columns = {}
+            self._buffer.close()
+            self._buffer = None
+
+
+def _spill(run: List[Tuple[bytes, Sequence[int]]], record: struct.Struct) -> IO[bytes]:
+    """sorted run written to a temporary file, deleted when closed"""
+    fp = tempfile.TemporaryFile()
+    for key, values in run:
+        fp.write(record.pack(len(key), *values))
+        fp.write(key)
+    fp.seek(0)
+    return fp
+
+
+def _read(fp: IO[bytes], record: struct.Struct) -> Iterator[Tuple[bytes, Tuple]]:
+    while head := fp.read(record.size):
+        length, *values = record.unpack(head)
+        yield fp.read(length), values
+
+
+def _padded(size: int) -> int:
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
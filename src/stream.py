@@ -0,0 +1,284 @@
+"""
+incremental readers of NDJSON bulk exports and Bundle documents
+"""
+import functools
+import gzip
+import io
+import json
+import os
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Iterator, Mapping, Optional, Union
+
+from src.dict_path import _MISSING, compile_path, get_attribute_for_path
+from src.intern import Interner
+
+Source = Union[str, os.PathLike, IO]
+Predicate = Union[Mapping[Any, Any], Callable[[Mapping], bool]]
+
+# characters read at once from the underlying file
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACES = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class StreamError(Exception):
+    ...
+
+
+@contextmanager
+def _open_text(source: Source) -> Iterator[IO[str]]:
+    """
+    text stream over a path (gzip compressed when ending with .gz) or a file object
+    """
+    if isinstance(source, (str, os.PathLike)):
+        if os.fspath(source).endswith(".gz"):
+            with gzip.open(source, "rt", encoding="utf-8") as fp:
+                yield fp
+        else:
+            with open(source, "r", encoding="utf-8") as fp:
+                yield fp
+    elif isinstance(source, io.TextIOBase):
+        yield source
+    else:
+        wrapper = io.TextIOWrapper(source, encoding="utf-8")
+        try:
+            yield wrapper
+        finally:
+            # the binary file object belongs to the caller, left open
+            wrapper.detach()
+
+
+def _compile_predicate(where: Optional[Predicate]) -> Optional[Callable]:
+    """
+    callable predicate, a mapping {path: expected value} is turned into compiled
+    dict_path lookups
+    """
+    if where is None or callable(where):
+        return where
+    conditions = [(compile_path(path), value) for path, value in where.items()]
+
+    def predicate(resource: Mapping) -> bool:
+        for path, value in conditions:
+            if get_attribute_for_path(resource, path, default=_MISSING) != value:
+                return False
+        return True
+
+    return predicate
+
+
+def _loads(interner: Optional[Interner]) -> Callable[[str], Any]:
+    if interner is None:
+        return json.loads
+    return functools.partial(json.loads, object_pairs_hook=interner.object_pairs_hook)
+
+
+def _to_model(resource: Mapping):
+    from src.cls_helpers import get_resource_class
+
+    return get_resource_class(resource["resourceType"])(**resource)
+
+
+def _select(
+    resource: Any,
+    resource_type: Optional[str],
+    predicate: Optional[Callable],
+    model: bool,
+):
+    """
+    filtered resource (dict or model), _MISSING when filtered out
+    """
+    if not isinstance(resource, Mapping):
+        return _MISSING
+    if resource_type is not None and resource.get("resourceType") != resource_type:
+        return _MISSING
+    if predicate is not None and not predicate(resource):
+        return _MISSING
+    return _to_model(resource) if model else resource
+
+
+def _lines(fp: IO[str], max_line_size: Optional[int]) -> Iterator[str]:
+    """
+    lines of the text stream, truncated after `max_line_size + 1` characters
+    so that a longer line is never fully read
+    """
+    if max_line_size is None:
+        return iter(fp)
+    return iter(functools.partial(fp.readline, max_line_size + 1), "")
+
+
+def iter_ndjson(
+    source: Source,
+    /,
+    resource_type: str = None,
+    where: Predicate = None,
+    model: bool = False,
+    max_line_size: int = None,
+    interner: Interner = None,
+) -> Iterator[Any]:
+    """
+    yield resources of a NDJSON file one at a time
+    Params:
+      source: path (optionally gzip compressed) or file object
+      resource_type: only yield resources of this type, other lines are skipped
+        before being parsed whenever possible
+      where: mapping {path: value} or callable, evaluated on the raw dict
+      model: yield `src.cls_helpers` instances instead of dicts
+      max_line_size: StreamError on longer lines, at most `max_line_size + 1`
+        characters of a line are read, bounding the memory used
+      interner: `src.intern.Interner` deduplicating strings across resources
+    """
+    predicate = _compile_predicate(where)
+    loads = _loads(interner)
+    type_marker = f'"{resource_type}"' if resource_type else None
+    with _open_text(source) as fp:
+        for line_number, line in enumerate(_lines(fp, max_line_size), 1):
+            if max_line_size is not None and len(line) > max_line_size:
+                raise StreamError(f"Line {line_number} exceeds {max_line_size=}")
+            if type_marker is not None and type_marker not in line:
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                resource = loads(line)
+            except json.JSONDecodeError as e:
+                raise StreamError(f"Invalid JSON at line {line_number}") from e
+            resource = _select(resource, resource_type, predicate, model)
+            if resource is not _MISSING:
+                yield resource
+
+
+class _Scanner:
+    """
+    buffered reader of a JSON document, only the value being decoded is kept in
+    memory
+    """
+
+    def __init__(
+        self,
+        fp: IO[str],
+        chunk_size: int,
+        max_value_size: Optional[int],
+        decoder: json.JSONDecoder = _decoder,
+    ):
+        self.fp = fp
+        self.decoder = decoder
+        self.chunk_size = chunk_size
+        self.max_value_size = max_value_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: int = None) -> bool:
+        if self.eof:
+            return False
+        if self.pos:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        if self.max_value_size is not None and len(self.buffer) > self.max_value_size:
+            raise StreamError(f"Value exceeds {self.max_value_size=}")
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def peek(self) -> str:
+        """next non whitespace character, empty at the end of the document"""
+        while True:
+            while self.pos < len(self.buffer):
+                if self.buffer[self.pos] not in _WHITESPACES:
+                    return self.buffer[self.pos]
+                self.pos += 1
+            if not self._fill():
+                return ""
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if not character or character not in characters:
+            raise StreamError(f"Expected one of {characters!r}, got {character!r}")
+        self.pos += 1
+        return character
+
+    def value(self) -> Any:
+        """decode the next JSON value, reading more data when truncated"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a value ending with the buffer may be a truncated number
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise StreamError("Invalid or truncated JSON document") from e
+            # geometric growth, a large value is not decoded over and over
+            self._fill(max(self.chunk_size, len(self.buffer) - self.pos))
+
+
+def iter_bundle(
+    source: Source,
+    /,
+    resource_type: str = None,
+    where: Predicate = None,
+    model: bool = False,
+    entries: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    max_entry_size: int = None,
+    interner: Interner = None,
+) -> Iterator[Any]:
+    """
+    yield the resources of a Bundle document one at a time, only the current
+    entry is held in memory
+    Params:
+      source: path (optionally gzip compressed) or file object
+      resource_type: only yield resources of this type
+      where: mapping {path: value} or callable, evaluated on the raw resource dict
+      model: yield `src.cls_helpers` instances instead of dicts
+      entries: yield the whole entry dicts instead of their resource
+      chunk_size: characters read at once
+      max_entry_size: StreamError on larger entries (or other top level values)
+      interner: `src.intern.Interner` deduplicating strings across resources
+    """
+    predicate = _compile_predicate(where)
+    decoder = (
+        _decoder
+        if interner is None
+        else json.JSONDecoder(object_pairs_hook=interner.object_pairs_hook)
+    )
+    with _open_text(source) as fp:
+        scanner = _Scanner(fp, chunk_size, max_entry_size, decoder)
+        scanner.expect("{")
+        if scanner.peek() == "}":
+            return
+        while True:
+            key = scanner.value()
+            if not isinstance(key, str):
+                raise StreamError(f"Expected a member name, got {key!r}")
+            scanner.expect(":")
+            if key == "entry" and scanner.peek() == "[":
+                scanner.expect("[")
+                if scanner.peek() == "]":
+                    scanner.expect("]")
+                else:
+                    while True:
+                        entry = scanner.value()
+                        resource = _select(
+                            entry.get("resource") if isinstance(entry, dict) else None,
+                            resource_type,
+                            predicate,
+                            model,
+                        )
+                        if resource is not _MISSING:
+                            yield entry if entries else resource
+                        if scanner.expect(",]") == "]":
+                            break
+            else:
+                # other top level members are decoded and dropped
+                scanner.value()
+            if scanner.expect(",}") == "}":
+                return
@@ -0,0 +1,231 @@
+"""
+offline terminology: code systems and expanded ValueSets loaded from local
+files into a memory-mapped `src.sorted_table.SortedTable`, for membership,
+display lookup and batch validation of codings without a terminology server
+"""
+import json
+import os
+from collections import abc
+from enum import Enum
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from src.sorted_table import SortedTable
+from src.stream import iter_ndjson
+
+_INDEX_VERSION = 1
+# separates the parts of the keys, not allowed in urls nor codes
+_SEP = "\x1f"
+
+System = Union[str, Enum]
+
+
+def _text(value: System) -> str:
+    return value.value if isinstance(value, Enum) else value
+
+
+def _code_key(system: System, code: str) -> bytes:
+    return f"C{_SEP}{_text(system)}{_SEP}{code}".encode()
+
+
+def _member_key(valueset: str, system: System, code: str) -> bytes:
+    return f"V{_SEP}{_text(valueset)}{_SEP}{_text(system)}{_SEP}{code}".encode()
+
+
+def _get(element: Any, key: str) -> Any:
+    if isinstance(element, abc.Mapping):
+        return element.get(key)
+    return getattr(element, key, None)
+
+
+def _concepts(concepts: Iterable[Mapping]) -> Iterator[Mapping]:
+    """CodeSystem.concept and ValueSet.expansion.contains are hierarchies"""
+    stack = list(concepts or [])[::-1]
+    while stack:
+        concept = stack.pop()
+        yield concept
+        stack.extend(reversed(concept.get("concept") or concept.get("contains") or []))
+
+
+def _rows(
+    resources: Iterable[Mapping],
+) -> Iterator[Tuple[bytes, Optional[str], Optional[str]]]:
+    """(key, display, ValueSet url) of the codes and ValueSet members"""
+    for resource in resources:
+        resource_type = resource.get("resourceType")
+        if resource_type == "CodeSystem":
+            system = resource["url"]
+            for concept in _concepts(resource.get("concept")):
+                yield _code_key(system, concept["code"]), concept.get("display"), None
+        elif resource_type == "ValueSet":
+            url = resource["url"]
+            contains = (resource.get("expansion") or {}).get("contains")
+            members = [
+                (concept.get("system"), concept)
+                for concept in _concepts(contains)
+                if concept.get("code") and not concept.get("abstract")
+            ]
+            # explicit enumerations of codes, when the ValueSet is not expanded
+            for include in (resource.get("compose") or {}).get("include") or []:
+                members.extend(
+                    (include.get("system"), concept)
+                    for concept in include.get("concept") or []
+                )
+            for system, concept in members:
+                yield _code_key(system, concept["code"]), concept.get("display"), None
+                yield _member_key(url, system, concept["code"]), None, url
+        elif resource_type == "Bundle":
+            yield from _rows(
+                entry["resource"]
+                for entry in resource.get("entry") or []
+                if "resource" in entry
+            )
+
+
+def _read(path: os.PathLike) -> Iterator[Mapping]:
+    if ".ndjson" in os.fspath(path):
+        yield from iter_ndjson(path)
+    else:
+        with open(path, encoding="utf-8") as fp:
+            yield json.load(fp)
+
+
+class TerminologyStore:
+    """
+    (system, code) pairs with their display, and ValueSet members, in sorted
+    arrays memory-mapped from one file: loading is immediate and the pages are
+    shared between processes. Systems may be given as `src.enum.TermURL`.
+    Build it once with `build`, then open it with `load`.
+    """
+
+    def __init__(self, table: SortedTable):
+        self.table = table
+
+    @classmethod
+    def build(
+        cls,
+        resources: Iterable[Union[Mapping, os.PathLike]],
+        path: os.PathLike = None,
+    ) -> "TerminologyStore":
+        """
+        store of CodeSystem, ValueSet (expanded, or enumerating their codes)
+        and Bundle resources, given as dicts or as .json / .ndjson files
+        Params:
+          path: where the store is saved, kept in memory only when None
+        """
+        displays: Dict[bytes, Optional[str]] = {}
+        valuesets = set()
+        for resource in resources:
+            items = [resource] if isinstance(resource, abc.Mapping) else _read(resource)
+            for key, display, valueset in _rows(items):
+                if display is not None or key not in displays:
+                    displays[key] = display
+                if valueset is not None:
+                    valuesets.add(valueset)
+
+        blob = bytearray()
+        rows = []
+        for key, display in displays.items():
+            encoded = (display or "").encode()
+            rows.append((key, (len(blob), len(encoded))))
+            blob += encoded
+        table = SortedTable.build(
+            rows,
+            ("display_offset", "display_length"),
+            meta={"version": _INDEX_VERSION, "valuesets": sorted(valuesets)},
+            blob=bytes(blob),
+        )
+        if path is not None:
+            table.save(path)
+        return cls(table)
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> "TerminologyStore":
+        """memory-map a saved store, ValueError if the file is not a store"""
+        table = SortedTable.load(path)
+        if table.meta.get("version") != _INDEX_VERSION:
+            table.close()
+            raise ValueError(f"{path} is not a terminology store")
+        return cls(table)
+
+    @property
+    def valuesets(self) -> List[str]:
+        return self.table.meta["valuesets"]
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __contains__(self, item: Tuple[System, str]) -> bool:
+        return self.contains(*item)
+
+    def contains(self, system: System, code: str) -> bool:
+        return self.table.find(_code_key(system, code)) is not None
+
+    def display(self, system: System, code: str) -> Optional[str]:
+        """display of the code, None when unknown or without display"""
+        position = self.table.find(_code_key(system, code))
+        if position is None:
+            return None
+        offset, length = self.table.row(position)
+        return bytes(self.table.blob[offset : offset + length]).decode() or None
+
+    def in_valueset(self, valueset: str, system: System, code: str) -> bool:
+        return self.table.find(_member_key(valueset, system, code)) is not None
+
+    def codes(self, system: System) -> Iterator[str]:
+        """codes of a system, in byte order"""
+        prefix = _code_key(system, "")
+        for position in self.table.prefixed(prefix):
+            yield self.table.key(position)[len(prefix) :].decode()
+
+    def validate(self, codings: Iterable[Any], valueset: str = None) -> List[bool]:
+        """
+        whether each coding is known, or is a member of the ValueSet. Codings
+        may be (system, code) pairs, Coding models or dicts. Repeated codings
+        are looked up once.
+        """
+        if valueset is None:
+            key = _code_key
+        else:
+            valueset = _text(valueset)
+
+            def key(system: System, code: str) -> bytes:
+                return _member_key(valueset, system, code)
+
+        find, seen = self.table.find, {}
+        results = []
+        for coding in codings:
+            if not isinstance(coding, tuple):
+                coding = (_get(coding, "system"), _get(coding, "code"))
+            valid = seen.get(coding)
+            if valid is None:
+                system, code = coding
+                valid = seen[coding] = (
+                    system is not None
+                    and code is not None
+                    and find(key(system, code)) is not None
+                )
+            results.append(valid)
+        return results
+
+    def matches(self, concept: Any, valueset: str = None) -> bool:
+        """whether a CodeableConcept has a known coding, or one in the ValueSet"""
+        return any(self.validate(_get(concept, "coding") or [], valueset))
+
+    def close(self):
+        self.table.close()
+
+    def __enter__(self) -> "TerminologyStore":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
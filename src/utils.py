@@ -1,5 +1,8 @@
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
 from operator import itemgetter
-from typing import Optional, Any, NoReturn, Union, List
+from typing import Optional, Any, NoReturn, Union, List, Iterable, Iterator, Callable
 
 last_func = itemgetter(-1)
 first_func = itemgetter(0)
@@ -59,3 +62,31 @@ def to_list(values: Union[List[Any], Any]) -> List[Any]:
 
 def mixin(cls):
     return cls
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """split an iterable into lists of at most `size` items"""
+    if size < 1:
+        raise ValueError(f"chunk size must be positive, received {size=}")
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def bounded_map(
+    executor: Executor,
+    function: Callable[..., Any],
+    iterable: Iterable[Any],
+    max_pending: int,
+) -> Iterator[Any]:
+    """
+    ordered executor map submitting at most `max_pending` tasks ahead of the
+    consumer, unlike `Executor.map` which consumes the whole iterable at once
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -0,0 +1,267 @@
+"""
+lightweight read-only views over raw resource dicts, exposing the getters of
+`src.cls_helpers` without validating the whole resource through pydantic
+"""
+import functools
+from collections import abc
+from typing import Any, Callable, Dict, Mapping, Optional, Type
+
+from fhir.resources import get_fhir_model_class
+from loguru import logger
+from pydantic import BaseModel
+from pydantic.fields import ModelField
+
+from src.dict_path import compile_path, get_attribute_for_path
+from src.intern import Interner
+
+_IDENTIFIERS = compile_path("identifier")
+_ADDRESS = compile_path("address.0")
+_NAMES = compile_path("name")
+
+
+@functools.lru_cache(maxsize=None)
+def _fields_by_alias(model_class: Type[BaseModel]) -> Dict[str, ModelField]:
+    return {field.alias: field for field in model_class.__fields__.values()}
+
+
+def _field_class(
+    model_class: Optional[Type[BaseModel]], key: str
+) -> Optional[Type[BaseModel]]:
+    """model class of a complex field, None for primitives or unknown fields"""
+    if model_class is None:
+        return None
+    field = _fields_by_alias(model_class).get(key)
+    resource_type = getattr(field and field.type_, "__resource_type__", None)
+    if resource_type is None or resource_type in ("Resource", "Element"):
+        return None
+    try:
+        return get_fhir_model_class(resource_type)
+    except KeyError:
+        return None
+
+
+def _wrap(value: Any, model_class: Optional[Type[BaseModel]]) -> Any:
+    if isinstance(value, abc.Mapping):
+        if "resourceType" in value:
+            return view_for(value)
+        return ElementView(value, model_class)
+    if isinstance(value, list):
+        return [_wrap(v, model_class) for v in value]
+    return value
+
+
+class ElementView:
+    """
+    attribute access over a raw element dict, complex values are wrapped in
+    views as well. Values are the raw JSON ones (dates stay str), missing
+    fields are None. `to_model` validates the element into its model class.
+    """
+
+    __slots__ = ("_data", "_model_class")
+
+    def __init__(self, data: Mapping, model_class: Type[BaseModel] = None):
+        self._data = data
+        self._model_class = model_class
+
+    def __getattr__(self, key: str) -> Any:
+        if key.startswith("__"):
+            raise AttributeError(key)
+        return self[key]
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._data.get(key)
+        if value is None or value.__class__ in (str, int, float, bool):
+            return value
+        return _wrap(value, self._field(key))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ElementView):
+            return self._data == other._data
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        model_class = self._class()
+        name = model_class.__name__ if model_class else "Element"
+        return f"{name}View({self._data!r})"
+
+    def _class(self) -> Optional[Type[BaseModel]]:
+        return self._model_class
+
+    def _field(self, key: str) -> Optional[Type[BaseModel]]:
+        return _field_class(self._class(), key)
+
+    def get(self, path: Any, default: Any = None) -> Any:
+        """raw value at a `dict_path` path"""
+        return get_attribute_for_path(self._data, path, default=default)
+
+    def dict(self) -> Mapping:
+        """the underlying dict, not copied"""
+        return self._data
+
+    def to_model(self) -> BaseModel:
+        """validate the element into its model class"""
+        model_class = self._class()
+        if model_class is None:
+            raise TypeError("Unknown model class for this element")
+        return model_class.parse_obj(self._data)
+
+
+class ResourceView(ElementView):
+    """
+    view over a resource dict with the `CommonMixin` getters, see `view_for`.
+    `to_model` returns the `src.cls_helpers` class of the resource.
+    """
+
+    __slots__ = ()
+
+    def _class(self) -> Type[BaseModel]:
+        if self._model_class is None:
+            from src.cls_helpers import get_resource_class
+
+            self._model_class = get_resource_class(self._data["resourceType"])
+        return self._model_class
+
+    def get_attr(
+        self, attr_name: str, sub_attr: str, sub_attr_value: Any, index: int
+    ) -> Optional[ElementView]:
+        if sub_attr_value:
+            path = [attr_name, {sub_attr: sub_attr_value}]
+        else:
+            path = [attr_name, index]
+        value = get_attribute_for_path(self._data, path, default=None)
+        if value is None and not sub_attr_value:
+            logger.error(f"No {attr_name=} found")
+        return None if value is None else _wrap(value, self._field(attr_name))
+
+    def get_identifier(self, index: int = 0, system: str = None) -> Optional[str]:
+        identifier = self.get_attr("identifier", "system", system, index)
+        return identifier._data.get("value") or "" if identifier else None
+
+    def get_identifier_by_type(self, system: str, code: str) -> Optional[str]:
+        for identifier in get_attribute_for_path(self._data, _IDENTIFIERS, default=[]):
+            codings = (identifier.get("type") or {}).get("coding") or []
+            for coding in codings:
+                if coding.get("system") == system and coding.get("code") == code:
+                    return identifier.get("value") or ""
+        return None
+
+    def get_extension(self, index: int = 0, url: str = None) -> Optional[ElementView]:
+        return self.get_attr("extension", "url", url, index)
+
+    def get_code(self, index: int = 0) -> Optional[ElementView]:
+        coding = get_attribute_for_path(
+            self._data, ["code", "coding", index], default=None
+        )
+        if coding is None:
+            logger.error(f"No code.coding.{index} found")
+            return None
+        return ElementView(coding, get_fhir_model_class("Coding"))
+
+    def find_contained_resource_with_matching_concept(
+        self, getter: Callable[[Any], Any], systems: Dict[str, str]
+    ) -> Optional["ResourceView"]:
+        for resource in self._data.get("contained") or []:
+            concepts = getter(view_for(resource))
+            if not isinstance(concepts, list):
+                concepts = [concepts]
+            for concept in concepts:
+                for coding in concept.coding or []:
+                    value = systems.get(coding.system)
+                    if value is not None and value == coding.code:
+                        return view_for(resource)
+        return None
+
+
+class PersonView(ResourceView):
+    """view with the `PersonMixin` getters"""
+
+    __slots__ = ()
+
+    def get_telecom(self, system: str, use: Optional[str] = None) -> str:
+        if not system:
+            raise ValueError(f"kind must be present, received {system=}")
+        conditions = {"system": system, "use": use} if use else {"system": system}
+        return (
+            get_attribute_for_path(
+                self._data, ["telecom", conditions, "value"], default=None
+            )
+            or ""
+        )
+
+    def get_email(self) -> str:
+        return self.get_telecom("email")
+
+    def get_phone(self) -> str:
+        return self.get_telecom("phone")
+
+    def get_mobile(self) -> str:
+        return self.get_telecom("phone", "mobile")
+
+    def get_address(self) -> Optional[ElementView]:
+        address = get_attribute_for_path(self._data, _ADDRESS, default=None)
+        return None if address is None else _wrap(address, self._field("address"))
+
+    def get_formatted_address(self) -> str:
+        address = get_attribute_for_path(self._data, _ADDRESS, default=None)
+        if not address:
+            return ""
+        parts = [
+            " ".join(address.get("line") or []),
+            address.get("postalCode") or "",
+            address.get("city") or "",
+            address.get("state") or "FR",
+        ]
+        return ", ".join(part for part in parts if part) or address.get("text") or ""
+
+    def get_name(self, use: str = None) -> Optional[ElementView]:
+        names = get_attribute_for_path(self._data, _NAMES, default=None)
+        if not names:
+            return None
+        if use:
+            names = [name for name in names if name.get("use") == use]
+        return _wrap(names[0], self._field("name")) if names else None
+
+    def get_official_name(self) -> Optional[ElementView]:
+        return self.get_name(use="official")
+
+    def get_usual_name(self) -> Optional[ElementView]:
+        return self.get_name(use="usual")
+
+    def get_maiden_name(self) -> Optional[ElementView]:
+        return self.get_name(use="maiden")
+
+
+class PatientView(PersonView):
+    __slots__ = ()
+
+
+class PractitionerView(PersonView):
+    __slots__ = ()
+
+
+class ObservationView(ResourceView):
+    __slots__ = ()
+
+
+_VIEWS: Dict[str, Type[ResourceView]] = {
+    "Patient": PatientView,
+    "Practitioner": PractitionerView,
+    "Observation": ObservationView,
+}
+
+
+def view_for(resource: Mapping, interner: Interner = None) -> ResourceView:
+    """
+    view of a resource dict, with the getters of its `src.cls_helpers` class
+    Params:
+      interner: `src.intern.Interner`, the view then holds an interned copy of
+        the resource, for views kept in memory
+    """
+    if interner is not None:
+        resource = interner.intern(resource)
+    return _VIEWS.get(resource["resourceType"], ResourceView)(resource)
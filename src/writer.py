@@ -0,0 +1,266 @@
+"""
+batched writes: created and updated resources sent in transaction or batch
+Bundles instead of one request each
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+import aiohttp
+from fhir.resources.reference import Reference
+from fhirpy.base.exceptions import OperationOutcome
+from pydantic import BaseModel
+
+from src.factory import IdGenerator, ref
+
+Resource = Union[BaseModel, Mapping]
+
+
+def _json(resource: Resource) -> str:
+    if isinstance(resource, BaseModel):
+        return resource.json()
+    return json.dumps(resource, separators=(",", ":"))
+
+
+class SessionClient:
+    """
+    connection-pooled client posting Bundles to the base url, fhirpy clients
+    open a connection per request
+    Params:
+      limit: connections kept open at most
+    """
+
+    def __init__(
+        self,
+        url: str,
+        authorization: str = None,
+        limit: int = 10,
+        extra_headers: Dict[str, str] = None,
+    ):
+        self.url = url
+        self.headers = {
+            "Accept": "application/fhir+json",
+            "Content-Type": "application/fhir+json",
+            **({"Authorization": authorization} if authorization else {}),
+            **(extra_headers or {}),
+        }
+        self.limit = limit
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def post_bundle(self, body: str) -> Any:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit)
+            )
+        async with self._session.post(
+            self.url, data=body.encode(), headers=self.headers
+        ) as response:
+            text = await response.text()
+            if not 200 <= response.status < 300:
+                raise OperationOutcome(reason=text)
+            return json.loads(text)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "SessionClient":
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+class Entry:
+    """
+    pending entry of a Bundle, awaiting it gives the entry of the response
+    Bundle (`response.status`, `response.location`, `resource`). For batch
+    Bundles failed entries are returned as well, a failed transaction raises
+    for all of its entries.
+    """
+
+    __slots__ = ("full_url", "method", "url", "body", "future")
+
+    def __init__(self, full_url: Optional[str], method: str, url: str, body: str):
+        self.full_url = full_url
+        self.method = method
+        self.url = url
+        self.body = body
+        self.future = asyncio.get_running_loop().create_future()
+
+    @property
+    def reference(self) -> Reference:
+        """reference to the entry, `urn:uuid` for created resources"""
+        return ref(self.full_url or self.url)
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class BundleWriter:
+    """
+    collect creates and updates into Bundles, flushed when `max_entries` or
+    `max_bytes` is reached, or `max_delay` seconds after their first entry,
+    and sent concurrently. Adding an entry waits while `concurrency` Bundles
+    are in flight. Use as an async context manager, pending entries are sent
+    on exit.
+    Created resources get a `urn:uuid` fullUrl, their `Entry.reference` can
+    be set in other resources of the same Bundle, see `group`.
+    Params:
+      client: fhirpy async client (`execute`) or `SessionClient`
+      bundle_type: transaction or batch
+      ids: generator of the `urn:uuid` values
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        /,
+        bundle_type: str = "transaction",
+        max_entries: int = 100,
+        max_bytes: int = 1 << 20,
+        max_delay: float = None,
+        concurrency: int = 4,
+        ids: IdGenerator = None,
+    ):
+        if bundle_type not in ("transaction", "batch"):
+            raise ValueError(f"Unsupported {bundle_type=}")
+        self.client = client
+        self.bundle_type = bundle_type
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.ids = ids or IdGenerator()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: List[Entry] = []
+        self._size = 0
+        self._groups = 0
+        self._generation = 0
+        self._timer: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    async def create(self, resource: Resource, /, if_none_exist: str = None) -> Entry:
+        resource_type = _get_type(resource)
+        request = {"method": "POST", "url": resource_type}
+        if if_none_exist:
+            request["ifNoneExist"] = if_none_exist
+        return await self._add(self.ids.urn(), request, resource)
+
+    async def update(self, resource: Resource, /) -> Entry:
+        resource_id = (
+            resource.id if isinstance(resource, BaseModel) else resource.get("id")
+        )
+        if not resource_id:
+            raise ValueError("Can only update resources with an id")
+        url = f"{_get_type(resource)}/{resource_id}"
+        return await self._add(None, {"method": "PUT", "url": url}, resource)
+
+    async def _add(
+        self, full_url: Optional[str], request: Dict[str, str], resource: Resource
+    ) -> Entry:
+        head = f'{{"fullUrl":{json.dumps(full_url)},' if full_url else "{"
+        body = f'{head}"resource":{_json(resource)},"request":{json.dumps(request)}}}'
+        entry = Entry(full_url, request["method"], request["url"], body)
+        if (
+            self._pending
+            and self._size + len(body) > self.max_bytes
+            and not self._groups
+        ):
+            await self.flush()
+        self._pending.append(entry)
+        self._size += len(body) + 1
+        if len(self._pending) == 1 and self.max_delay is not None:
+            self._timer = asyncio.create_task(self._flush_later(self._generation))
+        if len(self._pending) >= self.max_entries and not self._groups:
+            await self.flush()
+        return entry
+
+    def group(self) -> "_Group":
+        """
+        entries added within `async with writer.group():` are sent in the same
+        Bundle, so that they can reference each other
+        """
+        return _Group(self)
+
+    async def _flush_later(self, generation: int):
+        await asyncio.sleep(self.max_delay)
+        while self._groups:
+            await asyncio.sleep(self.max_delay)
+        if generation == self._generation:
+            await self.flush()
+
+    async def flush(self):
+        """send the pending entries"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        if not self._pending:
+            return
+        entries, self._pending, self._size = self._pending, [], 0
+        self._generation += 1
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._send(entries))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, entries: List[Entry]):
+        try:
+            body = (
+                f'{{"resourceType":"Bundle","type":"{self.bundle_type}",'
+                f'"entry":[{",".join(entry.body for entry in entries)}]}}'
+            )
+            if hasattr(self.client, "post_bundle"):
+                response = await self.client.post_bundle(body)
+            else:
+                response = await self.client.execute(
+                    "/", method="post", data=json.loads(body)
+                )
+            results = response.get("entry") or []
+            if len(results) != len(entries):
+                raise OperationOutcome(
+                    reason=f"{len(results)} response entries for {len(entries)}"
+                )
+            for entry, result in zip(entries, results):
+                entry.future.set_result(result)
+        except Exception as e:
+            for entry in entries:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+        finally:
+            self._semaphore.release()
+
+    async def close(self):
+        """send the pending entries and wait for all the Bundles"""
+        await self.flush()
+        await asyncio.gather(*self._tasks)
+
+    async def __aenter__(self) -> "BundleWriter":
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+class _Group:
+    def __init__(self, writer: BundleWriter):
+        self.writer = writer
+
+    async def __aenter__(self) -> BundleWriter:
+        self.writer._groups += 1
+        return self.writer
+
+    async def __aexit__(self, *_):
+        self.writer._groups -= 1
+        writer = self.writer
+        if not writer._groups and (
+            len(writer._pending) >= writer.max_entries
+            or writer._size >= writer.max_bytes
+        ):
+            await writer.flush()
+
+
+def _get_type(resource: Resource) -> str:
+    if isinstance(resource, BaseModel):
+        return resource.resource_type
+    return resource["resourceType"]
@@ -0,0 +1,113 @@
+"""
+minimal FHIR server on localhost for the fhirpy based tests: paged searches,
+reads, and transaction / batch Bundles
+"""
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+
+class StubFHIRServer:
+    def __init__(self, resources: List[dict] = (), page_size: int = 2, delay=0.0):
+        self.resources: Dict[str, Dict[str, dict]] = defaultdict(dict)
+        for resource in resources:
+            self.resources[resource["resourceType"]][resource["id"]] = resource
+        self.page_size = page_size
+        self.delay = delay
+        self.requests: List[str] = []
+        self.in_flight = self.max_in_flight = 0
+        self._ids = iter(range(1000, 10**9))
+        app = web.Application()
+        app.router.add_get("/{resource_type}", self.search)
+        app.router.add_get("/{resource_type}/{id}", self.read)
+        app.router.add_post("/", self.bundle)
+        self._server = TestServer(app)
+
+    @property
+    def url(self) -> str:
+        return str(self._server.make_url("")).rstrip("/")
+
+    async def __aenter__(self) -> "StubFHIRServer":
+        await self._server.start_server()
+        return self
+
+    async def __aexit__(self, *_):
+        await self._server.close()
+
+    async def _track(self, request: web.Request):
+        self.requests.append(request.path_qs)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+    async def search(self, request: web.Request) -> web.Response:
+        await self._track(request)
+        resource_type = request.match_info["resource_type"]
+        page = int(request.query.get("_page", 1))
+        count = int(request.query.get("_count", self.page_size))
+        resources = list(self.resources[resource_type].values())
+        selected = resources[(page - 1) * count : page * count]
+        bundle = {
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": len(resources),
+            "link": [],
+            "entry": [{"resource": r, "search": {"mode": "match"}} for r in selected],
+        }
+        if page * count < len(resources):
+            bundle["link"].append(
+                {
+                    "relation": "next",
+                    "url": f"{self.url}/{resource_type}?_count={count}&_page={page + 1}",
+                }
+            )
+        return web.json_response(bundle)
+
+    async def read(self, request: web.Request) -> web.Response:
+        await self._track(request)
+        resource = self.resources[request.match_info["resource_type"]].get(
+            request.match_info["id"]
+        )
+        if resource is None:
+            return web.json_response(
+                {"resourceType": "OperationOutcome", "issue": []}, status=404
+            )
+        return web.json_response(resource)
+
+    async def bundle(self, request: web.Request) -> web.Response:
+        await self._track(request)
+        bundle = json.loads(await request.text())
+        entries = []
+        for entry in bundle.get("entry", []):
+            resource = entry.get("resource") or {}
+            method = entry["request"]["method"]
+            if resource.get("meta", {}).get("tag") == [{"code": "reject"}]:
+                entries.append({"response": {"status": "400 Bad Request"}})
+                continue
+            resource_type = resource["resourceType"]
+            if method == "POST":
+                resource = {**resource, "id": str(next(self._ids))}
+            self.resources[resource_type][resource["id"]] = resource
+            entries.append(
+                {
+                    "resource": resource,
+                    "response": {
+                        "status": "201 Created" if method == "POST" else "200 OK",
+                        "location": f"{resource_type}/{resource['id']}/_history/1",
+                    },
+                }
+            )
+        return web.json_response(
+            {
+                "resourceType": "Bundle",
+                "type": f"{bundle['type']}-response",
+                "entry": entries,
+            }
+        )
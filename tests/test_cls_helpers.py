@@ -1,9 +1,26 @@
-from typing import Set, Type
+import gc
+import json
+import os
+import pickle
+import subprocess
+import sys
+from typing import Set, Tuple, Type
 
 from assertpy.assertpy import assert_that
-from pydantic import BaseModel
+from fhir.resources.humanname import HumanName
+from pydantic import BaseModel, ValidationError
 
-from src.cls_helpers import mixin_with, merge_with, Patient, MergeMixin
+from src.cls_helpers import (
+    _LOOKUPS,
+    CommonMixin,
+    PersonMixin,
+    get_resource_class,
+    mixin_with,
+    merge_with,
+    Patient,
+    MergeMixin,
+    Observation,
+)
 from tests.resources.patient import patient1
 
 
@@ -46,3 +63,139 @@ def test_subclass():
         ...
 
     new_patient_1(FrPatient)
+
+
+def test_merge_with_patients():
+    patient = Patient(**patient1)
+    other = Patient(
+        resourceType="Patient",
+        gender="female",
+        address=[{"city": "Paris"}],
+        telecom=[{"system": "phone", "value": "0600000000"}],
+    )
+    merged = patient.merge_with(other)
+    assert_that(merged).is_not_same_as(patient)
+    assert_that(merged.gender).is_equal_to("female")
+    assert_that(merged.get_phone()).is_equal_to("0600000000")
+    assert_that(merged.address[0].city).is_equal_to("Paris")
+    # untouched sub-models are reused
+    assert_that(merged.name).is_same_as(patient.name)
+    assert_that(merged.identifier).is_same_as(patient.identifier)
+    assert_that(merged.birthDate).is_equal_to(patient.birthDate)
+
+
+def test_merge_with_validates_changed_fields():
+    observation = Observation(
+        resourceType="Observation",
+        status="final",
+        code={"text": "weight"},
+        valueString="60 kg",
+    )
+    other = Observation(
+        resourceType="Observation",
+        status="final",
+        code={"text": "weight"},
+        valueQuantity={"value": 60},
+    )
+    # a single value[x] is allowed
+    assert_that(observation.merge_with).raises(ValidationError).when_called_with(other)
+    merged = observation.merge_with(other, trusted=True)
+    assert_that(merged.valueQuantity.value).is_equal_to(60)
+
+
+def test_lookup_tables_invalidation():
+    patient = Patient(
+        resourceType="Patient",
+        identifier=[{"system": "urn:ins", "value": "1"}],
+        telecom=[
+            {"system": "phone", "use": "home", "value": "0100000000"},
+            {"system": "phone", "use": "mobile", "value": "0600000000"},
+        ],
+        name=[{"use": "official", "family": "DUBOIS"}],
+        contained=[{"resourceType": "Practitioner", "id": "dr"}],
+    )
+    assert_that(patient.get_identifier(system="urn:ins")).is_equal_to("1")
+    assert_that(patient.get_contained("dr").resource_type).is_equal_to("Practitioner")
+    assert_that(patient.get_contained("other")).is_none()
+    assert_that(patient.get_identifier(system="urn:ipp")).is_none()
+    assert_that(patient.get_phone()).is_equal_to("0100000000")
+    assert_that(patient.get_mobile()).is_equal_to("0600000000")
+    assert_that(patient.get_maiden_name()).is_none()
+
+    # reassigned and appended fields are looked up again
+    patient.identifier = [{"system": "urn:ipp", "value": "2"}]
+    assert_that(patient.get_identifier(system="urn:ins")).is_none()
+    assert_that(patient.get_identifier(system="urn:ipp")).is_equal_to("2")
+    patient.name.append(HumanName(use="maiden", family="MARTIN"))
+    assert_that(patient.get_maiden_name().family).is_equal_to("MARTIN")
+
+    # tables are dropped with their instance
+    key = id(patient)
+    assert_that(_LOOKUPS).contains_key(key)
+    del patient
+    gc.collect()
+    assert_that(_LOOKUPS).does_not_contain_key(key)
+
+
+def test_get_attr_unhashable_values():
+    patient = Patient(
+        resourceType="Patient",
+        identifier=[
+            {"system": "urn:ins", "value": "1", "type": {"text": "x"}},
+            {"system": "urn:ipp", "value": "2", "type": {"text": "y"}},
+        ],
+    )
+    concept = patient.identifier[1].type.copy()
+    assert_that(patient.get_attr("identifier", "type", concept, 0).value).is_equal_to(
+        "2"
+    )
+    assert_that(patient.get_attr("identifier", "system", ["urn:ins"], 0)).is_none()
+    assert_that(patient.get_identifier(system="urn:ins")).is_equal_to("1")
+
+
+def _import_time(code: str) -> Tuple[float, set]:
+    """seconds spent running code in a fresh interpreter, and imported modules"""
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{code}\n"
+        "print(json.dumps([time.perf_counter() - start, list(sys.modules)]))"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=root, capture_output=True, check=True
+    ).stdout
+    seconds, modules = json.loads(output)
+    return seconds, set(modules)
+
+
+def test_lazy_import():
+    seconds, modules = _import_time("import src.cls_helpers")
+    assert_that(modules).does_not_contain(
+        "fhir.resources.patient", "fhir.resources.observation"
+    )
+    _, modules = _import_time("from src.cls_helpers import Patient")
+    assert_that(modules).contains("fhir.resources.patient")
+    assert_that(modules).does_not_contain("fhir.resources.observation")
+
+    eager_seconds, _ = _import_time(
+        "import src.cls_helpers as helpers\n"
+        "for name in ('Patient', 'Practitioner', 'ResearchSubject',"
+        " 'QuestionnaireResponse', 'Observation', 'Encounter', 'Condition',"
+        " 'ResearchStudy', 'Flag', 'Organization', 'CareTeam', 'List'):\n"
+        "    getattr(helpers, name)"
+    )
+    assert_that(seconds).is_less_than(eager_seconds)
+
+
+def test_resource_classes_on_demand():
+    import src.cls_helpers as helpers
+
+    medication = helpers.MedicationRequest
+    assert_that(medication).is_same_as(get_resource_class("MedicationRequest"))
+    assert_that(medication.get_identifier).is_same_as(CommonMixin.get_identifier)
+    assert_that(helpers.Patient.get_email).is_same_as(PersonMixin.get_email)
+    assert_that(pickle.loads(pickle.dumps(Patient(**patient1)))).is_instance_of(Patient)
+    assert_that(get_resource_class).raises(ValueError).when_called_with("Unknown")
+    assert_that(get_resource_class).raises(ValueError).when_called_with("HumanName")
+    assert_that(hasattr(helpers, "Unknown")).is_false()
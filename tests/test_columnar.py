@@ -0,0 +1,150 @@
+import array
+import datetime
+import math
+
+import pytest
+from assertpy import assert_that
+
+from src.columnar import extract_columns, iter_column_chunks
+
+observations = [
+    {
+        "resourceType": "Observation",
+        "id": str(i),
+        "code": {"coding": [{"system": "http://loinc.org", "code": "8867-4"}]},
+        "valueQuantity": {"value": 60 + i, "unit": "/min"},
+        "effectiveDateTime": f"2022-01-0{i + 1}T10:00:00+01:00",
+        "component": [
+            {"code": {"text": "position"}, "valueString": "sitting"},
+        ],
+    }
+    for i in range(5)
+]
+observations[3] = {"resourceType": "Observation", "id": "3"}
+
+spec = {
+    "id": "id",
+    "loinc": ["code.coding", {"system": "http://loinc.org"}, "code"],
+    "value": ("valueQuantity.value", "float"),
+    "date": ("effectiveDateTime", "date"),
+    "position": ["component", {"code.text": "position"}, "valueString"],
+}
+
+
+def test_extract_columns_as_lists():
+    columns = extract_columns(observations, spec, chunk_size=2)
+    assert_that(columns["id"]).is_equal_to(["0", "1", "2", "3", "4"])
+    assert_that(columns["loinc"]).is_equal_to(
+        ["8867-4", "8867-4", "8867-4", None, "8867-4"]
+    )
+    assert_that(columns["value"]).is_equal_to([60.0, 61.0, 62.0, None, 64.0])
+    assert_that(columns["date"][0]).is_equal_to(datetime.date(2022, 1, 1))
+    assert_that(columns["position"][3]).is_none()
+
+
+def test_extract_columns_default():
+    columns = extract_columns(observations, {"loinc": spec["loinc"]}, default="")
+    assert_that(columns["loinc"][3]).is_equal_to("")
+
+
+def test_extract_columns_as_arrays():
+    columns = extract_columns(observations, spec, output="array", chunk_size=2)
+    assert_that(columns["value"]).is_instance_of(array.array)
+    assert_that(columns["value"].typecode).is_equal_to("d")
+    assert_that(math.isnan(columns["value"][3])).is_true()
+    assert_that(columns["date"][0]).is_equal_to(
+        (datetime.date(2022, 1, 1) - datetime.date(1970, 1, 1)).days
+    )
+    assert_that(columns["id"]).is_instance_of(list)
+
+
+def test_extract_int_column_with_missing_values():
+    int_spec = {"value": ("valueQuantity.value", "int")}
+    assert_that(extract_columns).raises(ValueError).when_called_with(
+        observations, int_spec, output="array"
+    )
+    columns = extract_columns(observations, int_spec, output="array", default=-1)
+    assert_that(list(columns["value"])).is_equal_to([60, 61, 62, -1, 64])
+
+
+def test_extract_columns_as_numpy():
+    np = pytest.importorskip("numpy")
+    columns = extract_columns(observations, spec, output="numpy", chunk_size=2)
+    assert_that(columns["value"].dtype).is_equal_to(np.float64)
+    assert_that(np.isnan(columns["value"][3])).is_true()
+    assert_that(np.isnat(columns["date"][3])).is_true()
+    assert_that(len(columns["date"])).is_equal_to(5)
+
+
+def test_extract_columns_with_process_pool():
+    assert_that(
+        extract_columns(observations, spec, chunk_size=2, processes=2)
+    ).is_equal_to(extract_columns(observations, spec))
+
+
+def test_iter_column_chunks():
+    chunks = list(iter_column_chunks(iter(observations), {"id": "id"}, chunk_size=2))
+    assert_that(chunks).is_equal_to(
+        [{"id": ["0", "1"]}, {"id": ["2", "3"]}, {"id": ["4"]}]
+    )
+
+
+def test_extract_columns_empty():
+    assert_that(extract_columns([], spec, output="array")["value"]).is_length(0)
+
+
+def test_extract_typed_columns_default_as_lists():
+    columns = extract_columns(observations, {"value": spec["value"]}, default=0)
+    assert_that(columns["value"][3]).is_equal_to(0.0).is_instance_of(float)
+    columns = extract_columns(
+        observations, {"date": spec["date"]}, default="2000-01-01"
+    )
+    assert_that(columns["date"][3]).is_equal_to(datetime.date(2000, 1, 1))
+    assert_that(extract_columns).raises(ValueError).when_called_with(
+        observations, {"value": spec["value"]}, default="n/a"
+    )
+
+
+def test_extract_typed_columns_default_as_arrays():
+    columns = extract_columns(
+        observations, {"date": spec["date"]}, output="array", default="2000-01-01"
+    )
+    assert_that(columns["date"][3]).is_equal_to(
+        (datetime.date(2000, 1, 1) - datetime.date(1970, 1, 1)).days
+    )
+    columns = extract_columns(
+        observations, {"value": spec["value"]}, output="array", default=-1
+    )
+    assert_that(columns["value"][3]).is_equal_to(-1.0)
+
+
+def test_extract_typed_columns_default_as_numpy():
+    np = pytest.importorskip("numpy")
+    columns = extract_columns(
+        observations, {"value": spec["value"]}, output="numpy", default=-1
+    )
+    assert_that(columns["value"][3]).is_equal_to(-1.0)
+    columns = extract_columns(
+        observations, {"date": spec["date"]}, output="numpy", default="2000-01-01"
+    )
+    assert_that(columns["date"][3]).is_equal_to(np.datetime64("2000-01-01"))
+
+
+def test_extract_columns_per_column_default():
+    mixed = {
+        "date": spec["date"],
+        "value": ("valueQuantity.value", "int", -1),
+        "active": ("status", "bool", False),
+    }
+    columns = extract_columns(observations, mixed, output="array")
+    assert_that(math.isnan(columns["date"][3])).is_true()
+    assert_that(list(columns["value"])).is_equal_to([60, 61, 62, -1, 64])
+    assert_that(list(columns["active"])).is_equal_to([0] * 5)
+    columns = extract_columns(observations, mixed, output="array", default="2000-01-01")
+    assert_that(columns["date"][3]).is_equal_to(
+        (datetime.date(2000, 1, 1) - datetime.date(1970, 1, 1)).days
+    )
+    assert_that(columns["value"][3]).is_equal_to(-1)
+    assert_that(extract_columns).raises(ValueError).when_called_with(
+        observations, {"value": ("valueQuantity.value", "int", "n/a")}
+    )
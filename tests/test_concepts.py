@@ -0,0 +1,95 @@
+from assertpy.assertpy import assert_that
+
+from src.cls_helpers import _LOOKUPS, Observation
+from src.concepts import ConceptIndex
+
+LOINC = "http://loinc.org"
+SNOMED = "http://snomed.info/sct"
+
+
+def _observation(resource_id: str, *codings) -> dict:
+    return {
+        "resourceType": "Observation",
+        "id": resource_id,
+        "status": "final",
+        "code": {"coding": [{"system": s, "code": c} for s, c in codings]},
+    }
+
+
+def _code(resource):
+    return resource.code
+
+
+def test_concept_index():
+    contained = [
+        _observation("a", (LOINC, "8310-5")),
+        _observation("b", (LOINC, "8867-4"), (SNOMED, "364075005")),
+        _observation("c", (SNOMED, "364075005")),
+    ]
+    observation = Observation(
+        **_observation("root", (LOINC, "1-1")), contained=contained
+    )
+    index = ConceptIndex.from_resource(observation, _code)
+
+    assert_that(len(index)).is_equal_to(3)
+    assert_that((LOINC, "8310-5") in index).is_true()
+    assert_that(index.find({LOINC: "8867-4"}).id).is_equal_to("b")
+    assert_that(index.find({SNOMED: "364075005", LOINC: "8310-5"}).id).is_equal_to("a")
+    assert_that(index.find({LOINC: "0000-0"})).is_none()
+    ids = [r.id for r in index.find_all([(LOINC, "8310-5"), (SNOMED, "364075005")])]
+    assert_that(ids).is_equal_to(["a", "b", "c"])
+    ids = [r.id for r in index.match_all({LOINC: "8867-4", SNOMED: "364075005"})]
+    assert_that(ids).is_equal_to(["b"])
+    assert_that(index.match_all({LOINC: "8310-5", SNOMED: "364075005"})).is_empty()
+
+    bundle = {
+        "resourceType": "Bundle",
+        "entry": [{"resource": resource} for resource in contained] + [{}],
+    }
+    index = ConceptIndex.from_bundle(bundle, lambda r: r.get("code"))
+    assert_that(index.get(SNOMED, "364075005")).is_equal_to(contained[1:])
+
+
+def test_find_contained_resource():
+    observation = Observation(
+        **_observation("root", (LOINC, "1-1")),
+        contained=[_observation("a", (LOINC, "8310-5"))],
+    )
+    found = observation.find_contained_resource_with_matching_concept(
+        _code, {LOINC: "8310-5"}
+    )
+    assert_that(found.id).is_equal_to("a")
+    observation.contained.append(Observation(**_observation("b", (LOINC, "8867-4"))))
+    found = observation.find_contained_resource_with_matching_concept(
+        lambda r: r.code, {LOINC: "8867-4"}
+    )
+    assert_that(found.id).is_equal_to("b")
+    # the index is only built on request
+    assert_that(_LOOKUPS.get(id(observation), {})).does_not_contain_key(
+        ("contained", "concepts")
+    )
+    assert_that(
+        Observation(
+            **_observation("empty", (LOINC, "1-1"))
+        ).find_contained_resource_with_matching_concept(_code, {LOINC: "1-1"})
+    ).is_none()
+
+
+def test_get_concept_index():
+    observation = Observation(
+        **_observation("root", (LOINC, "1-1")),
+        contained=[_observation("a", (LOINC, "8310-5"))],
+    )
+    index = observation.get_concept_index(_code)
+    assert_that(index.find({LOINC: "8310-5"}).id).is_equal_to("a")
+    assert_that(observation.get_concept_index(_code)).is_same_as(index)
+
+    observation.contained.append(Observation(**_observation("b", (LOINC, "8867-4"))))
+    index_b = observation.get_concept_index(_code)
+    assert_that(index_b).is_not_same_as(index)
+    assert_that(index_b.find({LOINC: "8867-4"}).id).is_equal_to("b")
+
+    for _ in range(20):
+        observation.get_concept_index(lambda r: r.code)
+    tables = _LOOKUPS[id(observation)]
+    assert_that(len(tables["contained", "concepts"][2])).is_less_than_or_equal_to(8)
@@ -8,6 +8,17 @@ from src.dict_path import (
     PathError,
     set_attribute_for_path,
     finder,
+    compile_path,
+    CompiledPath,
+    Where,
+    get_many,
+    compile_many,
+    WhereIndex,
+    iter_attribute_for_path,
+    apply_patch,
+    Append,
+    Remove,
+    Replace,
 )
 
 dol = {"label": "doliprane"}
@@ -153,3 +164,466 @@ def test_set_attribute_with_dict():
             }
         }
     )
+
+
+def test_compile_path():
+    compiled = compile_path(
+        ["medication.ingredients", {"extension.url": "1"}, "extension.value"]
+    )
+    assert_that(compiled).is_instance_of(CompiledPath)
+    assert_that(compiled[:2]).is_equal_to(("medication", "ingredients"))
+    assert_that(compiled[2]).is_instance_of(Where)
+    assert_that(compile_path("medication.ingredients.0")[-1]).is_equal_to(0)
+    assert_that(compile_path(compiled)).is_same_as(compiled)
+    assert_that(
+        attr_for_path(
+            {"medication": {"ingredients": [{"extension": {"url": "1", "value": 2}}]}},
+            compiled,
+        )
+    ).is_equal_to(2)
+
+
+def test_compile_path_is_cached():
+    compile_path.cache_clear()
+    first = compile_path(["medication", {"extension.url": "1"}])
+    assert_that(compile_path(["medication", {"extension.url": "1"}])).is_same_as(first)
+    assert_that(compile_path.cache_info().hits).is_equal_to(1)
+    # unhashable where values are compiled without caching
+    assert_that(compile_path(["name", {"given": ["Marc"]}])[-1]).is_instance_of(Where)
+
+
+def test_get_attribute_falsy_default():
+    assert_that(attr_for_path(dol, "missing", default=0)).is_equal_to(0)
+    assert_that(attr_for_path(dol3, "medication.ingredients.9", default="")).is_empty()
+
+
+def test_where_with_several_conditions():
+    source = {
+        "identifier": [
+            {"system": "a", "use": "old", "value": "1"},
+            {"system": "a", "use": "official", "value": "2"},
+        ]
+    }
+    assert_that(
+        attr_for_path(
+            source, ["identifier", {"system": "a", "use": "official"}, "value"]
+        )
+    ).is_equal_to("2")
+    assert_that(attr_for_path).raises(PathError).when_called_with(
+        source, ["identifier", {"system": "b"}, "value"]
+    )
+
+
+patient_like = {
+    "identifier": [
+        {"system": "ins", "value": "1"},
+        {"system": "ipp", "value": "2", "period": {"start": "2020"}},
+    ],
+    "name": [{"family": "DUBOIS", "given": ["Marc"]}],
+}
+
+
+def test_get_many():
+    assert_that(
+        get_many(
+            patient_like,
+            {
+                "ins": ["identifier", {"system": "ins"}, "value"],
+                "ipp": ["identifier", {"system": "ipp"}, "value"],
+                "ipp_start": ["identifier", {"system": "ipp"}, "period.start"],
+                "family": "name.0.family",
+                "given": "name.0.given.0",
+                "name": "name.0",
+                "root": [],
+            },
+        )
+    ).is_equal_to(
+        {
+            "ins": "1",
+            "ipp": "2",
+            "ipp_start": "2020",
+            "family": "DUBOIS",
+            "given": "Marc",
+            "name": {"family": "DUBOIS", "given": ["Marc"]},
+            "root": patient_like,
+        }
+    )
+
+
+def test_get_many_missing():
+    paths = {
+        "family": "name.0.family",
+        "prefix": "name.0.prefix.0",
+        "other": ["identifier", {"system": "other"}, "value"],
+    }
+    assert_that(get_many(patient_like, paths, default=None)).is_equal_to(
+        {"family": "DUBOIS", "prefix": None, "other": None}
+    )
+    assert_that(get_many).raises(PathError).when_called_with(patient_like, paths)
+
+
+def test_get_many_with_compiled_trie():
+    trie = compile_many({"family": "name.0.family"})
+    assert_that(compile_many({"family": "name.0.family"})).is_same_as(trie)
+    assert_that(get_many(patient_like, trie)).is_equal_to({"family": "DUBOIS"})
+
+
+def test_where_index():
+    document = copy.deepcopy(patient_like)
+    index = WhereIndex()
+    assert_that(
+        finder(document, index=index)
+        .select("identifier", where={"system": "ipp"})
+        .get("value")
+    ).is_equal_to("2")
+    assert_that(index).is_length(1)
+    assert_that(
+        finder(document, index=index)
+        .select("identifier", where={"system": "ins"})
+        .get("value")
+    ).is_equal_to("1")
+    # same list and sub path, the table is reused
+    assert_that(index).is_length(1)
+    assert_that(
+        attr_for_path(
+            document, ["identifier", {"system": "x"}], default=None, index=index
+        )
+    ).is_none()
+
+
+def test_where_index_invalidation():
+    document = copy.deepcopy(patient_like)
+    index = WhereIndex()
+    get_ins = lambda: attr_for_path(  # noqa: E731
+        document, ["identifier", {"system": "ins"}, "value"], default=None, index=index
+    )
+    assert_that(get_ins()).is_equal_to("1")
+
+    finder(document, index=index).update("identifier", where={"system": "ins"}).set(
+        "system", "nir"
+    )
+    assert_that(index).is_length(0)
+    assert_that(get_ins()).is_none()
+
+    finder(document, index=index).update("identifier").append(
+        {"system": "ins", "value": "3"}
+    )
+    assert_that(get_ins()).is_equal_to("3")
+
+    # in place mutations not going through the updater need an explicit call
+    document["identifier"][2]["value"] = "4"
+    document["identifier"][2]["system"] = "other"
+    index.invalidate(document["identifier"])
+    assert_that(get_ins()).is_none()
+
+
+def test_get_many_with_index():
+    index = WhereIndex()
+    paths = {
+        "ins": ["identifier", {"system": "ins"}, "value"],
+        "ipp": ["identifier", {"system": "ipp"}, "value"],
+    }
+    assert_that(get_many(patient_like, paths, index=index)).is_equal_to(
+        {"ins": "1", "ipp": "2"}
+    )
+    assert_that(index).is_length(1)
+
+
+bundle = {
+    "resourceType": "Bundle",
+    "entry": [
+        {
+            "resource": {
+                "resourceType": "Patient",
+                "identifier": [
+                    {"system": "ins", "value": "1"},
+                    {"system": "ipp", "value": "2"},
+                ],
+            }
+        },
+        {"resource": {"resourceType": "Organization"}},
+        {
+            "resource": {
+                "resourceType": "Patient",
+                "identifier": [{"system": "ins", "value": "3"}],
+            }
+        },
+    ],
+}
+
+
+def test_iter_attribute_for_path_wildcard():
+    assert_that(
+        list(iter_attribute_for_path(bundle, "entry.*.resource.identifier.*.value"))
+    ).is_equal_to(
+        [
+            (("entry", 0, "resource", "identifier", 0, "value"), "1"),
+            (("entry", 0, "resource", "identifier", 1, "value"), "2"),
+            (("entry", 2, "resource", "identifier", 0, "value"), "3"),
+        ]
+    )
+
+
+def test_iter_attribute_for_path_where_and_limit():
+    path = ["entry.*.resource.identifier", {"system": "ins"}, "value"]
+    assert_that(
+        [value for _, value in iter_attribute_for_path(bundle, path)]
+    ).is_equal_to(["1", "3"])
+    assert_that(list(iter_attribute_for_path(bundle, path, first=True))).is_length(1)
+    assert_that(list(iter_attribute_for_path(bundle, path, limit=0))).is_empty()
+
+    concrete_path, _ = next(iter_attribute_for_path(bundle, path))
+    assert_that(attr_for_path(bundle, concrete_path)).is_equal_to("1")
+
+
+def test_iter_attribute_for_path_is_lazy():
+    class Untouchable(dict):
+        def __getitem__(self, item):
+            raise AssertionError("should not be visited")
+
+    source = {"entry": [{"id": "1"}, Untouchable(id="2")]}
+    assert_that(
+        list(iter_attribute_for_path(source, "entry.*.id", first=True))
+    ).is_equal_to([(("entry", 0, "id"), "1")])
+
+
+def test_apply_patch():
+    document = copy.deepcopy(patient_like)
+    result = apply_patch(
+        document,
+        [
+            ("name.0.family", "MARTIN"),
+            ("name.0.given.0", "Jean"),
+            (["identifier", {"system": "ipp"}, "value"], "20"),
+            (["identifier", {"system": "ipp"}, "period.end"], "2022"),
+            ("identifier", Append({"system": "nir", "value": "3"})),
+            ("identifier", Append({"system": "other", "value": "4"})),
+            ("telecom.0.system", "email"),
+            ("telecom.0.value", "marc@example.org"),
+            ("gender", "male"),
+        ],
+    )
+    assert_that(result).is_same_as(document)
+    assert_that(result["identifier"][1]).is_equal_to(
+        {"system": "ipp", "value": "20", "period": {"start": "2020", "end": "2022"}}
+    )
+    assert_that(result["identifier"][2:]).is_equal_to(
+        [{"system": "nir", "value": "3"}, {"system": "other", "value": "4"}]
+    )
+    assert_that(result["telecom"]).is_equal_to(
+        [{"system": "email", "value": "marc@example.org"}]
+    )
+    assert_that(result["gender"]).is_equal_to("male")
+    assert_that(result["name"]).is_equal_to(
+        [{"family": "MARTIN", "given": ["Marc", "Jean"]}]
+    )
+
+
+def test_apply_patch_matches_sequential_set():
+    operations = [
+        ("medication.label.0.ingredient.form", "comprimé"),
+        ("medication.label.0.ingredient.dosage", "125mg"),
+        ("medication.label.1.ingredient.form", "gélule"),
+        ("medication.code", "1"),
+        ("medication.code", "2"),
+    ]
+    expected = {}
+    for path, value in operations:
+        set_attribute_for_path(expected, path, value)
+    assert_that(apply_patch({}, operations)).is_equal_to(expected)
+
+
+def test_apply_patch_where_matches_sequential_set():
+    document = {
+        "identifier": [{"system": "a", "value": 1}, {"system": "b", "value": 2}]
+    }
+    for operations in [
+        [
+            (["identifier", {"system": "a"}, "system"], "b"),
+            (["identifier", {"system": "b"}, "value"], "x"),
+        ],
+        [
+            (["identifier", {"system": "a"}, "value"], "0"),
+            (["identifier", {"system": "b"}, "value"], "x"),
+            (["identifier", {"system": "a"}, "system"], "b"),
+        ],
+        [
+            ("identifier.1.system", "a"),
+            (["identifier", {"system": "a"}, "value"], "x"),
+        ],
+        [
+            (["identifier", {"system": "b"}, "value"], "x"),
+            ("identifier.0.system", "b"),
+            (["identifier", {"system": "b"}, "value"], "y"),
+        ],
+        # two where-filters matching the same element
+        [
+            (["identifier", {"system": "a"}, "period"], {}),
+            (["identifier", {"value": 1}, "value"], "3"),
+            (["identifier", {"system": "a"}, "value"], "4"),
+        ],
+    ]:
+        expected = copy.deepcopy(document)
+        for path, value in operations:
+            set_attribute_for_path(expected, path, value)
+        assert_that(apply_patch(copy.deepcopy(document), operations)).is_equal_to(
+            expected
+        )
+
+
+def test_apply_patch_order_is_kept():
+    assert_that(
+        apply_patch(
+            {"a": {"b": 1}},
+            [("a.c", 2), ("a", Remove()), ("a.d", 3)],
+        )
+    ).is_equal_to({"a": {"d": 3}})
+    assert_that(
+        apply_patch({"a": [1, 2, 3]}, [("a.1", Remove()), ("a.1", Replace(4))])
+    ).is_equal_to({"a": [1, 4]})
+
+
+def test_apply_patch_errors():
+    assert_that(apply_patch).raises(PathError).when_called_with(
+        {}, [("name.0.prefix", Remove())]
+    )
+    assert_that(apply_patch).raises(PathError).when_called_with(
+        copy.deepcopy(patient_like), [(["identifier", {"system": "x"}, "value"], "1")]
+    )
+
+
+def test_apply_json_patch():
+    document = copy.deepcopy(patient_like)
+    apply_patch(
+        document,
+        [
+            {"op": "test", "path": "/identifier/0/value", "value": "1"},
+            {"op": "replace", "path": "/identifier/0/value", "value": "10"},
+            {"op": "add", "path": "/name/0/given/0", "value": "Jean"},
+            {"op": "add", "path": "/name/-", "value": {"family": "MARTIN"}},
+            {"op": "remove", "path": "/identifier/1/period"},
+            {"op": "add", "path": "/a~1b", "value": True},
+        ],
+        json_patch=True,
+    )
+    assert_that(document).is_equal_to(
+        {
+            "identifier": [
+                {"system": "ins", "value": "10"},
+                {"system": "ipp", "value": "2"},
+            ],
+            "name": [
+                {"family": "DUBOIS", "given": ["Jean", "Marc"]},
+                {"family": "MARTIN"},
+            ],
+            "a/b": True,
+        }
+    )
+    assert_that(apply_patch).raises(PathError).when_called_with(
+        document, [{"op": "test", "path": "/a~1b", "value": False}], json_patch=True
+    )
+    for operation in [
+        {"op": "replace", "path": "/a/b", "value": 1},
+        {"op": "replace", "path": "/gender", "value": "male"},
+        {"op": "add", "path": "/a/b", "value": 1},
+        {"op": "add", "path": "/telecom/-", "value": {}},
+    ]:
+        assert_that(apply_patch).raises(PathError).when_called_with(
+            {"name": []}, [operation], json_patch=True
+        )
+
+
+def test_set_attribute_persistent():
+    original = copy.deepcopy(patient_like)
+    snapshot = copy.deepcopy(original)
+    updated = set_attribute_for_path(
+        original,
+        ["identifier", {"system": "ipp"}, "period.end"],
+        "2022",
+        persistent=True,
+    )
+    assert_that(original).is_equal_to(snapshot)
+    assert_that(updated["identifier"][1]["period"]).is_equal_to(
+        {"start": "2020", "end": "2022"}
+    )
+    # untouched subtrees are shared, the modified path is copied
+    assert_that(updated["name"]).is_same_as(original["name"])
+    assert_that(updated["identifier"][0]).is_same_as(original["identifier"][0])
+    assert_that(updated["identifier"]).is_not_same_as(original["identifier"])
+    assert_that(updated["identifier"][1]).is_not_same_as(original["identifier"][1])
+
+
+def test_finder_persistent():
+    original = copy.deepcopy(dol3)
+    snapshot = copy.deepcopy(original)
+    updated = (
+        finder(original, persistent=True)
+        .update("medication.ingredients", where={"extension.url": "2"})
+        .set("extension.value", "8")
+    )
+    assert_that(
+        updated["medication"]["ingredients"][1]["extension"]["value"]
+    ).is_equal_to("8")
+    appended = (
+        finder(updated, persistent=True)
+        .update("medication.ingredients")
+        .append({"extension": {"url": "4", "value": "4"}})
+    )
+    assert_that(appended["medication"]["ingredients"]).is_length(4)
+    assert_that(updated["medication"]["ingredients"]).is_length(3)
+    assert_that(original).is_equal_to(snapshot)
+
+
+def test_finder_persistent_chained_updates():
+    original = copy.deepcopy(dol3)
+    snapshot = copy.deepcopy(original)
+    updater = finder(original, persistent=True).update(
+        "medication.ingredients", where={"extension.url": "2"}
+    )
+    updater.set("extension.value", "8")
+    updated = updater.set("extension.label", "two")
+    assert_that(updated["medication"]["ingredients"][1]["extension"]).is_equal_to(
+        {"url": "2", "value": "8", "label": "two"}
+    )
+    updater = finder(updated, persistent=True).update("medication.ingredients")
+    updater.append({"extension": {"url": "4"}})
+    appended = updater.append({"extension": {"url": "5"}})
+    assert_that(appended["medication"]["ingredients"]).is_length(5)
+    assert_that(updated["medication"]["ingredients"]).is_length(3)
+    assert_that(original).is_equal_to(snapshot)
+
+
+def test_apply_patch_persistent():
+    original = copy.deepcopy(patient_like)
+    snapshot = copy.deepcopy(original)
+    patched = apply_patch(
+        original,
+        [
+            ("name.0.family", "MARTIN"),
+            (["identifier", {"system": "ins"}, "value"], "10"),
+            (["identifier", {"system": "ipp"}], Remove()),
+            ("identifier", Append({"system": "nir"})),
+        ],
+        persistent=True,
+    )
+    assert_that(original).is_equal_to(snapshot)
+    assert_that(patched["identifier"]).is_equal_to(
+        [{"system": "ins", "value": "10"}, {"system": "nir"}]
+    )
+    assert_that(patched["name"][0]["given"]).is_same_as(original["name"][0]["given"])
+
+
+def test_where_index_is_bounded():
+    index = WhereIndex(maxsize=2)
+    documents = [copy.deepcopy(patient_like) for _ in range(3)]
+    for document in documents:
+        attr_for_path(document, ["identifier", {"system": "ins"}], index=index)
+    assert_that(index).is_length(2)
+    # the least recently used table, of the first document, was dropped
+    document = documents[0]
+    document["identifier"][0]["system"] = "nir"
+    assert_that(
+        attr_for_path(
+            document, ["identifier", {"system": "ins"}], default=None, index=index
+        )
+    ).is_none()
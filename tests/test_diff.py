@@ -0,0 +1,111 @@
+import copy
+import datetime
+import json
+
+from assertpy import assert_that
+from fhir.resources.humanname import HumanName
+
+from src.cls_helpers import Patient
+from src.dict_path import apply_patch
+from src.diff import diff
+from tests.resources.patient import patient1
+
+patient = {
+    "resourceType": "Patient",
+    "identifier": [
+        {"system": "urn:ins", "value": "1"},
+        {"system": "urn:ipp", "value": "2"},
+        {"system": "urn:rpps", "value": "3"},
+    ],
+    "name": [{"family": "DUBOIS", "given": ["Marc"]}],
+    "extension": [
+        {"url": "https://example.org/a/b", "valueString": "a"},
+        {"url": "https://example.org/c", "valueString": "c"},
+    ],
+    "gender": "male",
+}
+
+
+def round_trip(a, b):
+    patch = diff(a, b)
+    assert_that(apply_patch(copy.deepcopy(a), patch, json_patch=True)).is_equal_to(b)
+    return patch
+
+
+def test_diff_identical():
+    assert_that(diff(patient, copy.deepcopy(patient))).is_empty()
+
+
+def test_diff_values():
+    other = copy.deepcopy(patient)
+    other["gender"] = "female"
+    other["name"][0]["given"].append("Antoine")
+    other["birthDate"] = "1986-02-05"
+    del other["extension"]
+    assert_that(round_trip(patient, other)).is_equal_to(
+        [
+            {"op": "remove", "path": "/extension"},
+            {"op": "add", "path": "/name/0/given/1", "value": "Antoine"},
+            {"op": "replace", "path": "/gender", "value": "female"},
+            {"op": "add", "path": "/birthDate", "value": "1986-02-05"},
+        ]
+    )
+
+
+def test_diff_keyed_lists():
+    other = copy.deepcopy(patient)
+    del other["identifier"][1]
+    other["identifier"].insert(0, {"system": "urn:nir", "value": "4"})
+    other["identifier"][-1]["use"] = "official"
+    other["extension"][0]["valueString"] = "b"
+    assert_that(round_trip(patient, other)).is_equal_to(
+        [
+            {"op": "remove", "path": "/identifier/1"},
+            {
+                "op": "add",
+                "path": "/identifier/0",
+                "value": {"system": "urn:nir", "value": "4"},
+            },
+            {"op": "add", "path": "/identifier/2/use", "value": "official"},
+            {"op": "replace", "path": "/extension/0/valueString", "value": "b"},
+        ]
+    )
+
+    # reordered elements are replaced at once
+    other = copy.deepcopy(patient)
+    other["extension"].reverse()
+    assert_that(round_trip(patient, other)).is_equal_to(
+        [{"op": "replace", "path": "/extension", "value": other["extension"]}]
+    )
+
+
+def test_diff_models():
+    model = Patient(**patient1)
+    merged = model.merge_with(Patient(resourceType="Patient", gender="female"))
+    assert_that(diff(model, merged)).is_equal_to(
+        [{"op": "replace", "path": "/gender", "value": "female"}]
+    )
+    assert_that(diff(model, model.merge_with(Patient(**patient1)))).is_empty()
+
+
+def test_diff_models_json_values():
+    model = Patient(**patient1)
+    other = model.copy(
+        update={
+            "birthDate": datetime.date(1990, 1, 1),
+            "name": [HumanName(family="MARTIN", period={"start": "2020-01-01"})],
+        }
+    )
+    patch = diff(model, other)
+    assert_that(json.loads(json.dumps(patch))).is_equal_to(patch)
+    assert_that(patch).contains(
+        {"op": "replace", "path": "/birthDate", "value": "1990-01-01"}
+    )
+    patched = apply_patch(json.loads(model.json()), patch, json_patch=True)
+    assert_that(patched).is_equal_to(json.loads(other.json()))
+
+
+def test_diff_booleans_and_numbers():
+    assert_that(
+        round_trip({"a": {"valueBoolean": True}}, {"a": {"valueBoolean": 1}})
+    ).is_equal_to([{"op": "replace", "path": "/a/valueBoolean", "value": 1}])
@@ -0,0 +1,85 @@
+import random
+import uuid
+
+from assertpy import assert_that
+from fhir.resources.codeableconcept import CodeableConcept
+from fhir.resources.coding import Coding
+from fhir.resources.identifier import Identifier
+from fhir.resources.reference import Reference
+from pydantic import ValidationError
+
+from src.enum import TermURL
+from src.factory import (
+    IdGenerator,
+    codeable_concept,
+    codeable_concepts,
+    codings,
+    extensions,
+    identifiers,
+    ref,
+    references,
+)
+
+
+def test_id_generator():
+    ids = IdGenerator(seed=42, batch_size=4)
+    generated = [ids() for _ in range(10)]
+    assert_that(set(generated)).is_length(10)
+    assert_that(generated[:4]).is_equal_to(IdGenerator(seed=42).batch(4))
+    for value in generated:
+        assert_that(uuid.UUID(value).version).is_equal_to(4)
+        assert_that(str(uuid.UUID(value))).is_equal_to(value)
+    assert_that(IdGenerator().urn()).starts_with("urn:uuid:")
+
+
+def test_bulk_builders():
+    built = identifiers(
+        ["1", None], system="http://example.org", ids=IdGenerator(seed=0)
+    )
+    assert_that(built[0]).is_equal_to(
+        Identifier(system="http://example.org", value="1")
+    )
+    assert_that(built[1].value).starts_with("urn:uuid:")
+    assert_that(identifiers(count=3, validate_sample=True)).is_length(3)
+
+    assert_that(references(["Patient/1"], validate_sample=True)).is_equal_to(
+        [ref("Patient/1")]
+    )
+    loinc = codings(["8867-4", "8480-6"], system=TermURL.LOINC, displays=["HR", None])
+    assert_that(loinc[0]).is_equal_to(
+        Coding(system="http://loinc.org", code="8867-4", display="HR")
+    )
+    assert_that(codeable_concepts(loinc, texts=["vitals", None])).is_equal_to(
+        [codeable_concept(loinc[0], text="vitals"), codeable_concept(loinc[1])]
+    )
+    assert_that(codeable_concepts([loinc])[0]).is_instance_of(CodeableConcept)
+    assert_that(extensions(["a"], validate_sample=True)[0].valueString).is_equal_to("a")
+    assert_that(references(["Patient/1"])[0]).is_instance_of(Reference)
+
+
+def test_bulk_validation():
+    invalid = ["Patient/1"] * 99 + [{"not": "a string"}]
+    assert_that(references(invalid)).is_length(100)
+    assert_that(references).raises(ValidationError).when_called_with(
+        invalid, validate_sample=True
+    )
+    assert_that(extensions).raises(ValidationError).when_called_with(
+        ["not an int"], value_type="valueInteger", validate_sample=0.1
+    )
+    # the sample is drawn from the seed, the same for a seed or its Random
+    def outcome(seed):
+        try:
+            references(invalid, validate_sample=0.2, sample_seed=seed)
+        except ValidationError:
+            return "invalid"
+        return "valid"
+
+    outcomes = [outcome(seed) for seed in range(20)]
+    assert_that(set(outcomes)).is_equal_to({"valid", "invalid"})
+    assert_that([outcome(random.Random(seed)) for seed in range(20)]).is_equal_to(
+        outcomes
+    )
+
+
+def test_identifiers_requires_values_or_count():
+    assert_that(identifiers).raises(ValueError).when_called_with()
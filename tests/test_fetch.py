@@ -0,0 +1,73 @@
+import asyncio
+
+from assertpy import assert_that
+from fhirpy import AsyncFHIRClient
+
+from src.cls_helpers import Observation, Patient
+from src.fetch import fetch, fetch_all, from_fhirpy
+from src.views import PatientView
+from tests.fhir_stub import StubFHIRServer
+
+patients = [
+    {"resourceType": "Patient", "id": str(i), "gender": "female"} for i in range(7)
+]
+observations = [
+    {
+        "resourceType": "Observation",
+        "id": str(i),
+        "status": "final",
+        "code": {"text": "heart rate"},
+    }
+    for i in range(5)
+]
+
+
+def test_fetch_follows_next_links():
+    async def run():
+        async with StubFHIRServer(patients + observations, delay=0.01) as server:
+            client = AsyncFHIRClient(server.url, authorization="Bearer test")
+            searches = [
+                client.resources("Patient").limit(3),
+                client.resources("Observation").limit(2),
+            ]
+            resources = await fetch_all(searches, concurrency=2, model=True)
+            return server, resources
+
+    server, resources = asyncio.run(run())
+    assert_that(server.requests).is_length(3 + 3)
+    assert_that(server.max_in_flight).is_less_than_or_equal_to(2)
+    found = [r for r in resources if isinstance(r, Patient)]
+    assert_that([p.id for p in found]).is_equal_to([str(i) for i in range(7)])
+    assert_that([r for r in resources if isinstance(r, Observation)]).is_length(5)
+
+
+def test_fetch_backpressure():
+    async def run():
+        async with StubFHIRServer(patients, page_size=1) as server:
+            client = AsyncFHIRClient(server.url, authorization="Bearer test")
+            pages = fetch([client.resources("Patient")], prefetch=1, view=True)
+            first = await pages.__anext__()
+            await asyncio.sleep(0.1)
+            # the consumed page, one waiting in the queue, one being queued
+            requested = len(server.requests)
+            await pages.aclose()
+
+            resource = await client.resources("Patient").search(_id="3").first()
+            return first, requested, from_fhirpy(resource), from_fhirpy(resource, True)
+
+    first, requested, model, view = asyncio.run(run())
+    assert_that(first).is_instance_of(PatientView)
+    assert_that(requested).is_less_than_or_equal_to(3)
+    assert_that(model).is_instance_of(Patient)
+    assert_that(view.gender).is_equal_to("female")
+
+
+def test_fetch_errors():
+    async def run():
+        async with StubFHIRServer() as server:
+            client = AsyncFHIRClient(
+                f"{server.url}/missing", authorization="Bearer test"
+            )
+            return await fetch_all([client.resources("Patient")])
+
+    assert_that(asyncio.run).raises(Exception).when_called_with(run())
@@ -0,0 +1,76 @@
+import io
+import json
+
+from assertpy import assert_that
+
+from src.dict_path import get_many
+from src.intern import Interner, deep_sizeof
+from src.stream import iter_bundle, iter_ndjson
+from src.views import view_for
+
+observations = [
+    {
+        "resourceType": "Observation",
+        "id": str(i),
+        "status": "final",
+        "code": {"coding": [{"system": "http://loinc.org", "code": "8867-4"}]},
+        "valueQuantity": {"value": 60 + i, "unit": "/min"},
+    }
+    for i in range(3)
+]
+ndjson = "\n".join(json.dumps(o) for o in observations)
+
+
+def test_interner_strings():
+    interner = Interner(max_length=8)
+    a, b = "".join(["fi", "nal"]), "".join(["fin", "al"])
+    assert_that(a).is_not_same_as(b)
+    assert_that(interner.string(a)).is_same_as(interner.string(b))
+    long = "x" * 9
+    assert_that(interner.string(long)).is_same_as(long)
+    assert_that(interner.stats()).is_equal_to({"strings": 1, "objects": 0, "hits": 1})
+
+
+def test_interner_objects():
+    interner = Interner(share_objects=True)
+    a = interner.intern({"system": "http://loinc.org", "code": "8867-4"})
+    b = interner.intern({"system": "http://loinc.org", "code": "8867-4"})
+    assert_that(a).is_same_as(b)
+    # 1 == 1.0 but they are kept apart
+    assert_that(interner.intern({"value": 1.0})["value"]).is_instance_of(float)
+    assert_that(interner.intern({"value": 1})["value"]).is_instance_of(int)
+
+
+def test_interned_loaders():
+    interner = Interner(share_objects=True)
+    loaded = list(iter_ndjson(io.StringIO(ndjson), interner=interner))
+    assert_that(loaded).is_equal_to(observations)
+    assert_that(loaded[0]["status"]).is_same_as(loaded[2]["status"])
+    assert_that(loaded[0]["code"]["coding"][0]).is_same_as(
+        loaded[1]["code"]["coding"][0]
+    )
+    assert_that(deep_sizeof(loaded)).is_less_than(
+        deep_sizeof(list(iter_ndjson(io.StringIO(ndjson))))
+    )
+
+    bundle = json.dumps({"entry": [{"resource": o} for o in observations]})
+    loaded = list(iter_bundle(io.StringIO(bundle), interner=interner))
+    assert_that(loaded).is_equal_to(observations)
+    assert_that(loaded[1]["valueQuantity"]["unit"]).is_same_as(
+        loaded[2]["valueQuantity"]["unit"]
+    )
+
+
+def test_interned_readers():
+    interner = Interner()
+    resources = json.loads(json.dumps(observations))
+    values = [
+        get_many(r, {"unit": "valueQuantity.unit"}, interner=interner)
+        for r in resources
+    ]
+    assert_that(values[0]["unit"]).is_same_as(values[1]["unit"])
+
+    views = [view_for(r, interner=interner) for r in resources]
+    assert_that(views[0].get_code().system).is_same_as(views[2].get_code().system)
+    # the source dicts are left untouched
+    assert_that(views[0].dict()).is_not_same_as(resources[0])
@@ -0,0 +1,162 @@
+from assertpy import assert_that
+
+from src.cls_helpers import Patient
+from src.merger import merge, merge_all, merge_batches, merge_lists
+
+patient_a = {
+    "resourceType": "Patient",
+    "identifier": [
+        {"system": "urn:ins", "value": "1"},
+        {"system": "urn:ipp", "value": "2", "use": "usual"},
+    ],
+    "telecom": [{"system": "email", "value": "marc@example.org"}],
+    "name": [{"family": "DUBOIS", "given": ["Marc"]}],
+    "extension": [{"url": "https://example.org/a", "valueString": "a"}],
+}
+patient_b = {
+    "resourceType": "Patient",
+    "identifier": [
+        {"system": "urn:rpps", "value": "3"},
+        {
+            "system": "urn:ipp",
+            "value": "2",
+            "use": "official",
+            "assigner": {"display": "CHU"},
+        },
+    ],
+    "telecom": [
+        {"system": "phone", "value": "0600000000"},
+        {"system": "email", "value": "marc@example.org", "use": "home"},
+    ],
+    "name": [{"family": "DUBOIS", "given": ["Marc"]}, {"family": "MARTIN"}],
+    "extension": [{"url": "https://example.org/a", "valueString": "b"}],
+}
+fields = {"identifier", "telecom", "name", "extension"}
+
+
+def test_merge_lists():
+    assert_that(merge_lists([3, 1], [1, 2, 3])).is_equal_to([3, 1, 2])
+    assert_that(merge_lists(None, [{"a": 1}, {"a": 1}])).is_equal_to([{"a": 1}])
+    assert_that(
+        merge_lists(
+            [{"k": 1, "v": "a"}, {"v": "no key"}],
+            [{"k": 2}, {"k": 1, "v": "b"}, {"v": "no key"}],
+            ("k",),
+        )
+    ).is_equal_to([{"k": 1, "v": "b"}, {"v": "no key"}, {"k": 2}, {"v": "no key"}])
+
+
+def test_merge_keyed_lists():
+    merged = merge(patient_a, patient_b, fields_to_be_merged=fields)
+    assert_that(merged["identifier"]).is_equal_to(
+        [
+            {"system": "urn:ins", "value": "1"},
+            {
+                "system": "urn:ipp",
+                "value": "2",
+                "use": "official",
+                "assigner": {"display": "CHU"},
+            },
+            {"system": "urn:rpps", "value": "3"},
+        ]
+    )
+    assert_that(merged["telecom"]).is_equal_to(
+        [
+            {"system": "email", "value": "marc@example.org", "use": "home"},
+            {"system": "phone", "value": "0600000000"},
+        ]
+    )
+    assert_that(merged["name"]).is_equal_to(
+        [{"family": "DUBOIS", "given": ["Marc"]}, {"family": "MARTIN"}]
+    )
+    assert_that(merged["extension"]).is_equal_to(
+        [{"url": "https://example.org/a", "valueString": "b"}]
+    )
+
+
+def test_merge_keys_only_in_second():
+    assert_that(merge({"a": {}}, {"a": {"b": 1}})).is_equal_to({"a": {"b": 1}})
+    assert_that(merge({}, {"a": 1})).is_equal_to({"a": 1})
+    identifiers = [{"system": "urn:ipp", "value": "2"}] * 2
+    for first in ({}, {"id": "1"}):
+        second = {"identifier": identifiers}
+        merged = merge(first, second, fields_to_be_merged=fields)
+        assert_that(merged["identifier"]).is_equal_to(identifiers[:1])
+        assert_that(merged).is_equal_to(
+            merge_all([first, second], fields_to_be_merged=fields)
+        )
+
+
+def test_merge_with_keyed_lists():
+    patient = Patient(**patient_a)
+    merged = patient.merge_with(Patient(**patient_b), fields_to_be_merged=fields)
+    assert_that([i.value for i in merged.identifier]).is_equal_to(["1", "2", "3"])
+    assert_that(merged.identifier[0]).is_same_as(patient.identifier[0])
+    assert_that(merged.identifier[1].use).is_equal_to("official")
+    assert_that(merged.identifier[1].assigner.display).is_equal_to("CHU")
+    assert_that(merged.name).is_length(2)
+    assert_that([t.value for t in merged.telecom]).is_equal_to(
+        ["marc@example.org", "0600000000"]
+    )
+    assert_that(merged.extension[0].valueString).is_equal_to("b")
+
+
+def test_merge_with_falsy_values():
+    merged = Patient(active=True).merge_with(
+        Patient(active=False, multipleBirthInteger=0)
+    )
+    assert_that(merged.active).is_true()
+    assert_that(merged.multipleBirthInteger).is_equal_to(0)
+    merged = Patient().merge_with(Patient(active=False, multipleBirthInteger=0))
+    assert_that(merged.active).is_false()
+    assert_that(merged.multipleBirthInteger).is_equal_to(0)
+
+
+versions = [
+    {"id": "1", "gender": "male", "name": [{"family": "DUBOIS"}], "active": True},
+    {"id": "1", "gender": None, "birthDate": "1986-02-05"},
+    {
+        "id": "1",
+        "gender": "female",
+        "identifier": [{"system": "urn:ins", "value": "1"}],
+    },
+]
+
+
+def test_merge_all():
+    merged = merge_all(versions)
+    assert_that(merged).is_equal_to(
+        {
+            "id": "1",
+            "gender": "female",
+            "name": [{"family": "DUBOIS"}],
+            "active": True,
+            "birthDate": "1986-02-05",
+            "identifier": [{"system": "urn:ins", "value": "1"}],
+        }
+    )
+    # the first version has the highest priority
+    merged = merge_all(versions, priority=[2, 1, 0])
+    assert_that(merged["gender"]).is_equal_to("male")
+    merged = merge_all(versions, priority=lambda v: "birthDate" in v)
+    assert_that(merged["gender"]).is_equal_to("female")
+    assert_that(merge_all).raises(ValueError).when_called_with([])
+
+
+def test_merge_all_models():
+    merged = merge_all(
+        [Patient(**patient_a), Patient(**patient_b), Patient(**patient_a)],
+        fields_to_be_merged=fields,
+    )
+    assert_that(merged).is_instance_of(Patient)
+    assert_that([i.value for i in merged.identifier]).is_equal_to(["1", "2", "3"])
+    assert_that(merged.identifier[1].use).is_equal_to("usual")
+    assert_that(merged.identifier[1].assigner.display).is_equal_to("CHU")
+    assert_that(merged.extension[0].valueString).is_equal_to("a")
+
+
+def test_merge_batches():
+    groups = [versions, versions[:1], versions[1:]]
+    expected = [merge_all(group) for group in groups]
+    assert_that(list(merge_batches(groups, chunk_size=2))).is_equal_to(expected)
+    assert_that(list(merge_batches(iter(groups), processes=2))).is_equal_to(expected)
@@ -0,0 +1,88 @@
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from assertpy.assertpy import assert_that
+from fhir.resources.patient import Patient as FHIRPatient
+
+from src.cls_helpers import get_email, get_identifier, get_name, mixin_with
+from src.mixins import REGISTRY, MixinRegistry
+from tests.resources.patient import patient1
+
+
+def _summary(patient) -> tuple:
+    return type(patient).__name__, patient.get_email(), patient.get_name().family
+
+
+def test_mixin_names_are_deterministic():
+    mixin = mixin_with(get_email, get_name)
+    assert_that(mixin).is_same_as(mixin_with(get_email, get_name))
+    assert_that(mixin.__name__).is_equal_to(
+        MixinRegistry().mixin(get_email, get_name).__name__
+    )
+    assert_that(mixin.get_email).is_same_as(get_email)
+    assert_that(pickle.loads(pickle.dumps(mixin))).is_same_as(mixin)
+
+    closure = mixin_with(lambda obj: obj)
+    assert_that(closure).is_not_same_as(mixin_with(lambda obj: obj))
+
+
+def test_compose_pickles():
+    cls = REGISTRY.compose(FHIRPatient, get_email, get_name, get_identifier)
+    assert_that(cls).is_same_as(
+        REGISTRY.compose(FHIRPatient, get_email, get_name, get_identifier)
+    )
+    assert_that(pickle.loads(pickle.dumps(cls))).is_same_as(cls)
+
+    patient = cls(**patient1)
+    copy = pickle.loads(pickle.dumps(patient))
+    assert_that(copy).is_instance_of(cls)
+    assert_that(copy).is_equal_to(patient)
+    assert_that(REGISTRY.compose).raises(TypeError).when_called_with(
+        FHIRPatient, lambda obj: obj
+    )
+
+    class Local(cls):
+        ...
+
+    # classes declared outside the registry keep the usual pickle rules
+    assert_that(pickle.dumps).raises(Exception).when_called_with(Local)
+
+
+def test_compose_process_pool():
+    cls = REGISTRY.compose(FHIRPatient, get_email, get_name)
+    patients = [cls(**patient1) for _ in range(3)]
+    # spawned workers start from scratch and rebuild the class
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(2, mp_context=context) as executor:
+        summaries = list(executor.map(_summary, patients))
+    assert_that(summaries).is_equal_to(
+        [(cls.__name__, "cramm@hotmaill.fr", "DUBOIS")] * 3
+    )
+
+
+def _mixin_summary(obj) -> tuple:
+    return type(obj).__name__, obj.get_email.__name__
+
+
+def test_mixin_process_pool():
+    cls = mixin_with(get_email, get_name)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        # the class and its instances are rebuilt from their name
+        assert_that(executor.submit(_mixin_summary, cls()).result()).is_equal_to(
+            (cls.__name__, "get_email")
+        )
+        assert_that(executor.submit(pickle.dumps, cls).result()).is_equal_to(
+            pickle.dumps(cls)
+        )
+
+
+def test_registry_is_bounded():
+    registry = MixinRegistry(maxsize=2)
+    first = registry.mixin(get_email)
+    registry.mixin(get_name)
+    registry.mixin(get_identifier)
+    assert_that(len(registry)).is_equal_to(2)
+    assert_that(first.__name__ in registry).is_false()
+    assert_that(registry.mixin(get_email).__name__).is_equal_to(first.__name__)
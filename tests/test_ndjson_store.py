@@ -0,0 +1,83 @@
+import json
+import os
+
+from assertpy import assert_that
+
+from src.cls_helpers import Patient
+from src.ndjson_store import NDJSONStore
+from tests.resources.patient import patient1
+
+resources = [
+    {"resourceType": "Patient", "id": "1", **patient1},
+    {"name": "Hôpital", "id": "1", "resourceType": "Organization"},
+    {"resourceType": "Patient", "id": "2", "gender": "female"},
+    {"resourceType": "Observation", "id": "1", "status": "final"},
+]
+
+
+def write_ndjson(path, items):
+    path.write_text(
+        "\n".join(json.dumps(r, ensure_ascii=False) for r in items) + "\n",
+        encoding="utf-8",
+    )
+
+
+def test_store_lookup(tmp_path):
+    path = tmp_path / "export.ndjson"
+    write_ndjson(path, resources)
+    with NDJSONStore(path) as store:
+        assert_that(store).is_length(4)
+        assert_that(store.get("Organization", "1")).is_equal_to(resources[1])
+        assert_that(store.get("Patient", "2")).is_equal_to(resources[2])
+        assert_that(store.get("Patient", "3")).is_none()
+        assert_that(("Patient", "1") in store).is_true()
+        assert_that(list(store.keys("Patient"))).is_equal_to(
+            [("Patient", "1"), ("Patient", "2")]
+        )
+        patient = store.load("Patient", "1")
+        assert_that(patient).is_instance_of(Patient)
+        assert_that(patient.get_email()).is_equal_to("cramm@hotmaill.fr")
+
+
+def test_store_get_many(tmp_path):
+    path = tmp_path / "export.ndjson"
+    write_ndjson(path, resources)
+    with NDJSONStore(path) as store:
+        found = list(
+            store.get_many(
+                [
+                    ("Observation", "1"),
+                    ("Patient", "9"),
+                    ("Patient", "2"),
+                    ("Patient", "2"),
+                ]
+            )
+        )
+    assert_that(found).is_equal_to(
+        [(("Patient", "2"), resources[2]), (("Observation", "1"), resources[3])]
+    )
+
+
+def test_store_index_is_persisted(tmp_path):
+    path = tmp_path / "export.ndjson"
+    write_ndjson(path, resources)
+    NDJSONStore(path).close()
+    assert_that(os.path.exists(f"{path}.idx")).is_true()
+
+    with NDJSONStore(path) as store:
+        assert_that(store.index.meta["size"]).is_equal_to(os.path.getsize(path))
+        assert_that(store.get("Patient", "2")).is_equal_to(resources[2])
+
+    # the file changed, the index is rebuilt
+    write_ndjson(path, resources[:2])
+    with NDJSONStore(path) as store:
+        assert_that(store).is_length(2)
+        assert_that(store.get("Patient", "2")).is_none()
+
+
+def test_store_empty_file(tmp_path):
+    path = tmp_path / "empty.ndjson"
+    path.write_text("")
+    with NDJSONStore(path, index_path=tmp_path / "empty.idx") as store:
+        assert_that(store).is_length(0)
+        assert_that(store.get("Patient", "1")).is_none()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+from assertpy import assert_that
+from fhirpy import AsyncFHIRClient
+
+from src.cls_helpers import Patient
+from src.factory import ref
+from src.ndjson_store import NDJSONStore
+from src.references import (
+    FhirpyFetcher,
+    ReferenceResolver,
+    StoreFetcher,
+    TTLCache,
+)
+from tests.fhir_stub import StubFHIRServer
+
+organizations = [
+    {"resourceType": "Organization", "id": str(i), "name": f"Hôpital {i}"}
+    for i in range(3)
+]
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache():
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert_that(cache.get("a")).is_equal_to(1)
+    cache.set("c", 3)
+    assert_that(cache.get("b")).is_none()
+    clock.now = 11
+    assert_that(cache.get("a", "expired")).is_equal_to("expired")
+    assert_that(len(cache)).is_equal_to(1)
+
+
+def test_resolve_local_and_store(tmp_path):
+    path = tmp_path / "organizations.ndjson"
+    path.write_text("\n".join(json.dumps(o) for o in organizations) + "\n")
+    clock = Clock()
+    patient = Patient(
+        id="p",
+        contained=[{"resourceType": "Practitioner", "id": "dr"}],
+        managingOrganization=ref("Organization/1"),
+    )
+    bundle = {
+        "resourceType": "Bundle",
+        "type": "transaction",
+        "entry": [
+            {"fullUrl": "urn:uuid:1234", "resource": {"resourceType": "Patient"}},
+            {"resource": {"resourceType": "Organization", "id": "9"}},
+        ],
+    }
+    with NDJSONStore(path) as store:
+        resolver = ReferenceResolver(StoreFetcher(store), ttl=60, clock=clock)
+        resolver.index_bundle(bundle)
+        resolved = resolver.resolve_many(
+            [
+                patient.managingOrganization,
+                "#dr",
+                "urn:uuid:1234",
+                "http://example.org/fhir/Organization/9/_history/2",
+                {"reference": "Organization/1"},
+                "Organization/2",
+                "Organization/404",
+                "urn:uuid:unknown",
+                None,
+            ],
+            context=patient,
+        )
+        assert_that(resolved[0]).is_equal_to(organizations[1])
+        assert_that(resolved[1].id).is_equal_to("dr")
+        assert_that(resolved[2]).is_same_as(bundle["entry"][0]["resource"])
+        assert_that(resolved[3]["id"]).is_equal_to("9")
+        assert_that(resolved[4]).is_same_as(resolved[0])
+        assert_that(resolved[5:]).is_equal_to([organizations[2], None, None, None])
+        # Organization/1, /2 and /404 fetched once each
+        assert_that(resolver.fetched).is_equal_to(3)
+
+        resolver.resolve("Organization/404")
+        assert_that(resolver.fetched).is_equal_to(3)
+        clock.now = 61
+        assert_that(resolver.resolve("Organization/1")).is_equal_to(organizations[1])
+        assert_that(resolver.fetched).is_equal_to(4)
+        assert_that(
+            resolver.resolve("#dr", context={"contained": [{"id": "dr"}]})
+        ).is_equal_to({"id": "dr"})
+
+
+def test_resolve_fhirpy():
+    async def run():
+        async with StubFHIRServer(organizations) as server:
+            client = AsyncFHIRClient(server.url, authorization="Bearer test")
+            resolver = ReferenceResolver(FhirpyFetcher(client))
+            resolved = await resolver.aresolve_many(
+                ["Organization/0", "Organization/0", "Organization/404"]
+            )
+            assert_that(resolver.resolve_many).raises(TypeError).when_called_with(
+                ["Organization/1"]
+            )
+            return server, resolved
+
+    server, resolved = asyncio.run(run())
+    # the sync call fails before sending anything
+    assert_that(server.requests).is_equal_to(["/Organization/0", "/Organization/404"])
+    assert_that(resolved[0]["name"]).is_equal_to("Hôpital 0")
+    assert_that(resolved[1]).is_same_as(resolved[0])
+    assert_that(resolved[2]).is_none()
+
+
+def test_resolve_many_with_future_fetcher():
+    class FutureFetcher:
+        def fetch_many(self, keys):
+            return asyncio.get_running_loop().create_future()
+
+    async def run():
+        resolver = ReferenceResolver(FutureFetcher())
+        assert_that(resolver.resolve_many).raises(TypeError).when_called_with(
+            ["Organization/1"]
+        )
+
+    asyncio.run(run())
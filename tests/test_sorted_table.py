@@ -0,0 +1,24 @@
+import random
+
+from assertpy import assert_that
+
+from src.sorted_table import SortedTable
+
+
+def test_build_in_runs(tmp_path):
+    rng = random.Random(1)
+    rows = [(f"Patient/{rng.randrange(200)}".encode(), (i, -i)) for i in range(1000)]
+    expected = dict(rows)
+    for run_size in (7, 1000):
+        table = SortedTable.build(iter(rows), ("offset", "length"), run_size=run_size)
+        assert_that(list(table.keys())).is_equal_to(sorted(expected))
+        assert_that([table.row(p) for p in range(len(table))]).is_equal_to(
+            [tuple(expected[key]) for key in sorted(expected)]
+        )
+    table.save(tmp_path / "table")
+    loaded = SortedTable.load(tmp_path / "table")
+    assert_that(loaded.row(loaded.find(b"Patient/42"))).is_equal_to(
+        tuple(expected[b"Patient/42"])
+    )
+    loaded.close()
+    assert_that(SortedTable.build([], ("offset",))).is_length(0)
@@ -0,0 +1,115 @@
+import gzip
+import io
+import json
+
+from assertpy import assert_that
+
+from src.cls_helpers import Patient
+from src.stream import StreamError, iter_bundle, iter_ndjson
+from tests.resources.patient import patient1
+
+resources = [
+    {**patient1, "id": "1"},
+    {"resourceType": "Organization", "id": "1", "name": "Hôpital"},
+    {**patient1, "id": "2", "gender": "female"},
+]
+
+bundle = {
+    "resourceType": "Bundle",
+    "type": "searchset",
+    "total": 12345,
+    "entry": [
+        {"fullUrl": f"urn:uuid:{i}", "resource": r} for i, r in enumerate(resources)
+    ],
+    "link": [{"relation": "self", "url": "http://localhost/Patient"}],
+}
+
+
+def test_iter_ndjson(tmp_path):
+    path = tmp_path / "export.ndjson"
+    path.write_text("\n".join(json.dumps(r) for r in resources) + "\n\n")
+    assert_that(list(iter_ndjson(path))).is_equal_to(resources)
+    assert_that(
+        [r["id"] for r in iter_ndjson(str(path), resource_type="Patient")]
+    ).is_equal_to(["1", "2"])
+    assert_that(
+        list(iter_ndjson(path, resource_type="Patient", where={"gender": "female"}))
+    ).is_equal_to([resources[2]])
+
+
+def test_iter_ndjson_gzip_and_models(tmp_path):
+    path = tmp_path / "export.ndjson.gz"
+    with gzip.open(path, "wt") as fp:
+        fp.write("\n".join(json.dumps(r) for r in resources))
+    patients = list(iter_ndjson(path, resource_type="Patient", model=True))
+    assert_that(patients).is_length(2)
+    assert_that(patients[0]).is_instance_of(Patient)
+    assert_that(patients[0].get_email()).is_equal_to("cramm@hotmaill.fr")
+
+
+def test_iter_ndjson_max_line_size():
+    source = io.StringIO(json.dumps(resources[0]))
+    assert_that(list).raises(StreamError).when_called_with(
+        iter_ndjson(source, max_line_size=10)
+    )
+    line = json.dumps(resources[1])
+    source = io.StringIO(f"{line}\n{line}")
+    assert_that(list(iter_ndjson(source, max_line_size=len(line) + 1))).is_length(2)
+
+    class Reader(io.StringIO):
+        read_sizes = []
+
+        def readline(self, size=-1):
+            self.read_sizes.append(size)
+            return super().readline(size)
+
+    source = Reader(f"{line}\n{line * 1000}\n")
+    assert_that(list).raises(StreamError).when_called_with(
+        iter_ndjson(source, max_line_size=len(line) + 1)
+    )
+    assert_that(set(Reader.read_sizes)).is_equal_to({len(line) + 2})
+
+
+def test_readers_leave_binary_file_objects_open():
+    source = io.BytesIO("\n".join(json.dumps(r) for r in resources).encode())
+    assert_that(list(iter_ndjson(source))).is_length(3)
+    assert_that(source.closed).is_false()
+    source.seek(0)
+    next(iter_ndjson(source))
+    assert_that(source.closed).is_false()
+    source = io.BytesIO(json.dumps(bundle).encode())
+    assert_that(list(iter_bundle(source))).is_length(3)
+    assert_that(source.closed).is_false()
+
+
+def test_iter_bundle_small_chunks():
+    document = json.dumps(bundle, indent=2)
+    for chunk_size in (1, 7, 64, 1 << 16):
+        assert_that(
+            list(iter_bundle(io.StringIO(document), chunk_size=chunk_size))
+        ).is_equal_to(resources)
+
+
+def test_iter_bundle_filters(tmp_path):
+    path = tmp_path / "bundle.json"
+    path.write_bytes(json.dumps(bundle).encode())
+    assert_that(
+        [e["fullUrl"] for e in iter_bundle(path, resource_type="Patient", entries=True)]
+    ).is_equal_to(["urn:uuid:0", "urn:uuid:2"])
+    assert_that(
+        list(iter_bundle(path, where=lambda r: r.get("name") == "Hôpital"))
+    ).is_equal_to([resources[1]])
+    with open(path, "rb") as fp:
+        assert_that(list(iter_bundle(fp, resource_type="Organization"))).is_length(1)
+
+
+def test_iter_bundle_errors():
+    truncated = json.dumps(bundle)[:-40]
+    assert_that(list).raises(StreamError).when_called_with(
+        iter_bundle(io.StringIO(truncated), chunk_size=16)
+    )
+    assert_that(list).raises(StreamError).when_called_with(
+        iter_bundle(io.StringIO(json.dumps(bundle)), max_entry_size=50, chunk_size=16)
+    )
+    assert_that(list(iter_bundle(io.StringIO("{}")))).is_empty()
+    assert_that(list(iter_bundle(io.StringIO('{"entry": []}')))).is_empty()
@@ -0,0 +1,141 @@
+import json
+
+from assertpy import assert_that
+from fhir.resources.coding import Coding
+
+from src.cls_helpers import Observation
+from src.enum import TermURL
+from src.factory import coding
+from src.terminology import TerminologyStore
+
+VITAL_SIGNS = "http://example.org/ValueSet/vital-signs"
+
+code_system = {
+    "resourceType": "CodeSystem",
+    "url": TermURL.SYNAPSE.value,
+    "status": "active",
+    "content": "complete",
+    "concept": [
+        {
+            "code": "drug",
+            "display": "Drug",
+            "concept": [{"code": "drug-otc", "display": "Over the counter drug"}],
+        },
+        {"code": "no-display"},
+    ],
+}
+
+value_set = {
+    "resourceType": "ValueSet",
+    "url": VITAL_SIGNS,
+    "status": "active",
+    "expansion": {
+        "timestamp": "2022-01-01",
+        "contains": [
+            {"system": "http://loinc.org", "code": "8867-4", "display": "Heart rate"},
+            {
+                "system": "http://loinc.org",
+                "code": "85354-9",
+                "display": "Blood pressure panel",
+                "contains": [
+                    {
+                        "system": "http://loinc.org",
+                        "code": "8480-6",
+                        "display": "Systolic blood pressure",
+                    }
+                ],
+            },
+        ],
+    },
+}
+
+snomed = {
+    "resourceType": "ValueSet",
+    "url": "http://example.org/ValueSet/findings",
+    "status": "active",
+    "compose": {
+        "include": [
+            {
+                "system": TermURL.SNOMED_CT.value,
+                "concept": [{"code": "364075005", "display": "Heart rate"}],
+            }
+        ]
+    },
+}
+
+
+def test_store_lookup(tmp_path):
+    ndjson = tmp_path / "valuesets.ndjson"
+    ndjson.write_text(f"{json.dumps(value_set)}\n{json.dumps(snomed)}\n")
+    bundle = tmp_path / "codesystems.json"
+    bundle.write_text(
+        json.dumps({"resourceType": "Bundle", "entry": [{"resource": code_system}]})
+    )
+    path = tmp_path / "terminology.tbl"
+    TerminologyStore.build([bundle, ndjson], path)
+
+    with TerminologyStore.load(path) as store:
+        assert_that(store.valuesets).is_equal_to(
+            ["http://example.org/ValueSet/findings", VITAL_SIGNS]
+        )
+        assert_that((TermURL.SYNAPSE, "drug-otc") in store).is_true()
+        assert_that((TermURL.SYNAPSE, "unknown") in store).is_false()
+        assert_that(store.display(TermURL.LOINC, "8480-6")).is_equal_to(
+            "Systolic blood pressure"
+        )
+        assert_that(store.display(TermURL.SYNAPSE, "no-display")).is_none()
+        assert_that(list(store.codes(TermURL.SYNAPSE))).is_equal_to(
+            ["drug", "drug-otc", "no-display"]
+        )
+        assert_that(store.in_valueset(VITAL_SIGNS, TermURL.LOINC, "8867-4")).is_true()
+        assert_that(
+            store.in_valueset(VITAL_SIGNS, TermURL.SNOMED_CT, "364075005")
+        ).is_false()
+        assert_that(
+            store.validate(
+                [
+                    ("http://loinc.org", "8867-4"),
+                    {"system": "http://loinc.org", "code": "0000-0"},
+                    Coding(system="http://snomed.info/sct", code="364075005"),
+                    {"code": "8867-4"},
+                    ("http://loinc.org", "8867-4"),
+                ],
+                valueset=VITAL_SIGNS,
+            )
+        ).is_equal_to([True, False, False, False, True])
+        assert_that(
+            store.matches({"coding": [{"system": TermURL.SYNAPSE, "code": "drug"}]})
+        ).is_true()
+
+    with open(path, "wb") as fp:
+        fp.write(b"garbage")
+    assert_that(TerminologyStore.load).raises(ValueError).when_called_with(path)
+
+
+def test_store_helpers():
+    store = TerminologyStore.build([code_system, value_set])
+    assert_that(coding(TermURL.LOINC, "8867-4", store=store).display).is_equal_to(
+        "Heart rate"
+    )
+    assert_that(coding(TermURL.LOINC, "8867-4", display="HR").display).is_equal_to("HR")
+    assert_that(coding).raises(ValueError).when_called_with(
+        TermURL.LOINC, "0000-0", store=store
+    )
+
+    observation = Observation(
+        status="final",
+        code={"coding": [{"system": TermURL.LOINC.value, "code": "29463-7"}]},
+        contained=[
+            {
+                "resourceType": "Observation",
+                "id": code,
+                "status": "final",
+                "code": {"coding": [{"system": TermURL.LOINC.value, "code": code}]},
+            }
+            for code in ("29463-7", "8480-6", "8867-4")
+        ],
+    )
+    found = observation.find_contained_resource_in_valueset(
+        lambda r: r.code, store, VITAL_SIGNS
+    )
+    assert_that(found.id).is_equal_to("8480-6")
@@ -0,0 +1,93 @@
+from assertpy import assert_that
+from fhir.resources.humanname import HumanName
+
+from src.cls_helpers import Observation, Patient
+from src.views import ElementView, ObservationView, PatientView, view_for
+from tests.resources.patient import patient1
+
+patient = {
+    **patient1,
+    "identifier": [
+        *patient1["identifier"],
+        {"system": "urn:oid:1.2.250.1.213.1.4.8", "value": "1860275123456"},
+    ],
+    "name": [
+        {"use": "official", "family": "DUBOIS", "given": ["Marc"]},
+        {"use": "maiden", "family": "MARTIN", "given": ["Marc"]},
+    ],
+    "telecom": [
+        {"system": "phone", "use": "home", "value": "0100000000"},
+        {"system": "phone", "use": "mobile", "value": "0600000000"},
+        {"system": "email", "value": "cramm@hotmaill.fr"},
+    ],
+    "address": [{"line": ["1 rue de la Paix"], "city": "Paris", "postalCode": "75002"}],
+    "extension": [{"url": "https://example.org/a", "valueString": "a"}],
+}
+
+
+def test_patient_view_getters():
+    view, model = PatientView(patient), Patient(**patient)
+    for getter in (
+        "get_identifier",
+        "get_email",
+        "get_phone",
+        "get_mobile",
+        "get_formatted_address",
+    ):
+        assert_that(getattr(view, getter)()).is_equal_to(getattr(model, getter)())
+    system = "urn:oid:1.2.250.1.213.1.4.8"
+    assert_that(view.get_identifier(system=system)).is_equal_to("1860275123456")
+    assert_that(view.get_identifier(index=5)).is_none()
+    assert_that(
+        view.get_identifier_by_type("http://interopsante.org/CodeSystem/v2-0203", "PI")
+    ).is_equal_to(
+        model.get_identifier_by_type("http://interopsante.org/CodeSystem/v2-0203", "PI")
+    )
+    assert_that(view.get_maiden_name().family).is_equal_to("MARTIN")
+    assert_that(view.get_usual_name()).is_none()
+    assert_that(
+        view.get_extension(url="https://example.org/a").valueString
+    ).is_equal_to("a")
+    assert_that(view.get_address().line).is_equal_to(["1 rue de la Paix"])
+
+
+def test_view_attributes_and_validation():
+    view = view_for(patient)
+    assert_that(view).is_instance_of(PatientView)
+    assert_that(view.gender).is_equal_to("male")
+    assert_that(view.birthDate).is_equal_to("1986-02-05")
+    assert_that(view.deceasedBoolean).is_none()
+    assert_that(view.managingOrganization.reference).is_equal_to("Organization/1")
+    assert_that(view.name[0]).is_instance_of(ElementView)
+    assert_that(view.get("name.0.given.0")).is_equal_to("Marc")
+
+    name = view.get_official_name().to_model()
+    assert_that(name).is_instance_of(HumanName)
+    assert_that(name.given).is_equal_to(["Marc"])
+    model = view.to_model()
+    assert_that(model).is_instance_of(Patient)
+    assert_that(model.get_mobile()).is_equal_to("0600000000")
+
+
+def test_observation_view():
+    observation = {
+        "resourceType": "Observation",
+        "status": "final",
+        "code": {"coding": [{"system": "http://loinc.org", "code": "8867-4"}]},
+        "contained": [
+            {
+                "resourceType": "Observation",
+                "status": "final",
+                "code": {"coding": [{"system": "http://loinc.org", "code": "8310-5"}]},
+            }
+        ],
+    }
+    view = view_for(observation)
+    assert_that(view).is_instance_of(ObservationView)
+    assert_that(view.get_code().code).is_equal_to("8867-4")
+    assert_that(view.get_code(1)).is_none()
+    contained = view.find_contained_resource_with_matching_concept(
+        lambda r: r.code, {"http://loinc.org": "8310-5"}
+    )
+    assert_that(contained.get_code().code).is_equal_to("8310-5")
+    assert_that(view.to_model()).is_instance_of(Observation)
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from assertpy import assert_that
+from fhirpy import AsyncFHIRClient
+from fhirpy.base.exceptions import OperationOutcome
+
+from src.cls_helpers import Patient
+from src.factory import IdGenerator
+from src.writer import BundleWriter, SessionClient
+from tests.fhir_stub import StubFHIRServer
+
+
+def _observation(subject) -> dict:
+    return {
+        "resourceType": "Observation",
+        "status": "final",
+        "code": {"text": "heart rate"},
+        "subject": subject.dict(),
+    }
+
+
+def test_transaction_writer():
+    async def run():
+        async with StubFHIRServer() as server, SessionClient(server.url) as client:
+            async with BundleWriter(
+                client, max_entries=2, ids=IdGenerator(seed=0)
+            ) as writer:
+                entries = []
+                for index in range(3):
+                    async with writer.group():
+                        patient = await writer.create(Patient(gender="female"))
+                        observation = await writer.create(
+                            _observation(patient.reference)
+                        )
+                    entries += [patient, observation]
+                entries.append(await writer.update(Patient(id="7", gender="male")))
+            results = [await entry for entry in entries]
+            return server, entries, results
+
+    server, entries, results = asyncio.run(run())
+    assert_that(server.requests).is_equal_to(["/"] * 4)
+    assert_that(entries[0].full_url).starts_with("urn:uuid:")
+    subject = json.loads(entries[1].body)["resource"]["subject"]
+    assert_that(subject["reference"]).is_equal_to(entries[0].full_url)
+    assert_that(entries[-1].reference.reference).is_equal_to("Patient/7")
+    assert_that([r["response"]["status"] for r in results]).is_equal_to(
+        ["201 Created"] * 6 + ["200 OK"]
+    )
+    assert_that(server.resources["Patient"]).contains_key("7")
+    assert_that(server.resources["Observation"]).is_length(3)
+
+
+def test_batch_writer_flushes():
+    async def run():
+        async with StubFHIRServer() as server:
+            client = AsyncFHIRClient(server.url, authorization="Bearer test")
+            async with BundleWriter(
+                client, bundle_type="batch", max_bytes=100, max_delay=0.05
+            ) as writer:
+                rejected = await writer.create(
+                    {"resourceType": "Patient", "meta": {"tag": [{"code": "reject"}]}}
+                )
+                first = await writer.create({"resourceType": "Patient"})
+                # the first two entries exceed max_bytes, the third is sent
+                # after max_delay, before the writer is closed
+                timed = await writer.create({"resourceType": "Patient"})
+                results = await asyncio.wait_for(
+                    asyncio.gather(rejected, first, timed), timeout=10
+                )
+                sent = len(server.requests)
+            return sent, *results
+
+    sent, rejected, first, timed = asyncio.run(run())
+    assert_that(sent).is_equal_to(3)
+    assert_that(rejected["response"]["status"]).is_equal_to("400 Bad Request")
+    assert_that(first["response"]["status"]).is_equal_to("201 Created")
+    assert_that(timed["response"]["location"]).starts_with("Patient/")
+
+
+def test_failed_transaction():
+    async def run():
+        async with StubFHIRServer() as server:
+            async with SessionClient(f"{server.url}/missing") as client:
+                async with BundleWriter(client) as writer:
+                    entry = await writer.create({"resourceType": "Patient"})
+                await entry
+
+    assert_that(asyncio.run).raises(OperationOutcome).when_called_with(run())
+    assert_that(BundleWriter).raises(ValueError).when_called_with(
+        None, bundle_type="history"
+    )